@@ -1,8 +1,161 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from copy import copy
+from os import makedirs
+from os.path import dirname, isdir
+from tempfile import TemporaryDirectory
+
+from numpy import (
+    abs,
+    arange,
+    array,
+    asarray,
+    bincount,
+    count_nonzero,
+    divide,
+    empty,
+    errstate,
+    expm1,
+    flatnonzero,
+    float32,
+    intp,
+    log1p,
+    minimum,
+    nan_to_num,
+    ndarray,
+    nonzero,
+    repeat,
+    sum,
+    unique,
+    zeros,
+)
+from numpy.lib.format import open_memmap
+from numpy.random import default_rng
+
+from clustering_exploration.utils.cluster_result import ClusterResult, count_clusters
+from clustering_exploration.utils.constants import (
+    DEFAULT_MEMORY_BUDGET,
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    PIXEL_TILE_SIZE,
+    PROGRESS_INTERVAL,
+    RANDOM_TILE_SIZE,
+    TILE_MEMORY_FACTOR,
+)
+from clustering_exploration.utils.data_handler import memory_map
+from clustering_exploration.utils.image_handler import (
+    alpha_compose_clusters,
+    save_array_to_image,
+)
+from clustering_exploration.utils.image_writer import ImageWriter
+from clustering_exploration.utils.profiling import enabled as profiling_enabled
+from clustering_exploration.utils.profiling import merge, record_call, span
+
+# Execution backends for `compute`.
+SERIAL_BACKEND = "serial"
+THREAD_BACKEND = "thread"
+PROCESS_BACKEND = "process"
+BACKENDS = [SERIAL_BACKEND, THREAD_BACKEND, PROCESS_BACKEND]
+_JOBLIB_BACKENDS = {THREAD_BACKEND: "threading", PROCESS_BACKEND: "loky"}
+
+# Shared memory for worker processes when available.
+SHARED_MEMORY_DIR = "/dev/shm" if isdir("/dev/shm") else None
+
+
+def pixel_random_values(seed: int, pixel_indices: ndarray, values_per_pixel: int) -> ndarray:
+    """Draw uniform random values for pixels, keyed by their position in the image.
+
+    Every `RANDOM_TILE_SIZE` pixels of the image share one random stream, seeded with `seed` and the index of the
+    stream, which hands `values_per_pixel` values to each of its pixels in turn. A pixel's values depend only on its
+    index, never on how the image is split into blocks.
+
+    Args:
+        seed: Seed of the random streams.
+        pixel_indices: Indices of the pixels in the image, in increasing order.
+        values_per_pixel: Number of values to draw per pixel.
+
+    Returns:
+        Random values in [0, 1). Shape: [ number of pixels x values per pixel ].
+    """
+    values = empty((len(pixel_indices), values_per_pixel))
+    streams = pixel_indices // RANDOM_TILE_SIZE
+    for stream_index in unique(streams):
+        # Skip the values of the stream's pixels before the first requested one.
+        rows = flatnonzero(streams == stream_index)
+        first, last = pixel_indices[rows[0]], pixel_indices[rows[-1]] + 1
+        rng = default_rng([seed, int(stream_index)])
+        rng.bit_generator.advance(int(first - stream_index * RANDOM_TILE_SIZE) * values_per_pixel)
+        values[rows] = rng.random((last - first, values_per_pixel))[pixel_indices[rows] - first]
+    return values
+
+
+def image_shape(number_of_pixels: int, resolution: tuple) -> tuple:
+    """Get the shape of the image composed from a number of pixels.
+
+    Args:
+        number_of_pixels: Number of pixels (rows of splats).
+        resolution: Height and width of the image.
+
+    Returns:
+        The shape of the image. Shape: [ H x W x 3 ].
+    """
+    height, width = resolution
+    if height * width != number_of_pixels:
+        raise ValueError(f"Expected {height} x {width} = {height * width} pixels, got {number_of_pixels}")
+    return height, width, 3
+
+
+def _cluster_block(algorithm: AlgorithmBase, start: int, splats: ndarray, vectorized: bool) -> tuple:
+    """Cluster one block of pixels.
+
+    Args:
+        algorithm: The algorithm to cluster with.
+        start: Index of the first pixel of the block.
+        splats: Splats for the block. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+        vectorized: Whether to use `tile_cluster` or the per-pixel reference.
 
-from joblib import Parallel, delayed
-from numpy import array, empty, ndarray, prod, sum, zeros
-from tqdm.auto import tqdm
+    Returns:
+        The start index and the clustered block.
+    """
+    with span("read_block") as read_span:
+        splats = asarray(splats)
+        read_span.add(pixels=len(splats), bytes_read=splats.nbytes)
+
+    with span("tile_cluster" if vectorized else "pixel_cluster", pixels=len(splats)) as cluster_span:
+        clusters = algorithm.tile_cluster_at(splats, start, vectorized)
+        if cluster_span:
+            cluster_span.add(
+                splats_visited=int(count_nonzero(splats[:, :, 0])), clusters_used=int(count_clusters(clusters).sum())
+            )
+    return start, clusters
+
+
+def _run_block(
+    algorithm: AlgorithmBase, start: int, splats: ndarray, vectorized: bool, profiled: bool, in_worker: bool = False
+) -> tuple:
+    """Cluster one block of pixels (see `_cluster_block`), handing back the spans a worker process recorded.
+
+    Args:
+        algorithm: The algorithm to cluster with.
+        start: Index of the first pixel of the block.
+        splats: Splats for the block.
+        vectorized: Whether to use `tile_cluster` or the per-pixel reference.
+        profiled: Whether the caller is profiling.
+        in_worker: Whether the block runs in a joblib worker, alongside other blocks.
+
+    Returns:
+        The start index and the clustered block, and the events recorded outside the caller's process.
+    """
+    # Workers already run blocks on every core, so each keeps its compiled kernels to one thread.
+    if in_worker and getattr(algorithm, "use_kernels", False):
+        from clustering_exploration.algorithms.kernels import set_kernel_threads
+
+        set_kernel_threads(1)
+
+    if not profiled:
+        return _cluster_block(algorithm, start, splats, vectorized), []
+    return record_call(_cluster_block, algorithm, start, splats, vectorized)
 
 
 class AlgorithmBase(ABC):
@@ -29,38 +182,413 @@ class AlgorithmBase(ABC):
             Clustered splats for the pixel. Shape: [ number of clusters x [ A, R, G, B ] ].
         """
 
+    def tile_cluster(self, splats: ndarray) -> ndarray:
+        """Cluster the splats for a tile of pixels at once.
+
+        Subclasses override this with a vectorized engine. The default clusters each pixel with `pixel_cluster`.
+
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+
+        Returns:
+            Clustered splats for the tile. Shape: [ number of pixels x [ number of clusters x [ A, R, G, B ] ] ].
+        """
+        return self._pixel_tile_cluster(splats)
+
+    def tile_cluster_at(self, splats: ndarray, start: int, vectorized: bool = True) -> ndarray:
+        """Cluster a tile of pixels, given where it starts in the image.
+
+        Algorithms that draw random numbers override this to key them by pixel position, so their results don't depend
+        on how the image is split into tiles. The default ignores the position.
+
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+            start: Index of the first pixel of the tile.
+            vectorized: Whether to use `tile_cluster` or the per-pixel reference.
+
+        Returns:
+            Clustered splats for the tile. Shape: [ number of pixels x [ number of clusters x [ A, R, G, B ] ] ].
+        """
+        return self.tile_cluster(splats) if vectorized else self._pixel_tile_cluster(splats)
+
+    def _pixel_tile_cluster(self, splats: ndarray) -> ndarray:
+        """Cluster a tile of pixels one pixel at a time with `pixel_cluster`.
+
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+
+        Returns:
+            Clustered splats for the tile, zero padded to the widest pixel. Shape: [ number of pixels x [ number of
+            clusters x [ A, R, G, B ] ] ].
+        """
+        return self._stack_clusters([self.pixel_cluster(pixel_splats)[None] for pixel_splats in splats])
+
+    def prepare_tile(self, splats: ndarray) -> ndarray:
+        """Preprocess a tile once before it is clustered by several variants of the algorithm.
+
+        The default drops the splat slots past the last non-transparent splat of the tile, which no algorithm uses.
+
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+
+        Returns:
+            The preprocessed tile.
+        """
+        valid_slots = flatnonzero((splats[:, :, 0] != 0).any(axis=0))
+        return splats[:, : valid_slots[-1] + 1 if len(valid_slots) else 1]
+
+    def sweep_tile_cluster(self, splats: ndarray, variants: list, start: int = 0) -> list:
+        """Cluster a prepared tile with several variants of the algorithm.
+
+        Subclasses override this to share work between the variants. The default runs `tile_cluster_at` of each.
+
+        Args:
+            splats: Prepared splats for a tile of pixels, see `prepare_tile`.
+            variants: Copies of the algorithm that differ in one parameter.
+            start: Index of the first pixel of the tile.
+
+        Returns:
+            Clustered splats for the tile for each variant.
+        """
+        return [variant.tile_cluster_at(splats, start) for variant in variants]
+
+    @staticmethod
+    def _stack_clusters(cluster_tiles: list) -> ndarray:
+        """Stack clustered tiles along the pixel axis, zero padding the cluster axis to the widest tile.
+
+        Args:
+            cluster_tiles: List of clustered tiles. Shape: [ number of tiles x [ number of pixels x [ number of
+                clusters x [ A, R, G, B ] ] ] ].
+
+        Returns:
+            Stacked clusters. Shape: [ total number of pixels x [ number of clusters x [ A, R, G, B ] ] ].
+        """
+        number_of_pixels = sum([len(cluster_tile) for cluster_tile in cluster_tiles])
+        width = max([cluster_tile.shape[1] for cluster_tile in cluster_tiles], default=0)
+        stacked = zeros((number_of_pixels, width, 4), dtype=cluster_tiles[0].dtype if cluster_tiles else float)
+
+        # Copy each tile in place.
+        start = 0
+        for cluster_tile in cluster_tiles:
+            stacked[start : start + len(cluster_tile), : cluster_tile.shape[1]] = cluster_tile
+            start += len(cluster_tile)
+        return stacked
+
+    @staticmethod
+    def _write_block(output: ndarray, counts: ndarray, start: int, clusters: ndarray) -> ndarray:
+        """Write a clustered block into a preallocated output, widening the output if the block has more clusters.
+
+        Args:
+            output: Clusters for all pixels. Shape: [ number of pixels x [ number of clusters x [ A, R, G, B ] ] ].
+            counts: Number of clusters of each pixel, updated in place.
+            start: Index of the first pixel of the block.
+            clusters: Clustered block. Shape: [ number of pixels x [ number of clusters x [ A, R, G, B ] ] ].
+
+        Returns:
+            The output, or a widened copy of it.
+        """
+        # Widen the output for algorithms with a data dependent number of clusters.
+        if clusters.shape[1] > output.shape[1]:
+            widened_output = zeros((len(output), clusters.shape[1], 4), dtype=output.dtype)
+            widened_output[:, : output.shape[1]] = output
+            output = widened_output
+        output[start : start + len(clusters), : clusters.shape[1]] = clusters
+        counts[start : start + len(clusters)] = count_clusters(clusters)
+        return output
+
     @staticmethod
     def _commutative_combine(splat_clusters: list) -> ndarray:
         """Commutatively combine clustered splats into a single splat.
 
+        Kept for list based callers; flattens the lists into labels for `_label_combine`.
+
         Args:
             splat_clusters: List of clustered splats. Shape: [ number of clusters x [ number of splats x [ A, R, G, B ] ] ].
         """
-        pixel_output = empty((len(splat_clusters), 4))
-        for index, cluster_list in enumerate(splat_clusters):
-            # Skip empty clusters.
-            if not cluster_list:
-                pixel_output[index] = zeros(4)
-                continue
-
-            # Convert to numpy array.
-            cluster = array(cluster_list)
-
-            # Compute the output alpha and color.
-            pixel_output[index, 0] = 1 - prod(1 - cluster[:, 0])
-            alpha_sum = sum(cluster[:, 0])
-            if alpha_sum:
-                pixel_output[index, 1:] = sum(cluster[:, 0].reshape(-1, 1) * cluster[:, 1:], axis=0) / alpha_sum
-            else:
-                pixel_output[index, 1:] = zeros(3)
+        labels = repeat(arange(len(splat_clusters)), [len(cluster_list) for cluster_list in splat_clusters])
+        splats = array([splat for cluster_list in splat_clusters for splat in cluster_list], dtype=float)
+        splats = splats.reshape((-1, 4))
+        return AlgorithmBase._label_combine(splats[None], labels[None], len(splat_clusters))[0]
+
+    @staticmethod
+    def _label_combine(splats: ndarray, labels: ndarray, number_of_clusters: int) -> ndarray:
+        """Commutatively combine labelled splats into clusters for a tile of pixels at once.
+
+        This is the shared final step of the algorithms: each computes an integer cluster label per splat and hands the
+        splats over here. Cluster alpha is `1 - prod(1 - alpha)`, accumulated as a sum of `log1p(-alpha)` for
+        stability, and cluster color is the alpha weighted mean color, all with segmented reductions over (pixel,
+        cluster) segments.
 
-        # Return the clustered pixel.
-        return pixel_output
+        Args:
+            splats: Splats for a tile of pixels, alpha first and color last. Shape: [ number of pixels x [ number of
+                splats x [ A, D, R, G, B ] ] ] (or [ A, R, G, B ]).
+            labels: Cluster index of each splat, negative to leave the splat out. Shape: [ number of pixels x number
+                of splats ].
+            number_of_clusters: Number of clusters per pixel.
+
+        Returns:
+            Combined clusters. Shape: [ number of pixels x [ number of clusters x [ A, R, G, B ] ] ].
+        """
+        number_of_segments = splats.shape[0] * number_of_clusters
 
-    def compute(self) -> list:
+        with span("label_combine", pixels=splats.shape[0]) as combine_span:
+            # Flatten the member splats into (pixel, cluster) segment indices.
+            members = labels >= 0
+            segments = nonzero(members)[0] * number_of_clusters + labels[members]
+            member_splats = splats[members]
+            alpha = member_splats[:, 0].astype(float)
+            combine_span.add(splats_combined=len(alpha))
+
+            # Compute the output alpha and the alpha weighted color sums.
+            output = empty((number_of_segments, 4))
+            # Clamp alpha to 1 like the compositor, so an opaque splat makes its cluster opaque (log1p(-1) is -inf).
+            with errstate(divide="ignore"):
+                transmittance_logs = log1p(-minimum(alpha, 1))
+            output[:, 0] = -expm1(bincount(segments, transmittance_logs, number_of_segments))
+            for channel in range(1, 4):
+                output[:, channel] = bincount(segments, alpha * member_splats[:, channel - 4], number_of_segments)
+
+            # Normalize the colors by the alpha sums, leaving empty clusters at zero.
+            alpha_sum = bincount(segments, alpha, number_of_segments)[:, None]
+            divide(output[:, 1:], alpha_sum, out=output[:, 1:], where=alpha_sum != 0)
+        return output.reshape((splats.shape[0], number_of_clusters, 4))
+
+    def compare_modes(self, pixel_indices: ndarray) -> float:
+        """Compare the vectorized `tile_cluster` against the per-pixel `pixel_cluster` reference.
+
+        Empty clusters may hold NaN colors in the per-pixel path; those are treated as zeros.
+
+        Args:
+            pixel_indices: Indices of the pixels to compare.
+
+        Returns:
+            Maximum absolute difference between the two paths.
+        """
+        splats = asarray(self.splats[pixel_indices])
+        reference = self._pixel_tile_cluster(splats)
+        vectorized = self.tile_cluster(splats)
+
+        # Pad both to the same number of clusters before comparing.
+        reference, vectorized = self._stack_clusters([reference, vectorized]).reshape((2, len(splats), -1, 4))
+        return float(abs(nan_to_num(reference) - vectorized).max(initial=0))
+
+    def __getstate__(self) -> dict:
+        # Worker processes are handed their blocks of splats separately, so never pickle the whole image.
+        state = self.__dict__.copy()
+        state["splats"] = None
+        return state
+
+    def compute(
+        self,
+        vectorized: bool = True,
+        block_size: int = PIXEL_TILE_SIZE,
+        backend: str = PROCESS_BACKEND,
+        n_jobs: int = -1,
+        progress: bool = True,
+    ) -> ClusterResult:
         """Compute clustering for all pixels.
 
+        The image is split into blocks of pixels which are clustered with `tile_cluster` and written straight into a
+        preallocated float32 tensor, along with each pixel's number of clusters. Process workers read their block
+        through a memory map instead of a pickled copy: splats that are already memory mapped (like a cache from
+        `load_splats`) are shared as is, anything else is written once to shared memory first.
+
+        Args:
+            vectorized: Whether to cluster blocks with `tile_cluster` or one pixel at a time with `pixel_cluster`.
+            block_size: Number of pixels per block.
+            backend: `SERIAL_BACKEND`, `THREAD_BACKEND` or `PROCESS_BACKEND`.
+            n_jobs: Number of workers for the thread and process backends (-1 for all cores).
+            progress: Whether to show a progress bar.
+
         Returns:
-            Clustered splats for all pixels. Shape: [ H x W x [ number of clusters x [ A, R, G, B ] ] ].
+            Clustered splats for all pixels, with their number of clusters. Shape: [ H x W x [ number of clusters x [
+            A, R, G, B ] ] ].
         """
-        return Parallel(n_jobs=-1)(delayed(self.pixel_cluster)(pixel_splat) for pixel_splat in tqdm(self.splats))
+        number_of_pixels = len(self.splats)
+        output = zeros((number_of_pixels, self.number_of_clusters, 4), dtype=float32)
+        counts = zeros(number_of_pixels, dtype=intp)
+        starts = range(0, number_of_pixels, block_size)
+
+        compute_span = span("compute", pixels=number_of_pixels)
+        with compute_span, TemporaryDirectory(dir=SHARED_MEMORY_DIR) as shared_directory:
+            # Pick the block runner.
+            profiled = profiling_enabled()
+            if backend == SERIAL_BACKEND:
+                splats = self.splats
+                results = (
+                    _run_block(self, start, splats[start : start + block_size], vectorized, profiled)
+                    for start in starts
+                )
+            elif backend in _JOBLIB_BACKENDS:
+                # Serial runs don't need joblib, which is slow to import.
+                from joblib import Parallel, delayed
+
+                splats = self.splats if backend == THREAD_BACKEND else memory_map(self.splats, shared_directory)
+                results = Parallel(n_jobs=n_jobs, backend=_JOBLIB_BACKENDS[backend], return_as="generator_unordered")(
+                    delayed(_run_block)(self, start, splats[start : start + block_size], vectorized, profiled, True)
+                    for start in starts
+                )
+            else:
+                raise ValueError(f"Unknown backend: {backend}")
+
+            # Write each block into the output as it arrives (tqdm is slow to import, so only bars load it).
+            from tqdm.auto import tqdm
+
+            with tqdm(
+                total=number_of_pixels, unit="px", unit_scale=True, mininterval=PROGRESS_INTERVAL, disable=not progress
+            ) as progress_bar:
+                for (start, clusters), events in results:
+                    merge(events)
+                    with span("write_block", pixels=len(clusters)):
+                        output = self._write_block(output, counts, start, clusters)
+                    progress_bar.update(len(clusters))
+            if compute_span:
+                compute_span.add(clusters_used=int(counts.sum()))
+
+        return ClusterResult(output, counts)
+
+    def bytes_per_pixel(self) -> int:
+        """Estimate the peak working memory needed per pixel while clustering and compositing a tile.
+
+        Returns:
+            Estimated number of bytes per pixel.
+        """
+        number_of_splats, number_of_values = self.splats.shape[1:]
+        return number_of_splats * number_of_values * self.splats.dtype.itemsize * TILE_MEMORY_FACTOR
+
+    def compute_image(
+        self,
+        memory_budget: int = DEFAULT_MEMORY_BUDGET,
+        output_path: str | None = None,
+        progress: bool = True,
+        writer: ImageWriter | None = None,
+        output_name: str | None = None,
+        resolution: tuple = (IMAGE_HEIGHT, IMAGE_WIDTH),
+    ) -> ndarray:
+        """Cluster and composite the image one tile at a time within a memory budget.
+
+        Only one tile of splats and its clusters are held at once, and each tile's colors are written to the output
+        before the next is read. With splats memory mapped (the `load_splats` default), each tile is read from disk on
+        demand, so peak memory stays roughly constant whatever the resolution or splat budget.
+
+        Args:
+            memory_budget: Working memory to size tiles by, in bytes.
+            output_path: Optional `.npy` path to write the float image to incrementally instead of keeping it in memory.
+            progress: Whether to show a progress bar.
+            writer: Optional writer to save the image with in the background once it is complete. A writer that keeps
+                raw images gets the image as its raw file, filled in place (unless `output_path` is given), so it only
+                has to flush it and encode the PNG.
+            output_name: Name to save the image under with the writer.
+            resolution: Height and width of the image, which must hold one pixel per row of splats.
+
+        Returns:
+            The composed image. Shape: [ H x [ W x [ R, G, B ] ] ].
+        """
+        number_of_pixels = len(self.splats)
+        shape = image_shape(number_of_pixels, resolution)
+        tile_size = max(1, memory_budget // self.bytes_per_pixel())
+
+        # Allocate the output image, on disk if requested (or as the writer's raw image).
+        if output_path is None and writer is not None and writer.raw:
+            output_path = writer.raw_path(output_name)
+        if output_path is None:
+            image = zeros(shape, dtype=float32)
+        else:
+            makedirs(dirname(output_path) or ".", exist_ok=True)
+            image = open_memmap(output_path, mode="w+", dtype=float32, shape=shape)
+        pixel_colors = image.reshape((number_of_pixels, 3))
+
+        # Cluster and composite each tile, reading only its splats.
+        from tqdm.auto import tqdm
+
+        with tqdm(
+            total=number_of_pixels, unit="px", unit_scale=True, mininterval=PROGRESS_INTERVAL, disable=not progress
+        ) as progress_bar:
+            for start in range(0, number_of_pixels, tile_size):
+                with span("read_block") as read_span:
+                    splats = array(self.splats[start : start + tile_size])
+                    read_span.add(pixels=len(splats), bytes_read=splats.nbytes)
+                with span("tile_cluster", pixels=len(splats)):
+                    clusters = self.tile_cluster_at(splats, start)
+                pixel_colors[start : start + len(splats)] = alpha_compose_clusters(clusters)
+                progress_bar.update(len(splats))
+
+        # Make sure an on-disk image is complete, in the background with a writer.
+        if writer is not None:
+            writer.save(image, output_name)
+        elif output_path is not None:
+            image.flush()
+        return image
+
+    def sweep(
+        self,
+        parameter: str,
+        values: list,
+        block_size: int = PIXEL_TILE_SIZE,
+        output_name: str | None = None,
+        progress: bool = True,
+        writer: ImageWriter | None = None,
+        resolution: tuple = (IMAGE_HEIGHT, IMAGE_WIDTH),
+    ) -> list:
+        """Cluster and composite the image for several values of one parameter in a single pass over the splats.
+
+        Each tile of splats is read and prepared once (see `prepare_tile`), then clustered for every value with
+        `sweep_tile_cluster`, which lets algorithms share preprocessing such as validity masks, depth sorting or slot
+        gathering between values.
+
+        Args:
+            parameter: Name of the attribute to sweep (like `number_of_clusters` or `epsilon`).
+            values: Values to sweep over.
+            block_size: Number of pixels per tile.
+            output_name: Optional name prefix to save each value's image under, as `<name>_<parameter>_<value>`.
+            progress: Whether to show a progress bar.
+            writer: Optional writer to save the images with in the background, instead of one after another.
+            resolution: Height and width of the images, which must hold one pixel per row of splats.
+
+        Returns:
+            The clusters and the composed image for each value. Shapes: [ H x W x [ K x [ A, R, G, B ] ] ] and [ H x
+            [ W x [ R, G, B ] ] ].
+        """
+        if not hasattr(self, parameter):
+            raise ValueError(f"Unknown parameter: {parameter}")
+        number_of_pixels = len(self.splats)
+        shape = image_shape(number_of_pixels, resolution)
+
+        # One copy of the algorithm per value.
+        variants = []
+        for value in values:
+            variant = copy(self)
+            setattr(variant, parameter, value)
+            variants.append(variant)
+
+        outputs = [zeros((number_of_pixels, variant.number_of_clusters, 4), dtype=float32) for variant in variants]
+        counts = [zeros(number_of_pixels, dtype=intp) for _ in variants]
+        images = [zeros(shape, dtype=float32) for _ in variants]
+
+        # Read and prepare each tile once, and cluster and composite it for every value.
+        from tqdm.auto import tqdm
+
+        with tqdm(
+            total=number_of_pixels, unit="px", unit_scale=True, mininterval=PROGRESS_INTERVAL, disable=not progress
+        ) as progress_bar:
+            for start in range(0, number_of_pixels, block_size):
+                with span("read_block") as read_span:
+                    splats = array(self.splats[start : start + block_size])
+                    read_span.add(pixels=len(splats), bytes_read=splats.nbytes)
+                with span("sweep_tile_cluster", pixels=len(splats), variants=len(variants)):
+                    cluster_tiles = self.sweep_tile_cluster(self.prepare_tile(splats), variants, start)
+                for index, clusters in enumerate(cluster_tiles):
+                    outputs[index] = self._write_block(outputs[index], counts[index], start, clusters)
+                    images[index].reshape((number_of_pixels, 3))[start : start + len(clusters)] = (
+                        alpha_compose_clusters(clusters)
+                    )
+                progress_bar.update(len(splats))
+
+        # Save each value's image if requested.
+        if output_name is not None:
+            for value, image in zip(values, images):
+                if writer is not None:
+                    writer.save(image, f"{output_name}_{parameter}_{value}")
+                else:
+                    save_array_to_image(image, f"{output_name}_{parameter}_{value}")
+        return [(ClusterResult(output, count), image) for output, count, image in zip(outputs, counts, images)]
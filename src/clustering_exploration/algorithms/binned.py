@@ -1,6 +1,42 @@
-from numpy import concatenate, max, min, ndarray
+from numpy import (
+    asarray,
+    clip,
+    full,
+    inf,
+    intp,
+    maximum,
+    minimum,
+    ndarray,
+    where,
+    zeros_like,
+)
 
 from clustering_exploration.algorithms.algorithm_base import AlgorithmBase
+from clustering_exploration.utils.constants import PIXEL_TILE_SIZE
+
+
+def depth_range(splats: ndarray, tile_size: int = PIXEL_TILE_SIZE) -> tuple:
+    """Compute the minimum and maximum positive depth of an image, one tile of pixels at a time.
+
+    Args:
+        splats: Splats for all pixels. Shape: [ H x W x [ number of splats x [ A, D, R, G, B ] ] ].
+        tile_size: Number of pixels to reduce at once.
+
+    Returns:
+        Minimum and maximum positive depth.
+    """
+    min_depth = max_depth = None
+    for start in range(0, len(splats), tile_size):
+        # Reduce the tile over its positive depths without building a masked copy.
+        depth_values = asarray(splats[start : start + tile_size, :, 1])
+        positive = depth_values > 0
+        tile_min = depth_values.min(initial=inf, where=positive)
+        tile_max = depth_values.max(initial=-inf, where=positive)
+
+        # Fold into the running range.
+        min_depth = tile_min if min_depth is None else minimum(min_depth, tile_min)
+        max_depth = tile_max if max_depth is None else maximum(max_depth, tile_max)
+    return min_depth, max_depth
 
 
 class BinnedAlgorithm(AlgorithmBase):
@@ -16,31 +52,62 @@ class BinnedAlgorithm(AlgorithmBase):
         super().__init__(splats, number_of_clusters)
 
         # Compute the minimum and maximum depth of the image.
-        depth_values = splats[:, :, 1]
-        depth_values = depth_values[depth_values > 0]
-        self.min_depth = min(depth_values)
-        self.max_depth = max(depth_values)
+        self.min_depth, self.max_depth = depth_range(splats)
 
         print(f"Min depth: {self.min_depth}, Max depth: {self.max_depth}")
         print(f"Each bin will be {(self.max_depth - self.min_depth) / self.number_of_clusters} units wide.")
 
     def pixel_cluster(self, splats: ndarray) -> ndarray:
-        # Initialize clustering 2D list: cluster -> [[alpha, *color], ...].
-        pixel_clustering = [[] for _ in range(self.number_of_clusters)]
+        # Bin index of each splat, -1 for splats left out.
+        bin_indices = full(len(splats), -1, dtype=intp)
 
         # Loop through each splat.
-        for splat in splats:
+        for splat_index, splat in enumerate(splats):
             # Skip transparent splats.
             if splat[0] == 0:
                 continue
 
-            # Compute the bin index.
-            bin_index = int(
-                (splat[1] - self.min_depth) / (self.max_depth - self.min_depth) * (self.number_of_clusters - 1)
-            )
+            # Compute the bin index, clipping depths outside the image range (like non-positive depths) into the end
+            # bins as `tile_cluster` does.
+            depth_fraction = 0
+            if self.max_depth > self.min_depth:
+                depth_fraction = (splat[1] - self.min_depth) / (self.max_depth - self.min_depth)
+            bin_index = int(depth_fraction * (self.number_of_clusters - 1))
+            bin_indices[splat_index] = min(max(bin_index, 0), self.number_of_clusters - 1)
 
-            # Add the splat to the bin.
-            pixel_clustering[bin_index].append(concatenate(([splat[0]], splat[2:])))
+        # Commutative combination of the splats in each cluster (alpha, color).
+        return self._label_combine(splats[None], bin_indices[None], self.number_of_clusters)[0]
+
+    def _depth_fractions(self, splats: ndarray) -> ndarray:
+        """Get the position of every splat's depth within the image depth range, from 0 to 1."""
+        depth_values = splats[:, :, 1]
+        if self.max_depth > self.min_depth:
+            return (depth_values - self.min_depth) / (self.max_depth - self.min_depth)
+        return zeros_like(depth_values)
+
+    @staticmethod
+    def _bin_labels(depth_fractions: ndarray, valid: ndarray, number_of_clusters: int) -> ndarray:
+        """Get the bin index of every splat, -1 where not valid."""
+        bin_indices = (depth_fractions * (number_of_clusters - 1)).astype(intp)
+        return where(valid, clip(bin_indices, 0, number_of_clusters - 1), -1)
+
+    def tile_cluster(self, splats: ndarray) -> ndarray:
+        """Bin a tile of pixels at once and combine each bin with segmented reductions."""
+        # Compute the bin index of every splat, leaving out transparent splats.
+        bin_indices = self._bin_labels(self._depth_fractions(splats), splats[:, :, 0] != 0, self.number_of_clusters)
 
         # Commutative combination of the splats in each cluster (alpha, color).
-        return self._commutative_combine(pixel_clustering)
+        return self._label_combine(splats, bin_indices, self.number_of_clusters)
+
+    def sweep_tile_cluster(self, splats: ndarray, variants: list, start: int = 0) -> list:
+        """Compute the depth fractions and validity once and bin them for each variant's number of clusters."""
+        depth_fractions = self._depth_fractions(splats)
+        valid = splats[:, :, 0] != 0
+        return [
+            self._label_combine(
+                splats,
+                self._bin_labels(depth_fractions, valid, variant.number_of_clusters),
+                variant.number_of_clusters,
+            )
+            for variant in variants
+        ]
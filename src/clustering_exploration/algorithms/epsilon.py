@@ -1,10 +1,23 @@
-from numpy import array, concatenate, ndarray
+from bisect import bisect_left
+
+from numpy import abs, arange, empty, flatnonzero, full, inf, intp, ndarray, zeros
 
 from clustering_exploration.algorithms.algorithm_base import AlgorithmBase
 
 
 class EpsilonAlgorithm(AlgorithmBase):
-    """Epsilon spatial clustering algorithm."""
+    """Epsilon spatial clustering algorithm.
+
+    Each splat joins the cluster whose centre (the depth of the splat that opened it) is closest, if that centre is
+    within epsilon, and otherwise opens a new cluster at its own depth.
+
+    `pixel_cluster` keeps the cluster centres in a sorted list and bisects it, so each splat only compares against its
+    two neighbouring centres (ties go to the earlier centre, as with a scan in insertion order). `tile_cluster` uses
+    the fact that the rasterizer emits splats in depth order: the closest centre is then always the newest one, so a
+    new cluster opens exactly where the depth moves more than epsilon past the current centre, and every pixel of a
+    tile can be segmented at once. Pixels whose splats are not depth ordered fall back to the bisect path, so both
+    modes produce the same clusters; `compare_modes` checks this on any set of pixels.
+    """
 
     def __init__(self, splats: ndarray, epsilon: float):
         """Initialize the algorithm.
@@ -16,35 +29,121 @@ class EpsilonAlgorithm(AlgorithmBase):
         super().__init__(splats, 0)
         self.epsilon = epsilon
 
-    def pixel_cluster(self, splats: ndarray) -> ndarray:
-        # Define clustering dictionary: depth -> [(alpha, color)].
-        pixel_clustering = {}
+    def _bisect_labels(self, splats: ndarray) -> tuple:
+        """Assign each splat of a pixel to a cluster by bisecting the sorted cluster centres.
+
+        Args:
+            splats: Splats for a single pixel. Shape: [ number of splats x [ A, D, R, G, B ] ].
+
+        Returns:
+            Cluster index of each splat in depth order (-1 for transparent splats), and the number of clusters.
+        """
+        # Sorted cluster centres, and the order each centre was created in.
+        centres = []
+        centre_ids = []
+        labels = full(len(splats), -1, dtype=intp)
 
         # Loop through each splat.
-        for splat in splats:
-            splat_alpha, splat_depth, *splat_color = splat
-            splat_color = array(splat_color)
+        for splat_index, (splat_alpha, splat_depth) in enumerate(splats[:, :2]):
             # Skip transparent splats.
             if splat_alpha == 0:
                 continue
 
-            combined_splat_info = concatenate(([splat_alpha], splat_color))
+            # Find the closest neighbouring centre, preferring the earlier one on ties.
+            position = bisect_left(centres, splat_depth)
+            closest, closest_distance = None, inf
+            for neighbour in range(max(position - 1, 0), min(position + 1, len(centres))):
+                distance = abs(centres[neighbour] - splat_depth)
+                if closest is None or (distance, centre_ids[neighbour]) < (closest_distance, centre_ids[closest]):
+                    closest, closest_distance = neighbour, distance
 
-            # Case 1: No clusters.
-            if not pixel_clustering:
-                pixel_clustering[splat_depth] = [combined_splat_info]
-                continue
-
-            # Case 2: Cluster is within epsilon distance.
-            closest_depth = min(pixel_clustering.keys(), key=lambda depth: abs(depth - splat_depth))
-            if abs(splat_depth - closest_depth) <= self.epsilon:
-                pixel_clustering[closest_depth].append(combined_splat_info)
-            # Case 3: case 2 fails.
+            # Case 1: Cluster is within epsilon distance.
+            if closest is not None and closest_distance <= self.epsilon:
+                labels[splat_index] = centre_ids[closest]
+            # Case 2: No clusters, or case 1 fails.
             else:
-                pixel_clustering[splat_depth] = [combined_splat_info]
+                labels[splat_index] = len(centres)
+                centres.insert(position, splat_depth)
+                centre_ids.insert(position, len(centres) - 1)
 
-        # Sort the clusters by depth.
-        pixel_clustering = dict(sorted(pixel_clustering.items()))
+        # Relabel the clusters by depth.
+        depth_rank = empty(len(centres), dtype=intp)
+        depth_rank[centre_ids] = arange(len(centres))
+        members = labels >= 0
+        labels[members] = depth_rank[labels[members]]
+        return labels, len(centres)
+
+    def pixel_cluster(self, splats: ndarray) -> ndarray:
+        labels, number_of_clusters = self._bisect_labels(splats)
 
         # Commutative combination of the splats in each cluster (alpha, color).
-        return self._commutative_combine(list(pixel_clustering.values()))
+        return self._label_combine(splats[None], labels[None], number_of_clusters)[0]
+
+    def _slot_splats(self, splats: ndarray) -> tuple:
+        """Gather the splats of each slot of a tile, and find the pixels whose splats are not depth ordered.
+
+        Neither depends on epsilon, so a sweep gathers them once per tile.
+
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+
+        Returns:
+            (slot, pixel rows, depths) of the non-transparent splats of each slot, and which pixels are unordered.
+        """
+        number_of_pixels = splats.shape[0]
+        previous_depths = zeros(number_of_pixels, dtype=splats.dtype)
+        seen = zeros(number_of_pixels, dtype=bool)
+        unordered = zeros(number_of_pixels, dtype=bool)
+        slots = []
+
+        # Skip transparent splats, and slots that are padding in every pixel.
+        valid = splats[:, :, 0] != 0
+        for slot in flatnonzero(valid.any(axis=0)):
+            rows = flatnonzero(valid[:, slot])
+            splat_depths = splats[rows, slot, 1]
+            unordered[rows] |= seen[rows] & (splat_depths < previous_depths[rows])
+            previous_depths[rows] = splat_depths
+            seen[rows] = True
+            slots.append((slot, rows, splat_depths))
+        return slots, unordered
+
+    def _segment(self, splats: ndarray, slots: list, unordered: ndarray) -> ndarray:
+        """Segment a tile at this epsilon from its gathered slots, falling back to bisection for unordered pixels.
+
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+            slots: Gathered slots, see `_slot_splats`.
+            unordered: Which pixels are unordered, see `_slot_splats`.
+
+        Returns:
+            Clustered splats for the tile. Shape: [ number of pixels x [ number of clusters x [ A, R, G, B ] ] ].
+        """
+        number_of_pixels = splats.shape[0]
+        labels = full(splats.shape[:2], -1, dtype=intp)
+
+        # Per pixel: current centre and number of clusters.
+        centres = zeros(number_of_pixels, dtype=splats.dtype)
+        cluster_counts = zeros(number_of_pixels, dtype=intp)
+
+        for slot, rows, splat_depths in slots:
+            # Open a new cluster where there is none yet or the newest centre is further than epsilon.
+            opens = (cluster_counts[rows] == 0) | (abs(splat_depths - centres[rows]) > self.epsilon)
+            centres[rows[opens]] = splat_depths[opens]
+            cluster_counts[rows[opens]] += 1
+            labels[rows, slot] = cluster_counts[rows] - 1
+
+        # Redo unordered pixels with the exact closest centre search.
+        for row in flatnonzero(unordered):
+            labels[row], cluster_counts[row] = self._bisect_labels(splats[row])
+
+        # Commutative combination of the splats in each cluster (alpha, color).
+        return self._label_combine(splats, labels, int(cluster_counts.max(initial=0)))
+
+    def tile_cluster(self, splats: ndarray) -> ndarray:
+        """Segment a tile of depth ordered pixels at once, falling back to bisection for unordered pixels."""
+        return self._segment(splats, *self._slot_splats(splats))
+
+    def sweep_tile_cluster(self, splats: ndarray, variants: list, start: int = 0) -> list:
+        """Gather the slots once and segment them at each variant's epsilon."""
+        slots, unordered = self._slot_splats(splats)
+        return [variant._segment(splats, slots, unordered) for variant in variants]
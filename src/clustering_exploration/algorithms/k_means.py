@@ -1,53 +1,373 @@
-from os import environ
+from __future__ import annotations
 
-from numpy import argsort, array, empty, median, ndarray, prod, sum, zeros
-from sklearn.cluster import KMeans
+from numpy import (
+    arange,
+    argmin,
+    argsort,
+    array,
+    asarray,
+    bincount,
+    cumsum,
+    divide,
+    empty,
+    flatnonzero,
+    float64,
+    full,
+    inf,
+    intp,
+    log,
+    median,
+    minimum,
+    ndarray,
+    sort,
+    take_along_axis,
+    unique,
+    where,
+    zeros,
+)
+from numpy.random import default_rng
 
-from clustering_exploration.algorithms.algorithm_base import AlgorithmBase
+from clustering_exploration.algorithms.algorithm_base import (
+    AlgorithmBase,
+    pixel_random_values,
+)
+
+# Seeding methods for the batched engine.
+QUANTILE_INIT = "quantile"
+K_MEANS_PLUS_PLUS_INIT = "k-means++"
+
+
+def local_trials(number_of_clusters: int) -> int:
+    """Get the number of candidate centres greedy k-means++ draws per centre, like scikit-learn."""
+    return 2 + int(log(number_of_clusters))
+
+
+def _seed_centres(
+    depths: ndarray, valid: ndarray, number_of_clusters: int, init: str, random_values: ndarray | None
+) -> ndarray:
+    """Pick initial cluster centres for every pixel of a tile.
+
+    Greedy k-means++ draws `local_trials` candidates for each centre, weighted by their squared distance to the
+    closest centre so far, and keeps the candidate that lowers the k-means objective the most.
+
+    Args:
+        depths: Splat depths. Shape: [ number of pixels x number of splats ].
+        valid: Which splats take part in the clustering. Shape: [ number of pixels x number of splats ].
+        number_of_clusters: Number of centres per pixel.
+        init: `QUANTILE_INIT` or `K_MEANS_PLUS_PLUS_INIT`.
+        random_values: Uniform random values for k-means++ seeding, fresh ones if None. Shape: [ number of pixels x
+            number of clusters x local trials ].
+
+    Returns:
+        Initial centres, sorted. Shape: [ number of pixels x number of clusters ].
+    """
+    number_of_pixels = depths.shape[0]
+    pixel_indices = arange(number_of_pixels)
+    valid_counts = valid.sum(axis=1)
+
+    # Evenly spaced quantiles of each pixel's valid depths.
+    if init == QUANTILE_INIT:
+        sorted_depths = sort(where(valid, depths, inf), axis=1)
+        quantiles = (2 * arange(number_of_clusters) + 1) / (2 * number_of_clusters)
+        indices = minimum((quantiles * valid_counts[:, None]).astype(intp), (valid_counts - 1).clip(0)[:, None])
+        return where(valid_counts[:, None] > 0, take_along_axis(sorted_depths, indices, axis=1), 0)
+
+    if init != K_MEANS_PLUS_PLUS_INIT:
+        raise ValueError(f"Unknown initialization: {init}")
+    if random_values is None:
+        random_values = default_rng().random((number_of_pixels, number_of_clusters, local_trials(number_of_clusters)))
+
+    # Greedy k-means++: the first centre is uniform over valid splats, later candidates are weighted by squared
+    # distance.
+    centres = zeros((number_of_pixels, number_of_clusters))
+    weights = valid.astype(float64)
+    for cluster_index in range(number_of_clusters):
+        cumulative_weights = cumsum(weights, axis=1)
+        trials = random_values[:, cluster_index, : 1 if not cluster_index else None]
+        targets = trials * cumulative_weights[:, -1:]
+        picks = minimum((cumulative_weights[:, None, :] <= targets[:, :, None]).sum(axis=2), depths.shape[1] - 1)
+
+        # Repeat the first centre once every valid splat sits on a centre.
+        candidates = where(cumulative_weights[:, -1:] > 0, depths[pixel_indices[:, None], picks], centres[:, :1])
+
+        # Weight by the squared distance to the closest centre so far, keeping the candidate with the lowest total.
+        distances = (depths[:, None, :] - candidates[:, :, None]) ** 2
+        if cluster_index:
+            distances = minimum(weights[:, None], distances)
+        candidate_weights = valid[:, None, :] * distances
+        best = argmin(candidate_weights.sum(axis=2), axis=1)
+        centres[:, cluster_index] = candidates[pixel_indices, best]
+        weights = candidate_weights[pixel_indices, best]
+    return where(valid_counts[:, None] > 0, sort(centres, axis=1), 0)
+
+
+def _relocate_empty_centres(
+    centres: ndarray, counts: ndarray, depths: ndarray, valid: ndarray, labels: ndarray
+) -> ndarray:
+    """Move the centres of empty clusters to the splats farthest from their own centres, like scikit-learn.
+
+    Duplicate centres leave all but one of them empty, so this also separates them. Empty clusters stay put once every
+    splat sits on its centre (pixels with fewer distinct depths than clusters).
+
+    Args:
+        centres: Updated centres, in label order. Shape: [ number of pixels x number of clusters ].
+        counts: Number of splats in each cluster. Shape: [ number of pixels x number of clusters ].
+        depths: Splat depths. Shape: [ number of pixels x number of splats ].
+        valid: Which splats take part in the clustering. Shape: [ number of pixels x number of splats ].
+        labels: Cluster index of each splat. Shape: [ number of pixels x number of splats ].
+
+    Returns:
+        Which pixels had a centre moved. The centres are moved in place.
+    """
+    moved = zeros(len(centres), dtype=bool)
+    empty_clusters = counts == 0
+    rows = flatnonzero(empty_clusters.any(axis=1) & valid.any(axis=1))
+    if not rows.size:
+        return moved
+
+    # Rank the splats of each pixel from the farthest from its centre, and hand them to the empty clusters in turn.
+    distances = where(valid[rows], (depths[rows] - take_along_axis(centres[rows], labels[rows], axis=1)) ** 2, -1)
+    farthest = argsort(-distances, axis=1, kind="stable")
+    ranks = where(empty_clusters[rows], cumsum(empty_clusters[rows], axis=1) - 1, 0)
+    targets = take_along_axis(farthest, ranks, axis=1)
+    move = empty_clusters[rows] & (take_along_axis(distances, targets, axis=1) > 0)
+    centres[rows] = where(move, take_along_axis(depths[rows], targets, axis=1), centres[rows])
+    moved[rows] = move.any(axis=1)
+    return moved
+
+
+def lloyd_labels(
+    depths: ndarray,
+    valid: ndarray,
+    number_of_clusters: int,
+    init: str = K_MEANS_PLUS_PLUS_INIT,
+    max_iterations: int = 300,
+    random_values: ndarray | None = None,
+) -> ndarray:
+    """Run 1D Lloyd iterations for every pixel of a tile at once.
+
+    Centres are kept sorted, so in one dimension each splat's closest centre is found by counting how many midpoints
+    between neighbouring centres lie below it, and cluster labels come out in depth order. Empty clusters are reseeded
+    at the farthest splats, and pixels stop iterating once their labels no longer change.
+
+    Args:
+        depths: Splat depths. Shape: [ number of pixels x number of splats ].
+        valid: Which splats take part in the clustering. Shape: [ number of pixels x number of splats ].
+        number_of_clusters: Number of clusters per pixel.
+        init: `QUANTILE_INIT` or `K_MEANS_PLUS_PLUS_INIT`.
+        max_iterations: Maximum number of Lloyd iterations.
+        random_values: Uniform random values for k-means++ seeding, see `_seed_centres`.
+
+    Returns:
+        Cluster index of each splat, in depth order (-1 for invalid splats). Shape: [ number of pixels x number of
+        splats ].
+    """
+    depths = depths.astype(float64)
+    centres = _seed_centres(depths, valid, number_of_clusters, init, random_values)
+    labels = full(depths.shape, -1, dtype=intp)
+    active = flatnonzero(valid.any(axis=1))
+
+    for _ in range(max_iterations):
+        if not active.size:
+            break
+
+        # Assign each splat to the closest centre (the lower one on ties, like argmin).
+        active_centres = centres[active]
+        midpoints = (active_centres[:, 1:] + active_centres[:, :-1]) / 2
+        active_depths = depths[active]
+        active_valid = valid[active]
+        active_labels = (active_depths[:, :, None] > midpoints[:, None, :]).sum(axis=2)
+
+        # Move each centre to the mean of its splats, and reseed empty clusters.
+        segments = (arange(active.size)[:, None] * number_of_clusters + active_labels)[active_valid]
+        size = active.size * number_of_clusters
+        sums = bincount(segments, active_depths[active_valid], size).reshape(active_centres.shape)
+        counts = bincount(segments, minlength=size).reshape(active_centres.shape)
+        active_centres = divide(sums, counts, out=active_centres, where=counts > 0)
+        moved = _relocate_empty_centres(active_centres, counts, active_depths, active_valid, active_labels)
+        centres[active] = sort(active_centres, axis=1)
+
+        # Stop iterating pixels whose labels did not change and whose centres were not reseeded.
+        changed = ((active_labels != labels[active]) & active_valid).any(axis=1) | moved
+        labels[active] = active_labels
+        active = active[changed]
+
+    return where(valid, labels, -1)
+
+
+def within_cluster_sum_of_squares(depths: ndarray, labels: ndarray, number_of_clusters: int) -> ndarray:
+    """Compute the k-means objective of labelled depths for every pixel of a tile.
+
+    Args:
+        depths: Splat depths. Shape: [ number of pixels x number of splats ].
+        labels: Cluster index of each splat, negative to leave the splat out. Shape: [ number of pixels x number of
+            splats ].
+        number_of_clusters: Number of clusters per pixel.
+
+    Returns:
+        Sum of the squared distances of the splats to their cluster's mean depth. Shape: [ number of pixels ].
+    """
+    depths = depths.astype(float64)
+    members = labels >= 0
+    segments = flatnonzero(members) // labels.shape[1] * number_of_clusters + labels[members]
+    size = labels.shape[0] * number_of_clusters
+
+    # Sum of squares minus the squared sum over the count, per (pixel, cluster) segment.
+    sums = bincount(segments, depths[members], size)
+    square_sums = bincount(segments, depths[members] ** 2, size)
+    counts = bincount(segments, minlength=size)
+    squared_sums = divide(sums**2, counts, out=zeros(size), where=counts > 0)
+    return (square_sums - squared_sums).clip(0).reshape((-1, number_of_clusters)).sum(axis=1)
 
 
 class KMeansAlgorithm(AlgorithmBase):
-    """Offline K-Means clustering algorithm."""
+    """Offline K-Means clustering algorithm.
 
-    def __init__(self, splats: ndarray, num_clusters: int):
+    `pixel_cluster` fits scikit-learn's `KMeans` on each pixel and is kept as the reference. `tile_cluster` runs a
+    batched 1D Lloyd engine over whole tiles, seeded with greedy k-means++ like scikit-learn, and reseeds empty clusters
+    at the farthest splats. Its random values are keyed by pixel position, so results don't depend on the tiling. Both
+    ignore zero alpha padding splats. The two can settle in different local optima, so they are compared with
+    `compare_inertia` rather than expected to match exactly.
+    """
+
+    def __init__(
+        self,
+        splats: ndarray,
+        num_clusters: int,
+        init: str = K_MEANS_PLUS_PLUS_INIT,
+        max_iterations: int = 300,
+        seed: int = 0,
+    ):
         """Initialize the K-Means algorithm.
 
         Args:
             splats: The splats to cluster.
             num_clusters: The number of clusters to create.
+            init: Seeding of the batched engine, `QUANTILE_INIT` or `K_MEANS_PLUS_PLUS_INIT`.
+            max_iterations: Maximum number of Lloyd iterations of the batched engine.
+            seed: Seed for k-means++ seeding of the batched engine.
         """
         super().__init__(splats, num_clusters)
-        environ["OMP_NUM_THREADS"] = "1"
+        self.init = init
+        self.max_iterations = max_iterations
+        self.seed = seed
+
+    def random_values(self, pixel_indices: ndarray) -> ndarray:
+        """Draw the k-means++ seeding values of pixels, keyed by their position in the image.
+
+        Args:
+            pixel_indices: Indices of the pixels.
+
+        Returns:
+            Uniform random values. Shape: [ number of pixels x number of clusters x local trials ].
+        """
+        trials = local_trials(self.number_of_clusters)
+        values = pixel_random_values(self.seed, pixel_indices, self.number_of_clusters * trials)
+        return values.reshape((len(pixel_indices), self.number_of_clusters, trials))
+
+    def batched_labels(self, splats: ndarray, start: int) -> ndarray:
+        """Label the splats of a tile with the batched 1D Lloyd engine.
+
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+            start: Index of the first pixel of the tile.
+
+        Returns:
+            Cluster index of each splat, in depth order (-1 for invalid splats). Shape: [ number of pixels x number of
+            splats ].
+        """
+        return self._batched_labels(splats, arange(start, start + len(splats)))
+
+    def _batched_labels(self, splats: ndarray, pixel_indices: ndarray) -> ndarray:
+        random_values = self.random_values(pixel_indices) if self.init == K_MEANS_PLUS_PLUS_INIT else None
+        return lloyd_labels(
+            splats[:, :, 1], splats[:, :, 0] > 0, self.number_of_clusters, self.init, self.max_iterations, random_values
+        )
+
+    def reference_labels(self, splats: ndarray) -> ndarray:
+        """Fit scikit-learn's `KMeans` on the non-transparent splats of a pixel.
+
+        Pixels with fewer distinct depths than clusters get one cluster per distinct depth.
+
+        Args:
+            splats: Splats for a single pixel. Shape: [ number of splats x [ A, D, R, G, B ] ].
+
+        Returns:
+            Cluster index of each splat, in median depth order (-1 for transparent splats). Shape: [ number of splats ].
+        """
+        labels = full(len(splats), -1, dtype=intp)
+        valid = flatnonzero(splats[:, 0] > 0)
+        depths = splats[valid, 1]
+        number_of_clusters = min(self.number_of_clusters, len(unique(depths)))
+        if not number_of_clusters:
+            return labels
+
+        # Run K-Means clustering (scikit-learn is slow to import, so only the reference loads it).
+        from sklearn.cluster import KMeans
+
+        kmeans = KMeans(n_clusters=number_of_clusters).fit(depths.reshape(-1, 1))
+
+        # Relabel the clusters by median depth.
+        median_depths = [median(depths[kmeans.labels_ == index]) for index in range(number_of_clusters)]
+        depth_rank = empty(number_of_clusters, dtype=intp)
+        depth_rank[argsort(median_depths)] = arange(number_of_clusters)
+        labels[valid] = depth_rank[kmeans.labels_]
+        return labels
 
     def pixel_cluster(self, splats: ndarray) -> ndarray:
-        # Get depth values.
-        depths = splats[:, 1]
-
-        # Run K-Means clustering.
-        kmeans = KMeans(n_clusters=self.number_of_clusters).fit(depths.reshape(-1, 1))
-
-        # Initialize clustering 2D list: cluster -> [[alpha, depth, *color], ...].
-        pixel_clustering = [[] for _ in range(self.number_of_clusters)]
-
-        # Loop through each splat and place it in the appropriate cluster.
-        for splat_index, cluster_index in enumerate(kmeans.labels_):
-            pixel_clustering[cluster_index].append(splats[splat_index])
-
-        # Commutatively combine cluster values [[median depth, alpha, color], ...].
-        depth_clusters = empty((self.number_of_clusters, 5))
-        for cluster_index, cluster_splats in enumerate(pixel_clustering):
-            # Convert to numpy array.
-            cluster_splats_array = array(cluster_splats)
-
-            # Compute fields.
-            depth_clusters[cluster_index, 0] = median(cluster_splats_array[:, 1])
-            depth_clusters[cluster_index, 1] = 1 - prod(1 - cluster_splats_array[:, 0])
-            alpha_sum = sum(cluster_splats_array[:, 0])
-            if alpha_sum:
-                depth_clusters[cluster_index, 2:] = (
-                    sum(cluster_splats_array[:, 0].reshape(-1, 1) * cluster_splats_array[:, 2:], axis=0) / alpha_sum
-                )
-            else:
-                depth_clusters[cluster_index, 2:] = zeros(3)
-
-        return depth_clusters[argsort(depth_clusters[:, 0])][:, 1:]
+        labels = self.reference_labels(splats)
+
+        # Commutative combination of the splats in each cluster (alpha, color).
+        return self._label_combine(splats[None], labels[None], self.number_of_clusters)[0]
+
+    def compare_inertia(self, pixel_indices: ndarray) -> float:
+        """Compare the k-means objective of the batched engine against the scikit-learn reference.
+
+        The two can settle in different local optima, so their clusters are compared on how well they fit the depths
+        rather than on their colors.
+
+        Args:
+            pixel_indices: Indices of the pixels to compare.
+
+        Returns:
+            Total within cluster sum of squares of the batched engine over that of the reference (1 when both are 0).
+        """
+        from threadpoolctl import threadpool_limits
+
+        splats = asarray(self.splats[pixel_indices])
+        with threadpool_limits(limits=1):
+            reference_labels = array([self.reference_labels(pixel_splats) for pixel_splats in splats])
+        labels = self._batched_labels(splats, asarray(pixel_indices))
+        reference = within_cluster_sum_of_squares(splats[:, :, 1], reference_labels, self.number_of_clusters).sum()
+        batched = within_cluster_sum_of_squares(splats[:, :, 1], labels, self.number_of_clusters).sum()
+        if not reference:
+            return 1.0 if not batched else inf
+        return float(batched / reference)
+
+    def _pixel_tile_cluster(self, splats: ndarray) -> ndarray:
+        # Keep each scikit-learn fit single threaded.
+        from threadpoolctl import threadpool_limits
+
+        with threadpool_limits(limits=1):
+            return super()._pixel_tile_cluster(splats)
+
+    def tile_cluster(self, splats: ndarray) -> ndarray:
+        return self.tile_cluster_at(splats, 0)
+
+    def tile_cluster_at(self, splats: ndarray, start: int, vectorized: bool = True) -> ndarray:
+        """Cluster a tile of pixels at once with the batched 1D Lloyd engine, seeding each pixel by its position.
+
+        Clusters are contiguous depth intervals in 1D, so label order is also median depth order.
+        """
+        if not vectorized:
+            return self._pixel_tile_cluster(splats)
+        labels = self.batched_labels(splats, start)
+
+        # Commutative combination of the splats in each cluster (alpha, color).
+        return self._label_combine(splats, labels, self.number_of_clusters)
+
+    def bytes_per_pixel(self) -> int:
+        # Lloyd assignment compares every splat against every midpoint, and greedy k-means++ keeps two float arrays of
+        # distances from every splat to every candidate centre.
+        trials = local_trials(self.number_of_clusters)
+        return super().bytes_per_pixel() + self.splats.shape[1] * max(self.number_of_clusters, 8 * 2 * trials)
@@ -0,0 +1,143 @@
+from numpy import empty, float64, ndarray
+
+# Each splat of a pixel moves the cluster means the next splat is matched against, so the sequential algorithms cannot
+# be vectorized over splats. With Numba installed (the `jit` extra) their per-pixel loops are compiled over raw arrays,
+# run without the GIL and in parallel over the pixels of a tile. The kernels repeat the reference arithmetic in the same
+# order and precision, so the results are bit for bit the same. Without Numba the algorithms keep their NumPy paths.
+try:
+    from numba import njit, prange, set_num_threads
+
+    KERNELS_AVAILABLE = True
+except ImportError:
+    KERNELS_AVAILABLE = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        # Leave the kernels as plain Python functions.
+        return lambda function: function
+
+
+def set_kernel_threads(number_of_threads: int) -> None:
+    """Set how many threads the compiled kernels launched from the calling thread use (nothing without Numba)."""
+    if KERNELS_AVAILABLE:
+        set_num_threads(number_of_threads)
+
+
+# Cluster field indices (see `sequential_k_means`).
+DEPTH = 0
+SPLAT_COUNT = 1
+ALPHA_SUM = 2
+TRANSMITTANCE = 3
+PREMULTIPLIED_COLOR = 4
+NUMBER_OF_FIELDS = 7
+
+
+@njit(nogil=True, cache=True)
+def _add_splat(clusters: ndarray, target: int, splat: ndarray, one) -> None:
+    """Add a splat to a cluster, in the order and precision of `SequentialKMeansAlgorithm.pixel_cluster`."""
+    alpha = splat[0]
+    clusters[target, SPLAT_COUNT] += 1
+    clusters[target, ALPHA_SUM] += alpha
+    clusters[target, TRANSMITTANCE] *= one - alpha
+    for channel in range(3):
+        clusters[target, PREMULTIPLIED_COLOR + channel] += alpha * splat[2 + channel]
+
+    # Update the cluster mean.
+    current_mean = clusters[target, DEPTH]
+    clusters[target, DEPTH] = current_mean + (splat[1] - current_mean) / clusters[target, SPLAT_COUNT]
+
+
+@njit(nogil=True, cache=True)
+def _nearest_cluster(clusters: ndarray, depth) -> int:
+    """Find the first cluster with the mean closest to a depth, like `argmin(abs(means - depth))`."""
+    target = 0
+    nearest = abs(clusters[0, DEPTH] - depth)
+    for cluster_index in range(1, clusters.shape[0]):
+        distance = abs(clusters[cluster_index, DEPTH] - depth)
+        if distance < nearest:
+            target = cluster_index
+            nearest = distance
+    return target
+
+
+@njit(nogil=True, parallel=True, cache=True)
+def sequential_k_means_kernel(splats: ndarray, number_of_clusters: int, one) -> ndarray:
+    """Cluster a tile of pixels with sequential k-means.
+
+    Args:
+        splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+        number_of_clusters: Number of clusters per pixel.
+        one: 1 in the data type of the splats, so `1 - alpha` is computed in that precision like the reference.
+
+    Returns:
+        Cluster state for the tile (see `finalize_clusters`). Shape: [ number of pixels x [ K x 7 ] ].
+    """
+    output = empty((splats.shape[0], number_of_clusters, NUMBER_OF_FIELDS), dtype=float64)
+    for pixel_index in prange(splats.shape[0]):
+        clusters = output[pixel_index]
+        clusters[:] = 0
+        clusters[:, TRANSMITTANCE] = 1
+        initial_guesses_found = False
+
+        for splat_index in range(splats.shape[1]):
+            splat = splats[pixel_index, splat_index]
+            alpha, depth = splat[0], splat[1]
+
+            # Skip zero alpha or depth.
+            if alpha == 0 or depth == 0:
+                continue
+            target = _nearest_cluster(clusters, depth)
+
+            # While seeding, use a cluster at exactly the same depth, otherwise the first empty cluster.
+            if not initial_guesses_found:
+                for cluster_index in range(number_of_clusters):
+                    if clusters[cluster_index, DEPTH] == depth:
+                        target = cluster_index
+                        break
+                    if clusters[cluster_index, SPLAT_COUNT]:
+                        continue
+                    target = cluster_index
+                    if cluster_index == number_of_clusters - 1:
+                        initial_guesses_found = True
+                    break
+
+            _add_splat(clusters, target, splat, one)
+    return output
+
+
+@njit(nogil=True, parallel=True, cache=True)
+def sequential_k_means_random_init_kernel(splats: ndarray, initial_indices: ndarray, one) -> ndarray:
+    """Cluster a tile of pixels with sequential k-means seeded by given splats.
+
+    Args:
+        splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+        initial_indices: Distinct indices of the non-empty splats that seed each cluster, -1 to leave a cluster
+            empty. Shape: [ number of pixels x K ].
+        one: 1 in the data type of the splats, so `1 - alpha` is computed in that precision like the reference.
+
+    Returns:
+        Cluster state for the tile (see `finalize_clusters`). Shape: [ number of pixels x [ K x 7 ] ].
+    """
+    number_of_clusters = initial_indices.shape[1]
+    output = empty((splats.shape[0], number_of_clusters, NUMBER_OF_FIELDS), dtype=float64)
+    for pixel_index in prange(splats.shape[0]):
+        clusters = output[pixel_index]
+        clusters[:] = 0
+        clusters[:, TRANSMITTANCE] = 1
+
+        # Seed each cluster with its splat.
+        for cluster_index in range(number_of_clusters):
+            initial_index = initial_indices[pixel_index, cluster_index]
+            if initial_index >= 0:
+                _add_splat(clusters, cluster_index, splats[pixel_index, initial_index], one)
+
+        # Cluster the remaining splats, skipping zero alpha or depth.
+        for splat_index in range(splats.shape[1]):
+            seed = False
+            for cluster_index in range(number_of_clusters):
+                seed = seed or initial_indices[pixel_index, cluster_index] == splat_index
+            splat = splats[pixel_index, splat_index]
+            if seed or splat[0] == 0 or splat[1] == 0:
+                continue
+            _add_splat(clusters, _nearest_cluster(clusters, splat[1]), splat, one)
+    return output
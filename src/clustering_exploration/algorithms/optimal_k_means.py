@@ -0,0 +1,271 @@
+from numpy import (
+    arange,
+    argmin,
+    argsort,
+    concatenate,
+    cumsum,
+    empty,
+    flatnonzero,
+    float64,
+    full,
+    inf,
+    int32,
+    intp,
+    minimum,
+    ndarray,
+    nonzero,
+    repeat,
+    take_along_axis,
+    where,
+    zeros,
+)
+
+from clustering_exploration.algorithms.algorithm_base import AlgorithmBase
+
+
+def _optimal_layer(previous_costs: ndarray, sums: ndarray, square_sums: ndarray, counts: ndarray) -> tuple:
+    """Compute one layer of the 1D k-means dynamic program for every pixel of a tile.
+
+    The layer is `cost[i] = min over j <= i of previous_cost[j - 1] + within(j, i)`, with `previous_cost[-1] = 0`. The
+    optimal split point is monotone in `i`, so each pixel is solved by divide and conquer, one recursion level for all
+    pixels at a time.
+
+    Args:
+        previous_costs: Optimal costs of the previous layer. Shape: [ number of pixels x number of splats ].
+        sums: Prefix sums of the sorted depths. Shape: [ number of pixels x number of splats + 1 ].
+        square_sums: Prefix sums of the squared sorted depths. Shape: [ number of pixels x number of splats + 1 ].
+        counts: Number of valid splats per pixel.
+
+    Returns:
+        Optimal costs and split points of the layer, both shaped like `previous_costs`.
+    """
+    costs = zeros(previous_costs.shape)
+    splits = zeros(previous_costs.shape, dtype=int32)
+    shifted_costs = concatenate((zeros((len(previous_costs), 1)), previous_costs), axis=1)
+
+    # One task per pixel: solve points [low, high] with split points in [split_low, split_high].
+    pixels = flatnonzero(counts > 0)
+    low = zeros(len(pixels), dtype=intp)
+    high = counts[pixels] - 1
+    split_low = low.copy()
+    split_high = high.copy()
+
+    # Flat views for cheap gathers.
+    row_length = sums.shape[1]
+    flat_sums = sums.ravel()
+    flat_square_sums = square_sums.ravel()
+    flat_shifted_costs = shifted_costs.ravel()
+
+    while len(pixels):
+        # Evaluate every candidate split of each task's middle point.
+        middle = (low + high) // 2
+        candidate_counts = minimum(middle, split_high) - split_low + 1
+        starts = concatenate(([0], cumsum(candidate_counts)[:-1]))
+        tasks = repeat(arange(len(pixels)), candidate_counts)
+        candidates = split_low[tasks] + arange(len(tasks)) - starts[tasks]
+        starts_flat = (pixels * row_length)[tasks] + candidates
+        ends_flat = (pixels * row_length + middle + 1)[tasks]
+        segment_sums = flat_sums.take(ends_flat) - flat_sums.take(starts_flat)
+        values = flat_shifted_costs.take(starts_flat) + (
+            flat_square_sums.take(ends_flat)
+            - flat_square_sums.take(starts_flat)
+            - segment_sums**2 / (ends_flat - starts_flat)
+        )
+
+        # Keep the first best split of each task.
+        best_values = minimum.reduceat(values, starts)
+        best_positions = minimum.reduceat(where(values == best_values[tasks], arange(len(tasks)), len(tasks)), starts)
+        best_splits = candidates[best_positions]
+        costs[pixels, middle] = best_values
+        splits[pixels, middle] = best_splits
+
+        # Recurse into both halves with the narrowed split ranges.
+        left = middle > low
+        right = middle < high
+        pixels = concatenate((pixels[left], pixels[right]))
+        low, high = concatenate((low[left], middle[right] + 1)), concatenate((middle[left] - 1, high[right]))
+        split_low = concatenate((split_low[left], best_splits[right]))
+        split_high = concatenate((best_splits[left], split_high[right]))
+
+    return costs, splits
+
+
+def optimal_layers(depths: ndarray, valid: ndarray, number_of_clusters: int) -> tuple:
+    """Run the 1D k-means dynamic program for every pixel of a tile up to a number of clusters.
+
+    Layer `k` holds the optimal split points with at most `k + 1` clusters, whatever the final number of clusters, so
+    one run serves every number of clusters up to `number_of_clusters` (see `backtrack_labels`).
+
+    Args:
+        depths: Splat depths. Shape: [ number of pixels x number of splats ].
+        valid: Which splats take part in the clustering. Shape: [ number of pixels x number of splats ].
+        number_of_clusters: Maximum number of clusters per pixel.
+
+    Returns:
+        Depth order of the valid splats of each pixel, the number of valid splats of each pixel, and the split points
+        of each layer. Shapes: [ number of pixels x widest pixel ], [ number of pixels ] and [ number of clusters x
+        number of pixels x widest pixel ].
+    """
+    number_of_pixels = depths.shape[0]
+    counts = valid.sum(axis=1)
+
+    # Keep at least one slot, so tiles without any valid splat still backtrack.
+    width = max(1, int(counts.max(initial=0)))
+
+    # Sort the valid depths of each pixel to the front.
+    order = argsort(where(valid, depths, inf), axis=1, kind="stable")[:, :width]
+    sorted_depths = take_along_axis(depths, order, axis=1).astype(float64)
+    positions = arange(width)
+    in_pixel = positions < counts[:, None]
+
+    # Prefix sums of the depths, shifted by each pixel's nearest depth for precision.
+    sorted_depths = where(in_pixel, sorted_depths - sorted_depths[:, :1], 0)
+    sums = concatenate((zeros((number_of_pixels, 1)), cumsum(sorted_depths, axis=1)), axis=1)
+    square_sums = concatenate((zeros((number_of_pixels, 1)), cumsum(sorted_depths**2, axis=1)), axis=1)
+
+    # First layer: everything up to each point in one cluster. Later layers allow one more cluster each.
+    costs = square_sums[:, 1:] - sums[:, 1:] ** 2 / (positions + 1)
+    layer_splits = empty((number_of_clusters, number_of_pixels, width), dtype=int32)
+    layer_splits[0] = 0
+    for layer in range(1, number_of_clusters):
+        costs, layer_splits[layer] = _optimal_layer(costs, sums, square_sums, counts)
+    return order, counts, layer_splits
+
+
+def backtrack_labels(
+    depths: ndarray, order: ndarray, counts: ndarray, layer_splits: ndarray, number_of_clusters: int
+) -> ndarray:
+    """Recover the optimal partition with at most a number of clusters from the split points of `optimal_layers`.
+
+    Args:
+        depths: Splat depths. Shape: [ number of pixels x number of splats ].
+        order: Depth order of the valid splats of each pixel.
+        counts: Number of valid splats of each pixel.
+        layer_splits: Split points of each layer, with at least `number_of_clusters` layers.
+        number_of_clusters: Maximum number of clusters per pixel.
+
+    Returns:
+        Cluster index of each splat, in depth order (-1 for invalid splats). Pixels that need fewer clusters leave the
+        lowest cluster indices empty. Shape: [ number of pixels x number of splats ].
+    """
+    number_of_pixels, width = order.shape
+    positions = arange(width)
+    in_pixel = positions < counts[:, None]
+
+    # Backtrack from the last point, assigning clusters from the deepest down.
+    sorted_labels = full((number_of_pixels, width), -1, dtype=intp)
+    ends = counts - 1
+    pixel_indices = arange(number_of_pixels)
+    for layer in range(number_of_clusters - 1, -1, -1):
+        remaining = ends >= 0
+        split_points = where(remaining, layer_splits[layer, pixel_indices, ends.clip(0)], 0)
+        members = remaining[:, None] & (positions >= split_points[:, None]) & (positions <= ends[:, None])
+        sorted_labels[members] = layer
+        ends = where(remaining, split_points - 1, -1)
+
+    # Scatter the labels back to the original splat order.
+    labels = full(depths.shape, -1, dtype=intp)
+    labels[nonzero(in_pixel)[0], order[in_pixel]] = sorted_labels[in_pixel]
+    return labels
+
+
+def optimal_labels(depths: ndarray, valid: ndarray, number_of_clusters: int) -> ndarray:
+    """Compute the optimal 1D k-means partition of each pixel of a tile.
+
+    Args:
+        depths: Splat depths. Shape: [ number of pixels x number of splats ].
+        valid: Which splats take part in the clustering. Shape: [ number of pixels x number of splats ].
+        number_of_clusters: Maximum number of clusters per pixel.
+
+    Returns:
+        Cluster index of each splat, in depth order (-1 for invalid splats). Pixels that need fewer clusters leave the
+        lowest cluster indices empty. Shape: [ number of pixels x number of splats ].
+    """
+    order, counts, layer_splits = optimal_layers(depths, valid, number_of_clusters)
+    return backtrack_labels(depths, order, counts, layer_splits, number_of_clusters)
+
+
+class OptimalKMeansAlgorithm(AlgorithmBase):
+    """Exact 1D K-Means clustering algorithm.
+
+    Finds the partition of each pixel's depth sorted splats into at most K contiguous clusters with the lowest within
+    cluster sum of squares, via the Ckmeans dynamic program with divide and conquer (O(K n log n) per pixel). The result
+    is deterministic and is the quality ceiling for the sequential and binned approximations. Zero alpha padding splats
+    are ignored.
+    """
+
+    def __init__(self, splats: ndarray, number_of_clusters: int):
+        """Initialize the algorithm.
+
+        Args:
+            splats: Splats for all pixels. Shape: [ H x W x [ number of splats x [ A, D, R, G, B ] ] ].
+            number_of_clusters: Number of clusters to create.
+        """
+        super().__init__(splats, number_of_clusters)
+
+    def pixel_cluster(self, splats: ndarray) -> ndarray:
+        # Sort the non-transparent splats by depth.
+        valid_indices = flatnonzero(splats[:, 0] > 0)
+        order = valid_indices[argsort(splats[valid_indices, 1], kind="stable")]
+        depths = splats[order, 1].astype(float64)
+        number_of_splats = len(depths)
+
+        # Within cluster sum of squares of every run of sorted splats [first, last], by Welford's running update.
+        within = zeros((number_of_splats, number_of_splats))
+        for first in range(number_of_splats):
+            mean = square_sum = 0.0
+            for last in range(first, number_of_splats):
+                delta = depths[last] - mean
+                mean += delta / (last - first + 1)
+                square_sum += delta * (depths[last] - mean)
+                within[first, last] = square_sum
+
+        # Plain dynamic program: the best cost of the first `last + 1` splats in at most `layer + 1` clusters, keeping
+        # the first best split point.
+        costs = within[0].copy() if number_of_splats else zeros(0)
+        splits = zeros((self.number_of_clusters, number_of_splats), dtype=intp)
+        for layer in range(1, self.number_of_clusters):
+            previous_costs = concatenate(([0.0], costs))
+            for last in range(number_of_splats):
+                candidates = previous_costs[: last + 1] + within[: last + 1, last]
+                splits[layer, last] = argmin(candidates)
+                costs[last] = candidates[splits[layer, last]]
+
+        # Backtrack from the deepest splat, assigning clusters from the deepest down.
+        labels = full(len(splats), -1, dtype=intp)
+        last = number_of_splats - 1
+        for layer in range(self.number_of_clusters - 1, -1, -1):
+            if last < 0:
+                break
+            first = splits[layer, last]
+            labels[order[first : last + 1]] = layer
+            last = first - 1
+
+        # Commutative combination of the splats in each cluster (alpha, color).
+        return self._label_combine(splats[None], labels[None], self.number_of_clusters)[0]
+
+    def tile_cluster(self, splats: ndarray) -> ndarray:
+        """Solve the dynamic program for a tile of pixels at once."""
+        labels = optimal_labels(splats[:, :, 1], splats[:, :, 0] > 0, self.number_of_clusters)
+
+        # Commutative combination of the splats in each cluster (alpha, color).
+        return self._label_combine(splats, labels, self.number_of_clusters)
+
+    def sweep_tile_cluster(self, splats: ndarray, variants: list, start: int = 0) -> list:
+        """Run the dynamic program once for the largest number of clusters, and backtrack every variant from it."""
+        depths = splats[:, :, 1]
+        order, counts, layer_splits = optimal_layers(
+            depths, splats[:, :, 0] > 0, max(variant.number_of_clusters for variant in variants)
+        )
+        return [
+            self._label_combine(
+                splats,
+                backtrack_labels(depths, order, counts, layer_splits, variant.number_of_clusters),
+                variant.number_of_clusters,
+            )
+            for variant in variants
+        ]
+
+    def bytes_per_pixel(self) -> int:
+        # The dynamic program keeps a split point per splat for every layer.
+        return super().bytes_per_pixel() + self.splats.shape[1] * self.number_of_clusters * int32().itemsize
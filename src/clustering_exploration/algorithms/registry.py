@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from importlib import import_module
+
+from numpy import ndarray
+
+# Clustering algorithms by name, as the module and class that implement them. Modules are imported on first use, so
+# running one algorithm only loads its own dependencies (scikit-learn for k-means, Numba for the sequential kernels).
+ALGORITHMS = {
+    "sequential_k_means": ("clustering_exploration.algorithms.sequential_k_means", "SequentialKMeansAlgorithm"),
+    "sequential_k_means_random_init": (
+        "clustering_exploration.algorithms.sequential_k_means_random_init",
+        "SequentialKMeansRandomInitAlgorithm",
+    ),
+    "k_means": ("clustering_exploration.algorithms.k_means", "KMeansAlgorithm"),
+    "optimal_k_means": ("clustering_exploration.algorithms.optimal_k_means", "OptimalKMeansAlgorithm"),
+    "epsilon": ("clustering_exploration.algorithms.epsilon", "EpsilonAlgorithm"),
+    "binned": ("clustering_exploration.algorithms.binned", "BinnedAlgorithm"),
+}
+
+
+def algorithm_class(name: str) -> type:
+    """Get the class of a registered algorithm, importing its module.
+
+    Args:
+        name: Name of the algorithm, a key of `ALGORITHMS`.
+
+    Returns:
+        The `AlgorithmBase` subclass.
+    """
+    if name not in ALGORITHMS:
+        raise ValueError(f"Unknown algorithm: {name} (choose from {', '.join(ALGORITHMS)})")
+    module_name, class_name = ALGORITHMS[name]
+    return getattr(import_module(module_name), class_name)
+
+
+def create_algorithm(name: str, splats: ndarray, *args, **parameters):
+    """Create a registered algorithm.
+
+    Args:
+        name: Name of the algorithm, a key of `ALGORITHMS`.
+        splats: Splats for all pixels. Shape: [ H x W x [ number of splats x [ A, D, R, G, B ] ] ].
+        *args: Positional parameters of the algorithm (like the number of clusters).
+        **parameters: Keyword parameters of the algorithm.
+
+    Returns:
+        The algorithm.
+    """
+    return algorithm_class(name)(splats, *args, **parameters)
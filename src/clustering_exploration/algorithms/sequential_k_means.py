@@ -1,6 +1,27 @@
-from numpy import abs, argmin, argsort, array, ndarray, zeros
+from numpy import (
+    abs,
+    arange,
+    argmax,
+    argmin,
+    argsort,
+    array,
+    asarray,
+    concatenate,
+    divide,
+    flatnonzero,
+    intp,
+    ndarray,
+    take_along_axis,
+    where,
+    zeros,
+    zeros_like,
+)
 
 from clustering_exploration.algorithms.algorithm_base import AlgorithmBase
+from clustering_exploration.algorithms.kernels import (
+    KERNELS_AVAILABLE,
+    sequential_k_means_kernel,
+)
 
 # Cluster field indices.
 DEPTH = 0
@@ -8,17 +29,63 @@ SPLAT_COUNT = 1
 ALPHA_SUM = 2
 TRANSMITTANCE = 3
 PREMULTIPLIED_COLOR = 4
+NUMBER_OF_FIELDS = 7
+
+
+def update_clusters(clusters: ndarray, rows: ndarray, targets: ndarray, splats: ndarray) -> None:
+    """Add one splat to one cluster for each of a set of pixels.
+
+    Args:
+        clusters: Cluster state for a tile of pixels, updated in place. Shape: [ number of pixels x [ K x 7 ] ].
+        rows: Distinct pixel indices (within the tile) to update.
+        targets: Cluster index to update for each row.
+        splats: Splat to add for each row. Shape: [ number of rows x [ A, D, R, G, B ] ].
+    """
+    alpha = splats[:, 0]
+    depth = splats[:, 1]
+
+    # Update cluster information.
+    clusters[rows, targets, SPLAT_COUNT] += 1
+    clusters[rows, targets, ALPHA_SUM] += alpha
+    clusters[rows, targets, TRANSMITTANCE] *= 1 - alpha
+    clusters[rows, targets, PREMULTIPLIED_COLOR:] += alpha[:, None] * splats[:, 2:]
+
+    # Update cluster mean.
+    current_mean = clusters[rows, targets, DEPTH]
+    clusters[rows, targets, DEPTH] = current_mean + (depth - current_mean) / clusters[rows, targets, SPLAT_COUNT]
+
+
+def finalize_clusters(clusters: ndarray) -> ndarray:
+    """Convert cluster state into depth sorted clusters.
+
+    Empty clusters come out as zeros, where the per-pixel path leaves a NaN color behind a zero alpha.
+
+    Args:
+        clusters: Cluster state for a tile of pixels. Shape: [ number of pixels x [ K x 7 ] ].
+
+    Returns:
+        Clusters sorted by mean depth. Shape: [ number of pixels x [ K x [ A, R, G, B ] ] ].
+    """
+    # Final alpha is (1 - transmittance) and final color is (premultiplied color / alpha sum).
+    alpha_sum = clusters[:, :, ALPHA_SUM, None]
+    premultiplied_color = clusters[:, :, PREMULTIPLIED_COLOR:]
+    color = divide(premultiplied_color, alpha_sum, out=zeros_like(premultiplied_color), where=alpha_sum != 0)
+    output = concatenate((1 - clusters[:, :, TRANSMITTANCE, None], color), axis=2)
+
+    # Sort clusters by depth (stable, like the insertion sort NumPy uses on short per-pixel arrays).
+    order = argsort(clusters[:, :, DEPTH], axis=1, kind="stable")
+    return take_along_axis(output, order[:, :, None], axis=1)
+
 
 class SequentialKMeansAlgorithm(AlgorithmBase):
     """Offline K-Means clustering algorithm."""
 
-
     def __init__(self, splats: ndarray, number_of_clusters: int):
         super().__init__(splats, number_of_clusters)
 
-        # Flag for if initial guesses have been made.
-        self.initial_guesses_found = False
-        
+        # Use the compiled kernel for tiles when Numba is installed.
+        self.use_kernels = KERNELS_AVAILABLE
+
     def pixel_cluster(self, splats: ndarray) -> ndarray:
         # For each pixel, [ K x [ mean, number, alpha_sum, transmittance, premultiplied_r, premultiplied_g, premultiplied_b ] ]
         # After clustering, (1 - transmittance) gives final cluster alpha, and (pre_multiplied_color / alpha_sum) gives final cluster color
@@ -43,19 +110,19 @@ class SequentialKMeansAlgorithm(AlgorithmBase):
                     if cluster[DEPTH] == depth:
                         target_cluster_index = cluster_index
                         break
-                    
+
                     # Skip if cluster is not empty.
                     if cluster[SPLAT_COUNT]:
                         continue
-                        
+
                     # Use the cluster if it's empty.
                     target_cluster_index = cluster_index
-                    
+
                     # If all clusters have been used, stop looking.
                     if cluster_index == self.number_of_clusters - 1:
                         initial_guesses_found = True
-                    
-                    # We've found a cluster if we got here, so stop looking. 
+
+                    # We've found a cluster if we got here, so stop looking.
                     break
 
 
@@ -76,3 +143,50 @@ class SequentialKMeansAlgorithm(AlgorithmBase):
 
         # Sort clusters and return.
         return clusters[argsort(clusters[:, DEPTH])][:, TRANSMITTANCE:]
+
+    def tile_cluster(self, splats: ndarray) -> ndarray:
+        """Cluster a tile of pixels at once by stepping through the splat slots in order.
+
+        Matches `pixel_cluster` to within 1e-6 (in practice bit for bit) on every non-empty cluster; empty clusters are
+        returned as zeros instead of carrying a NaN color. With `use_kernels`, each pixel is clustered by the compiled
+        kernel instead, bit for bit like `pixel_cluster`.
+        """
+        if self.use_kernels:
+            splats = asarray(splats)
+            return finalize_clusters(sequential_k_means_kernel(splats, self.number_of_clusters, splats.dtype.type(1)))
+
+        number_of_pixels = splats.shape[0]
+        cluster_indices = arange(self.number_of_clusters)
+
+        # Same state as the per-pixel path, one [ K x 7 ] block per pixel.
+        clusters = zeros((number_of_pixels, self.number_of_clusters, NUMBER_OF_FIELDS))
+        clusters[:, :, TRANSMITTANCE] = 1
+
+        # Number of seeded clusters per pixel. Clusters are seeded in order, so they always form a prefix.
+        seeded = zeros(number_of_pixels, dtype=intp)
+
+        # Skip zero alpha or depth, and slots that are padding in every pixel.
+        valid = (splats[:, :, 0] != 0) & (splats[:, :, 1] != 0)
+        for slot in flatnonzero(valid.any(axis=0)):
+            rows = flatnonzero(valid[:, slot])
+            depth = splats[rows, slot, 1, None]
+            means = clusters[rows, :, DEPTH]
+            rows_seeded = seeded[rows]
+
+            # Compute cluster index.
+            target_cluster_indices = argmin(abs(means - depth), axis=1)
+
+            # While seeding, use a seeded cluster at exactly the same depth, otherwise the next empty cluster.
+            exact_match = (means == depth) & (cluster_indices < rows_seeded[:, None])
+            seeding = rows_seeded < self.number_of_clusters
+            target_cluster_indices = where(
+                seeding,
+                where(exact_match.any(axis=1), argmax(exact_match, axis=1), rows_seeded),
+                target_cluster_indices,
+            )
+            seeded[rows] += seeding & (target_cluster_indices == rows_seeded)
+
+            # Update cluster information.
+            update_clusters(clusters, rows, target_cluster_indices, splats[rows, slot])
+
+        return finalize_clusters(clusters)
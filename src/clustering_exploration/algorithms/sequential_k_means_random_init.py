@@ -1,7 +1,35 @@
-from numpy import abs, argmin, argsort, array, ndarray, zeros
-from random import randint
-
-from clustering_exploration.algorithms.algorithm_base import AlgorithmBase
+from numpy import (
+    abs,
+    arange,
+    argmax,
+    argmin,
+    argsort,
+    array,
+    asarray,
+    cumsum,
+    flatnonzero,
+    full,
+    intp,
+    minimum,
+    ndarray,
+    put_along_axis,
+    where,
+    zeros,
+)
+
+from clustering_exploration.algorithms.algorithm_base import (
+    AlgorithmBase,
+    pixel_random_values,
+)
+from clustering_exploration.algorithms.kernels import (
+    KERNELS_AVAILABLE,
+    sequential_k_means_random_init_kernel,
+)
+from clustering_exploration.algorithms.sequential_k_means import (
+    NUMBER_OF_FIELDS,
+    finalize_clusters,
+    update_clusters,
+)
 
 # Cluster field indices.
 DEPTH = 0
@@ -14,8 +42,20 @@ PREMULTIPLIED_COLOR = 4
 class SequentialKMeansRandomInitAlgorithm(AlgorithmBase):
     """Offline K-Means clustering algorithm."""
 
-    def __init__(self, splats: ndarray, number_of_clusters: int):
+    def __init__(self, splats: ndarray, number_of_clusters: int, seed: int = 0):
+        """Initialize the algorithm.
+
+        Args:
+            splats: Splats for all pixels. Shape: [ H x W x [ number of splats x [ A, D, R, G, B ] ] ].
+            number_of_clusters: Number of clusters to create.
+            seed: Seed of the random initial guesses. The same seed gives the same clusters whatever the block size,
+                backend or number of workers.
+        """
         super().__init__(splats, number_of_clusters)
+        self.seed = seed
+
+        # Use the compiled kernel for tiles when Numba is installed.
+        self.use_kernels = KERNELS_AVAILABLE
 
     def cluster_splat(self, clusters: ndarray, target_cluster_index: int, splat: ndarray) -> None:
         # Extract splat information.
@@ -36,43 +76,69 @@ class SequentialKMeansRandomInitAlgorithm(AlgorithmBase):
         clusters[target_cluster_index, DEPTH] = current_mean + (depth - current_mean) / clusters[
             target_cluster_index, SPLAT_COUNT]
 
-    def pixel_cluster(self, splats: ndarray) -> ndarray:
-        # For each pixel, [ K x [ mean, number, alpha_sum, transmittance, premultiplied_r, premultiplied_g, premultiplied_b ] ]
-        # After clustering, (1 - transmittance) gives final cluster alpha, and (pre_multiplied_color / alpha_sum) gives final cluster color
-        clusters = zeros((self.number_of_clusters, 7))
-        clusters[:, TRANSMITTANCE] = 1
-
-        # Remember which splat index was used for initialization
-        splat_index_used_for_init = set()
+    def initial_splat_indices(self, splats: ndarray, start: int = 0) -> ndarray:
+        """Pick the distinct non-empty splats that seed the clusters of a tile of pixels.
 
-        # Find initial guesses by getting a random splat.
-        for cluster_index in range(self.number_of_clusters):
-            # Pick a random splat index.
-            random_splat_index = randint(0, splats.shape[0] - 1)
+        Each cluster in turn is seeded by a uniformly random non-empty splat among those not picked yet, so every
+        ordered choice of K non-empty splats is equally likely. The random values come from `pixel_random_values`, one
+        per cluster, so a pixel's seeds depend only on its position and its non-empty splats: they never depend on how
+        the image is split into blocks, nor on zero padding (see `RaggedSplats`).
 
-            # Ensure that splat wasn't picked before.
-            while random_splat_index in splat_index_used_for_init:
-                random_splat_index = randint(0, splats.shape[0] - 1)
+        Args:
+            splats: Splats for a tile of pixels. Shape: [ number of pixels x [ number of splats x [ A, D, R, G, B ] ] ].
+            start: Index of the first pixel of the tile.
 
-            # Get the random splat.
-            random_splat = splats[random_splat_index]
+        Returns:
+            Index of the seed splat of each cluster, and -1 for the clusters left over in pixels with fewer than K
+            non-empty splats. Shape: [ number of pixels x K ].
+        """
+        number_of_pixels = splats.shape[0]
+        available = (splats[:, :, 0] != 0) & (splats[:, :, 1] != 0)
+        number_of_valid_splats = available.sum(axis=1)
 
-            # TODO: ensure empty splat was not chosen.
+        # Draw the values of the tile's pixels from the random streams of the image.
+        values = pixel_random_values(self.seed, arange(start, start + number_of_pixels), self.number_of_clusters)
 
-            # Initialize cluster.
-            self.cluster_splat(clusters, cluster_index, random_splat)
+        initial_indices = full((number_of_pixels, self.number_of_clusters), -1, dtype=intp)
+        for cluster_index in range(self.number_of_clusters):
+            number_left = number_of_valid_splats - cluster_index
+            rows = flatnonzero(number_left > 0)
+
+            # Take the splat of a random rank among the non-empty splats not picked yet.
+            ranks = minimum((values[rows, cluster_index] * number_left[rows]).astype(intp), number_left[rows] - 1)
+            picks = argmax(cumsum(available[rows], axis=1) > ranks[:, None], axis=1)
+            initial_indices[rows, cluster_index] = picks
+            available[rows, picks] = False
+        return initial_indices
+
+    def seeded_pixel_cluster(self, splats: ndarray, initial_indices: ndarray) -> ndarray:
+        """Cluster the splats for a pixel from given initial guesses.
+
+        Args:
+            splats: Splats for a single pixel. Shape: [ number of splats x [ A, D, R, G, B ] ].
+            initial_indices: Index of the seed splat of each cluster, -1 to leave it empty. Shape: [ K ].
+
+        Returns:
+            Clustered splats for the pixel. Shape: [ number of clusters x [ A, R, G, B ] ].
+        """
+        # For each pixel, [ K x [ mean, number, alpha_sum, transmittance, premultiplied_r, premultiplied_g, premultiplied_b ] ]
+        # After clustering, (1 - transmittance) gives final cluster alpha, and (pre_multiplied_color / alpha_sum) gives final cluster color
+        clusters = zeros((self.number_of_clusters, 7))
+        clusters[:, TRANSMITTANCE] = 1
 
-            # Record the usage of the splat index.
-            splat_index_used_for_init.add(random_splat_index)
+        # Initialize each cluster with its seed splat.
+        for cluster_index, initial_index in enumerate(initial_indices):
+            if initial_index >= 0:
+                self.cluster_splat(clusters, cluster_index, array(splats[initial_index]))
 
         # Cluster the remaining splats.
         for splat_index, splat in enumerate(splats):
             # Skip splats used for initialization.
-            if splat_index in splat_index_used_for_init:
+            if splat_index in initial_indices:
                 continue
 
             # Compute cluster index.
-            splat_depth = splat[DEPTH]
+            splat_depth = splat[1]
             target_cluster_index = argmin(abs(clusters[:, DEPTH] - splat_depth))
 
             # Update cluster information.
@@ -85,3 +151,51 @@ class SequentialKMeansRandomInitAlgorithm(AlgorithmBase):
 
         # Sort clusters and return.
         return clusters[argsort(clusters[:, DEPTH])][:, TRANSMITTANCE:]
+
+    def pixel_cluster(self, splats: ndarray) -> ndarray:
+        # A lone pixel is seeded like the first pixel of the image.
+        return self.seeded_pixel_cluster(splats, self.initial_splat_indices(asarray(splats)[None])[0])
+
+    def tile_cluster(self, splats: ndarray) -> ndarray:
+        return self.tile_cluster_at(splats, 0)
+
+    def _pixel_tile_cluster(self, splats: ndarray) -> ndarray:
+        return self.tile_cluster_at(splats, 0, vectorized=False)
+
+    def tile_cluster_at(self, splats: ndarray, start: int, vectorized: bool = True) -> ndarray:
+        """Cluster a tile of pixels, seeding each pixel by its position in the image (see `initial_splat_indices`).
+
+        The remaining splats are clustered by the compiled kernel when available, otherwise by stepping through the
+        splat slots in order for all pixels at once. Both match `seeded_pixel_cluster` bit for bit on every non-empty
+        cluster; empty clusters are returned as zeros instead of carrying a NaN color.
+        """
+        splats = asarray(splats)
+        initial_indices = self.initial_splat_indices(splats, start)
+        if not vectorized:
+            return self._stack_clusters(
+                [self.seeded_pixel_cluster(*pixel)[None] for pixel in zip(splats, initial_indices)]
+            )
+        if self.use_kernels:
+            return finalize_clusters(
+                sequential_k_means_random_init_kernel(splats, initial_indices, splats.dtype.type(1))
+            )
+
+        # Same state as the per-pixel path, one [ K x 7 ] block per pixel.
+        clusters = zeros((splats.shape[0], self.number_of_clusters, NUMBER_OF_FIELDS))
+        clusters[:, :, TRANSMITTANCE] = 1
+
+        # Initialize each cluster with its seed splat.
+        for cluster_index in range(self.number_of_clusters):
+            rows = flatnonzero(initial_indices[:, cluster_index] >= 0)
+            update_clusters(clusters, rows, cluster_index, splats[rows, initial_indices[rows, cluster_index]])
+
+        # Cluster the remaining splats, skipping zero alpha or depth.
+        remaining = (splats[:, :, 0] != 0) & (splats[:, :, 1] != 0)
+        # Pixels with empty clusters have no remaining splats, so their -1 indices can point anywhere.
+        put_along_axis(remaining, where(initial_indices >= 0, initial_indices, 0), False, axis=1)
+        for slot in flatnonzero(remaining.any(axis=0)):
+            rows = flatnonzero(remaining[:, slot])
+            target_cluster_indices = argmin(abs(clusters[rows, :, DEPTH] - splats[rows, slot, 1, None]), axis=1)
+            update_clusters(clusters, rows, target_cluster_indices, splats[rows, slot])
+
+        return finalize_clusters(clusters)
@@ -0,0 +1,370 @@
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from io import StringIO
+from json import dump, load
+from multiprocessing import get_context
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from warnings import catch_warnings, simplefilter
+
+from numpy import abs, array, asarray, linspace, unique
+from numpy import load as load_array
+
+from clustering_exploration.algorithms.algorithm_base import (
+    PROCESS_BACKEND,
+    SERIAL_BACKEND,
+)
+from clustering_exploration.algorithms.registry import ALGORITHMS, create_algorithm
+from clustering_exploration.benchmark.synthetic import write_synthetic_cache
+from clustering_exploration.utils.constants import PIXEL_TILE_SIZE
+from clustering_exploration.utils.image_handler import (
+    alpha_compose_clusters,
+    alpha_compose_splats,
+)
+from clustering_exploration.utils.profiling import peak_rss
+
+# Benchmarked algorithms (see `ALGORITHMS`) and their parameters.
+BENCHMARKS = {
+    "sequential_k_means": {"number_of_clusters": 8},
+    "sequential_k_means_random_init": {"number_of_clusters": 8},
+    "k_means": {"num_clusters": 8},
+    "optimal_k_means": {"number_of_clusters": 8},
+    "epsilon": {"epsilon": 0.11},
+    "binned": {"number_of_clusters": 8},
+}
+COMPOSITOR = "compositor"
+
+# Algorithms whose fast path can settle in a different local optimum than the per-pixel reference. They are checked
+# on their k-means objective instead (see `KMeansAlgorithm.compare_inertia`).
+APPROXIMATE = {"k_means"}
+
+# Largest difference from the per-pixel reference that still counts as agreement.
+AGREEMENT_TOLERANCE = 1e-5
+
+# Largest ratio of an approximate algorithm's k-means objective to the reference's that still counts as agreement. The
+# batched engine and scikit-learn both seed with greedy k-means++ but draw different values, so they can settle in
+# different local optima (within a few percent on synthetic splats).
+INERTIA_RATIO_TOLERANCE = 1.1
+
+# Relative throughput drop from the baseline that counts as a regression.
+REGRESSION_TOLERANCE = 0.1
+
+
+def _sample(number_of_pixels: int, number_of_samples: int):
+    return unique(
+        linspace(
+            0, number_of_pixels - 1, min(number_of_pixels, number_of_samples)
+        ).astype(int)
+    )
+
+
+def benchmark_algorithm(
+    name: str, cache_path: str, block_size: int, agreement_pixels: int
+) -> dict:
+    """Benchmark one algorithm on a splat cache.
+
+    Times each stage (setup, clustering with `compute` serially and with the default process backend, compositing the
+    clusters, and the per-pixel reference on a sample), and checks the fast path against the per-pixel reference with
+    `compare_modes`, or `compare_inertia` for approximate algorithms. Algorithms with compiled kernels are also
+    clustered without them, to report the kernels' speed-up.
+
+    Args:
+        name: Name of the algorithm, a key of `BENCHMARKS`.
+        cache_path: Path of the `.npy` splat cache.
+        block_size: Number of pixels per block.
+        agreement_pixels: Number of pixels to check against the per-pixel reference.
+
+    Returns:
+        Pixels per second, peak RSS in bytes, seconds per stage, largest difference from the reference, the ratio
+        of the k-means objectives (approximate algorithms only, None otherwise), whether the paths agree and the
+        speed-up of compiled kernels (None without them) and of the process backend over serial clustering.
+    """
+    splats = load_array(cache_path, mmap_mode="r")
+    stage_seconds = {}
+
+    # Keep the algorithms' own reports and warnings out of the benchmark output.
+    with redirect_stdout(StringIO()), catch_warnings():
+        simplefilter("ignore")
+        start_time = perf_counter()
+        algorithm = create_algorithm(name, splats, **BENCHMARKS[name])
+        # Warm up (compiling kernels for read only memory mapped splats, as `compute` passes them).
+        algorithm.tile_cluster(asarray(splats[:1]))
+        stage_seconds["setup"] = perf_counter() - start_time
+
+        start_time = perf_counter()
+        clusters = algorithm.compute(
+            block_size=block_size, backend=SERIAL_BACKEND, progress=False
+        )
+        stage_seconds["cluster"] = perf_counter() - start_time
+
+        start_time = perf_counter()
+        alpha_compose_clusters(asarray(clusters.trimmed()))
+        stage_seconds["compose"] = perf_counter() - start_time
+
+        # Time the default backend too, where blocks run in worker processes on every core.
+        start_time = perf_counter()
+        algorithm.compute(
+            block_size=block_size, backend=PROCESS_BACKEND, progress=False
+        )
+        stage_seconds["cluster_process"] = perf_counter() - start_time
+
+        start_time = perf_counter()
+        sample = _sample(len(splats), agreement_pixels)
+        max_difference = algorithm.compare_modes(sample)
+        inertia_ratio = (
+            algorithm.compare_inertia(sample) if name in APPROXIMATE else None
+        )
+        stage_seconds["reference"] = perf_counter() - start_time
+
+        # Time the NumPy path of algorithms that use compiled kernels.
+        kernel_speed_up = None
+        if getattr(algorithm, "use_kernels", False):
+            algorithm.use_kernels = False
+            start_time = perf_counter()
+            algorithm.compute(
+                block_size=block_size, backend=SERIAL_BACKEND, progress=False
+            )
+            stage_seconds["cluster_without_kernels"] = perf_counter() - start_time
+            kernel_speed_up = (
+                stage_seconds["cluster_without_kernels"] / stage_seconds["cluster"]
+            )
+
+    return {
+        "pixels_per_second": len(splats) / stage_seconds["cluster"],
+        "peak_rss_bytes": peak_rss(),
+        "stage_seconds": stage_seconds,
+        "max_difference": max_difference,
+        "inertia_ratio": inertia_ratio,
+        "agrees": (
+            inertia_ratio <= INERTIA_RATIO_TOLERANCE
+            if name in APPROXIMATE
+            else max_difference <= AGREEMENT_TOLERANCE
+        ),
+        "kernel_speed_up": kernel_speed_up,
+        "process_speed_up": stage_seconds["cluster"] / stage_seconds["cluster_process"],
+    }
+
+
+def benchmark_compositor(
+    cache_path: str, block_size: int, agreement_pixels: int
+) -> dict:
+    """Benchmark the vectorized compositor on raw splats, checked against `alpha_compose_splats`.
+
+    Args:
+        cache_path: Path of the `.npy` splat cache.
+        block_size: Number of pixels per block.
+        agreement_pixels: Number of pixels to check against the per-pixel compositor.
+
+    Returns:
+        Same fields as `benchmark_algorithm`.
+    """
+    splats = load_array(cache_path, mmap_mode="r")
+    stage_seconds = {"compose": 0.0}
+
+    for start in range(0, len(splats), block_size):
+        tile = array(splats[start : start + block_size, :, [0, 2, 3, 4]])
+        start_time = perf_counter()
+        alpha_compose_clusters(tile)
+        stage_seconds["compose"] += perf_counter() - start_time
+
+    start_time = perf_counter()
+    sample = array(splats[_sample(len(splats), agreement_pixels)][:, :, [0, 2, 3, 4]])
+    reference = array([alpha_compose_splats(pixel_splats) for pixel_splats in sample])
+    stage_seconds["reference"] = perf_counter() - start_time
+    max_difference = float(
+        abs(reference - alpha_compose_clusters(sample)).max(initial=0)
+    )
+
+    return {
+        "pixels_per_second": len(splats) / stage_seconds["compose"],
+        "peak_rss_bytes": peak_rss(),
+        "stage_seconds": stage_seconds,
+        "max_difference": max_difference,
+        "inertia_ratio": None,
+        "agrees": max_difference <= AGREEMENT_TOLERANCE,
+        "kernel_speed_up": None,
+        "process_speed_up": None,
+    }
+
+
+def run_benchmarks(
+    number_of_pixels: int = 16384,
+    names: list | None = None,
+    block_size: int = PIXEL_TILE_SIZE,
+    agreement_pixels: int = 64,
+    **synthetic_config,
+) -> dict:
+    """Benchmark algorithms and the compositor on deterministic synthetic splats.
+
+    Each benchmark runs in a fresh process, so its peak RSS is its own.
+
+    Args:
+        number_of_pixels: Number of synthetic pixels.
+        names: Benchmarks to run (keys of `BENCHMARKS`, or `COMPOSITOR`). All by default.
+        block_size: Number of pixels per block.
+        agreement_pixels: Number of pixels to check against the per-pixel references.
+        **synthetic_config: Generation parameters, see `synthetic_tile`.
+
+    Returns:
+        The configuration and the results of each benchmark.
+    """
+    names = names or [*BENCHMARKS, COMPOSITOR]
+
+    # Flag algorithms the suite does not know how to run.
+    missing = set(ALGORITHMS) - set(BENCHMARKS)
+    if missing:
+        print(f"No benchmark parameters for: {', '.join(sorted(missing))}")
+
+    results = {}
+    with TemporaryDirectory() as directory:
+        cache_path = join(directory, "synthetic.npy")
+        write_synthetic_cache(cache_path, number_of_pixels, **synthetic_config)
+
+        for name in names:
+            with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+                if name == COMPOSITOR:
+                    future = executor.submit(
+                        benchmark_compositor, cache_path, block_size, agreement_pixels
+                    )
+                else:
+                    future = executor.submit(
+                        benchmark_algorithm,
+                        name,
+                        cache_path,
+                        block_size,
+                        agreement_pixels,
+                    )
+                results[name] = future.result()
+
+    config = {
+        "number_of_pixels": number_of_pixels,
+        "block_size": block_size,
+        **synthetic_config,
+    }
+    return {"config": config, "results": results}
+
+
+def compare_to_baseline(
+    report: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE
+) -> dict:
+    """Compare benchmark throughput against a baseline report.
+
+    Args:
+        report: Report from `run_benchmarks`.
+        baseline: Earlier report to compare against.
+        tolerance: Relative throughput drop that counts as a regression.
+
+    Returns:
+        For each benchmark in both reports, the throughput ratio to the baseline and whether it regressed.
+    """
+    if report["config"] != baseline["config"]:
+        print(
+            "Benchmark configurations differ from the baseline; throughput is not directly comparable."
+        )
+
+    comparison = {}
+    for name, result in report["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = (
+            result["pixels_per_second"] / baseline["results"][name]["pixels_per_second"]
+        )
+        comparison[name] = {"ratio": ratio, "regressed": ratio < 1 - tolerance}
+    return comparison
+
+
+def format_report(report: dict, comparison: dict | None = None) -> str:
+    """Format a benchmark report as a table.
+
+    Args:
+        report: Report from `run_benchmarks`.
+        comparison: Optional comparison from `compare_to_baseline`.
+
+    Returns:
+        The table.
+    """
+    lines = [
+        (
+            f"{'benchmark':<32}{'px/s':>12}{'peak MB':>10}{'max diff':>12}{'inertia':>9}{'agrees':>8}{'kernels':>10}"
+            f"{'process':>10}{'vs base':>10}  stages (s)"
+        )
+    ]
+    for name, result in report["results"].items():
+        stages = ", ".join(
+            f"{stage} {seconds:.3f}"
+            for stage, seconds in result["stage_seconds"].items()
+        )
+        ratio = (
+            f"{comparison[name]['ratio']:.2f}x"
+            if comparison and name in comparison
+            else "-"
+        )
+        if comparison and comparison.get(name, {}).get("regressed"):
+            ratio += "!"
+        speed_up = result.get("kernel_speed_up")
+        speed_up = "-" if speed_up is None else f"{speed_up:.1f}x"
+        process_speed_up = result.get("process_speed_up")
+        process_speed_up = (
+            "-" if process_speed_up is None else f"{process_speed_up:.1f}x"
+        )
+        inertia_ratio = result.get("inertia_ratio")
+        inertia_ratio = "-" if inertia_ratio is None else f"{inertia_ratio:.2f}x"
+        peak = (
+            "-"
+            if result["peak_rss_bytes"] is None
+            else f"{result['peak_rss_bytes'] / 1e6:.0f}"
+        )
+        lines.append(
+            f"{name:<32}{result['pixels_per_second']:>12.0f}{peak:>10}"
+            f"{result['max_difference']:>12.2e}{inertia_ratio:>9}{result['agrees']!s:>8}{speed_up:>10}"
+            f"{process_speed_up:>10}{ratio:>10}  {stages}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(
+        description="Benchmark the clustering algorithms on synthetic splats."
+    )
+    parser.add_argument(
+        "--pixels", type=int, default=16384, help="Number of synthetic pixels."
+    )
+    parser.add_argument(
+        "--benchmarks",
+        nargs="*",
+        help=f"Benchmarks to run: {', '.join([*BENCHMARKS, COMPOSITOR])}.",
+    )
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=PIXEL_TILE_SIZE,
+        help="Number of pixels per block.",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the synthetic splats."
+    )
+    parser.add_argument(
+        "--baseline", type=str, help="Baseline report to compare against."
+    )
+    parser.add_argument(
+        "--save", type=str, help="Save the report (for example as a new baseline)."
+    )
+    args = parser.parse_args()
+
+    benchmark_report = run_benchmarks(
+        args.pixels, args.benchmarks, args.block_size, seed=args.seed
+    )
+    baseline_comparison = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline_comparison = compare_to_baseline(benchmark_report, load(file))
+    print(format_report(benchmark_report, baseline_comparison))
+
+    if args.save:
+        with open(args.save, "w") as file:
+            dump(benchmark_report, file, indent=4)
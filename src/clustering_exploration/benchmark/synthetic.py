@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from os import makedirs
+from os.path import dirname
+
+from numpy import (
+    arange,
+    argsort,
+    clip,
+    concatenate,
+    empty,
+    float32,
+    inf,
+    ndarray,
+    take_along_axis,
+    uint8,
+    uint32,
+    where,
+    zeros,
+)
+from numpy.lib.format import open_memmap
+from numpy.random import default_rng
+from polars import DataFrame
+
+from clustering_exploration.utils.constants import NUMBER_OF_SPLATS_PER_PIXEL
+from clustering_exploration.utils.data_handler import METADATA_COLUMNS, define_schema
+from clustering_exploration.utils.image_handler import alpha_compose_clusters
+
+# Pixels generated per random stream. Each tile has its own seed, so the data does not depend on how it is written.
+GENERATION_TILE_SIZE = 1024
+
+# Most depth clusters (surfaces) a pixel can have.
+MAXIMUM_SURFACES = 16
+
+
+def synthetic_tile(
+    tile_index: int,
+    number_of_pixels: int,
+    seed: int = 0,
+    splats_per_pixel: int = NUMBER_OF_SPLATS_PER_PIXEL,
+    mean_splats: float = 60,
+    empty_fraction: float = 0.05,
+    mean_surfaces: float = 3,
+    depth_range: tuple = (0.5, 20.0),
+    depth_spread: float = 0.02,
+    alpha_shape: tuple = (0.6, 3.0),
+    maximum_alpha: float = 0.99,
+) -> ndarray:
+    """Generate one tile of synthetic splats, laid out like the rasterizer output.
+
+    Each pixel gets a Poisson number of real splats (some pixels none at all), spread over a Poisson number of
+    surfaces at uniform depths. Splat depths scatter around their surface by `depth_spread` (relative to the depth),
+    alphas follow a scaled Beta distribution, and colors scatter around a color per surface. Real splats come first in
+    depth order, followed by zero padding.
+
+    Args:
+        tile_index: Index of the tile, which seeds it together with `seed`.
+        number_of_pixels: Number of pixels in the tile.
+        seed: Seed of the dataset.
+        splats_per_pixel: Number of splat slots per pixel.
+        mean_splats: Mean number of real splats per pixel.
+        empty_fraction: Fraction of pixels without any splat.
+        mean_surfaces: Mean number of depth clusters per pixel (at least one).
+        depth_range: Nearest and farthest surface depth.
+        depth_spread: Standard deviation of splat depths around their surface, relative to the surface depth.
+        alpha_shape: Beta distribution parameters of the alphas.
+        maximum_alpha: Alphas are scaled to at most this.
+
+    Returns:
+        Splats for the tile. Shape: [ number of pixels x [ splats per pixel x [ A, D, R, G, B ] ] ].
+    """
+    rng = default_rng([seed, tile_index])
+    slots = arange(splats_per_pixel)
+
+    # Number of real splats and surfaces of each pixel.
+    counts = clip(rng.poisson(mean_splats, number_of_pixels), 0, splats_per_pixel)
+    counts[rng.random(number_of_pixels) < empty_fraction] = 0
+    surfaces = clip(
+        1 + rng.poisson(max(mean_surfaces - 1, 0), number_of_pixels),
+        1,
+        MAXIMUM_SURFACES,
+    )
+
+    # Surface depths and colors, and the surface each splat belongs to.
+    surface_depths = rng.uniform(*depth_range, (number_of_pixels, MAXIMUM_SURFACES))
+    surface_colors = rng.random((number_of_pixels, MAXIMUM_SURFACES, 3))
+    splat_surfaces = (
+        rng.random((number_of_pixels, splats_per_pixel)) * surfaces[:, None]
+    ).astype(int)
+
+    # Draw the splats around their surfaces.
+    splats = empty((number_of_pixels, splats_per_pixel, 5), dtype=float32)
+    depths = take_along_axis(surface_depths, splat_surfaces, axis=1)
+    depths *= 1 + depth_spread * rng.standard_normal(depths.shape)
+    splats[:, :, 0] = maximum_alpha * rng.beta(
+        *alpha_shape, (number_of_pixels, splats_per_pixel)
+    )
+    splats[:, :, 1] = clip(depths, depth_range[0] / 2, None)
+    splats[:, :, 2:] = clip(
+        take_along_axis(surface_colors, splat_surfaces[:, :, None], axis=1)
+        + 0.05 * rng.standard_normal((number_of_pixels, splats_per_pixel, 3)),
+        0,
+        1,
+    )
+
+    # Keep each pixel's real splats in depth order at the front, and zero the rest.
+    real = slots < counts[:, None]
+    order = argsort(where(real, splats[:, :, 1], inf), axis=1, kind="stable")
+    splats = take_along_axis(splats, order[:, :, None], axis=1)
+    splats[~real] = 0
+    return splats
+
+
+def synthetic_tiles(number_of_pixels: int, **config):
+    """Generate synthetic splats one tile at a time.
+
+    Args:
+        number_of_pixels: Number of pixels to generate.
+        **config: Generation parameters, see `synthetic_tile`.
+
+    Yields:
+        Index of the first pixel of each tile, and the tile's splats.
+    """
+    for tile_index, start in enumerate(
+        range(0, number_of_pixels, GENERATION_TILE_SIZE)
+    ):
+        yield (
+            start,
+            synthetic_tile(
+                tile_index,
+                min(GENERATION_TILE_SIZE, number_of_pixels - start),
+                **config,
+            ),
+        )
+
+
+def generate_splats(number_of_pixels: int, **config) -> ndarray:
+    """Generate synthetic splats in memory.
+
+    Args:
+        number_of_pixels: Number of pixels to generate.
+        **config: Generation parameters, see `synthetic_tile`.
+
+    Returns:
+        Splats for all pixels. Shape: [ number of pixels x [ splats per pixel x [ A, D, R, G, B ] ] ].
+    """
+    tiles = [tile for _, tile in synthetic_tiles(number_of_pixels, **config)]
+    return (
+        concatenate(tiles)
+        if tiles
+        else zeros((0, config.get("splats_per_pixel", NUMBER_OF_SPLATS_PER_PIXEL), 5))
+    )
+
+
+def write_synthetic_cache(cache_path: str, number_of_pixels: int, **config) -> None:
+    """Write synthetic splats as a `.npy` splat cache (the layout `load_splats` reads).
+
+    Args:
+        cache_path: Path of the `.npy` cache to create.
+        number_of_pixels: Number of pixels to generate.
+        **config: Generation parameters, see `synthetic_tile`.
+    """
+    makedirs(dirname(cache_path) or ".", exist_ok=True)
+    splats_per_pixel = config.get("splats_per_pixel", NUMBER_OF_SPLATS_PER_PIXEL)
+    cache = open_memmap(
+        cache_path,
+        mode="w+",
+        dtype=float32,
+        shape=(number_of_pixels, splats_per_pixel, 5),
+    )
+    for start, tile in synthetic_tiles(number_of_pixels, **config):
+        cache[start : start + len(tile)] = tile
+    cache.flush()
+
+
+def write_synthetic_csv(csv_path: str, number_of_pixels: int, **config) -> None:
+    """Write synthetic splats as a collected splats CSV (the `define_schema` layout the rasterizer writes).
+
+    The output color columns hold the alpha composed splats on a black background, so the CSV also carries its own
+    reference image.
+
+    Args:
+        csv_path: Path of the CSV to create.
+        number_of_pixels: Number of pixels to generate.
+        **config: Generation parameters, see `synthetic_tile`. The schema has `NUMBER_OF_SPLATS_PER_PIXEL` splats.
+    """
+    if (
+        config.get("splats_per_pixel", NUMBER_OF_SPLATS_PER_PIXEL)
+        != NUMBER_OF_SPLATS_PER_PIXEL
+    ):
+        raise ValueError(
+            f"The CSV schema has {NUMBER_OF_SPLATS_PER_PIXEL} splats per pixel"
+        )
+
+    makedirs(dirname(csv_path) or ".", exist_ok=True)
+    schema = define_schema()
+    splat_columns = [name for name in schema.names() if name not in METADATA_COLUMNS]
+    with open(csv_path, "wb") as file:
+        for start, tile in synthetic_tiles(number_of_pixels, **config):
+            colors = alpha_compose_clusters(tile[:, :, [0, 2, 3, 4]]).astype(float32)
+            columns = {
+                "sample_index": arange(start, start + len(tile), dtype=uint32),
+                "out_color_r": colors[:, 0],
+                "out_color_g": colors[:, 1],
+                "out_color_b": colors[:, 2],
+                "background_r": zeros(len(tile), dtype=uint8),
+                "background_g": zeros(len(tile), dtype=uint8),
+                "background_b": zeros(len(tile), dtype=uint8),
+            }
+            columns.update(zip(splat_columns, tile.reshape((len(tile), -1)).T))
+            DataFrame(columns, schema=schema).write_csv(file, include_header=start == 0)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from ast import literal_eval
+from os.path import basename, splitext
+from time import perf_counter
+
+from numpy import load
+
+from clustering_exploration.algorithms.algorithm_base import BACKENDS, PROCESS_BACKEND
+from clustering_exploration.algorithms.registry import ALGORITHMS, create_algorithm
+from clustering_exploration.utils.constants import (
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    PIXEL_TILE_SIZE,
+    PNG_COMPRESS_LEVEL,
+)
+from clustering_exploration.utils.data_handler import load_splats
+from clustering_exploration.utils.image_handler import compose_image
+from clustering_exploration.utils.image_writer import ImageWriter
+from clustering_exploration.utils.profiling import profile
+from clustering_exploration.utils.splat_cutoff import (
+    TruncatedSplats,
+    effective_splat_counts,
+)
+
+
+def parse_parameter(parameter: str) -> tuple:
+    """Parse an algorithm parameter given as `name=value`.
+
+    Args:
+        parameter: The parameter. Values are read as Python literals (like `12`, `0.11` or `True`), or as strings.
+
+    Returns:
+        The name and the value.
+    """
+    name, separator, value = parameter.partition("=")
+    if not separator:
+        raise ValueError(f"Expected name=value, got: {parameter}")
+    try:
+        return name, literal_eval(value)
+    except (SyntaxError, ValueError):
+        return name, value
+
+
+def run(
+    algorithm_name: str,
+    data: str,
+    parameters: dict,
+    output_name: str | None = None,
+    cutoff: bool = False,
+    backend: str = PROCESS_BACKEND,
+    block_size: int = PIXEL_TILE_SIZE,
+    n_jobs: int = -1,
+    progress: bool = True,
+    raw: bool = False,
+    compress_level: int = PNG_COMPRESS_LEVEL,
+    resolution: tuple = (IMAGE_HEIGHT, IMAGE_WIDTH),
+) -> dict:
+    """Load splats, cluster them with a registered algorithm, composite the clusters and save the image.
+
+    Args:
+        algorithm_name: Name of the algorithm (see `ALGORITHMS`).
+        data: Name of a dataset (see `load_splats`), or path of a `.npy` splat cache.
+        parameters: Parameters of the algorithm, by name.
+        output_name: Name of the image in the output directory, the algorithm and data names by default.
+        cutoff: Whether to cut each pixel's splats off once they can no longer affect its color.
+        backend: Execution backend of `compute`.
+        block_size: Number of pixels per block.
+        n_jobs: Number of workers for the thread and process backends (-1 for all cores).
+        progress: Whether to show a progress bar.
+        raw: Whether to also save the image as a float32 `.npy`.
+        compress_level: PNG compression level, from 0 (fastest) to 9 (smallest).
+        resolution: Height and width of the image, which must hold one pixel per row of splats.
+
+    Returns:
+        Seconds per stage.
+    """
+    stage_seconds = {}
+
+    start_time = perf_counter()
+    data_name = splitext(basename(data))[0]
+    if data.endswith(".npy"):
+        splats = load(data, mmap_mode="r")
+        if cutoff:
+            splats = TruncatedSplats(splats, effective_splat_counts(splats))
+    else:
+        splats = load_splats(data, cutoff=cutoff)
+    height, width = resolution
+    if len(splats) != height * width:
+        raise ValueError(f"Expected {height} x {width} = {height * width} pixels, got {len(splats)}")
+    stage_seconds["load"] = perf_counter() - start_time
+
+    start_time = perf_counter()
+    algorithm = create_algorithm(algorithm_name, splats, **parameters)
+    clusters = algorithm.compute(block_size=block_size, backend=backend, n_jobs=n_jobs, progress=progress)
+    stage_seconds["cluster"] = perf_counter() - start_time
+
+    start_time = perf_counter()
+    image = compose_image(clusters, height, width)
+    stage_seconds["composite"] = perf_counter() - start_time
+
+    start_time = perf_counter()
+    with ImageWriter(raw=raw, compress_level=compress_level) as writer:
+        writer.save(image, output_name or f"{algorithm_name}_{data_name}")
+    stage_seconds["save"] = perf_counter() - start_time
+    return stage_seconds
+
+
+def main(arguments: list | None = None) -> None:
+    """Run one algorithm from the command line, without Jupyter."""
+    parser = ArgumentParser(description="Cluster splats with one algorithm, and composite and save the image.")
+    parser.add_argument("algorithm", choices=list(ALGORITHMS), help="Algorithm to run.")
+    parser.add_argument("data", type=str, help="Dataset name (in the data or cache directory) or .npy splat cache.")
+    parser.add_argument(
+        "-p", "--param", action="append", default=[], help="Algorithm parameter as name=value (repeatable)."
+    )
+    parser.add_argument("-o", "--output", type=str, help="Name of the image in the output directory.")
+    parser.add_argument("--cutoff", action="store_true", help="Cut splats off once they no longer affect a pixel.")
+    parser.add_argument("--backend", choices=BACKENDS, default=PROCESS_BACKEND, help="Execution backend.")
+    parser.add_argument("--block-size", type=int, default=PIXEL_TILE_SIZE, help="Number of pixels per block.")
+    parser.add_argument("--jobs", type=int, default=-1, help="Number of workers (-1 for all cores).")
+    parser.add_argument("--raw", action="store_true", help="Also save the image as a float32 .npy.")
+    parser.add_argument(
+        "--compress-level", type=int, default=PNG_COMPRESS_LEVEL, help="PNG compression level (0 to 9)."
+    )
+    parser.add_argument(
+        "--resolution",
+        type=int,
+        nargs=2,
+        default=[IMAGE_HEIGHT, IMAGE_WIDTH],
+        metavar=("HEIGHT", "WIDTH"),
+        help="Resolution of the image.",
+    )
+    parser.add_argument("--no-progress", action="store_true", help="Hide the progress bar.")
+    parser.add_argument("--trace", type=str, help="Profile the run, writing a Chrome trace to this path.")
+    args = parser.parse_args(arguments)
+
+    with profile(args.trace, enable_profiling=args.trace is not None):
+        stage_seconds = run(
+            args.algorithm,
+            args.data,
+            dict(parse_parameter(parameter) for parameter in args.param),
+            args.output,
+            args.cutoff,
+            args.backend,
+            args.block_size,
+            args.jobs,
+            not args.no_progress,
+            args.raw,
+            args.compress_level,
+            tuple(args.resolution),
+        )
+    print(", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stage_seconds.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from os import makedirs
+from os.path import join
+
+from numpy import argmax, asarray, float32, intp, load, ndarray, save, where, zeros
+
+
+def count_clusters(clusters: ndarray) -> ndarray:
+    """Count the cluster slots in use for each pixel: up to and including its last non-zero alpha cluster.
+
+    Args:
+        clusters: Clusters for a set of pixels. Shape: [ number of pixels x [ K x [ A, R, G, B ] ] ].
+
+    Returns:
+        Number of clusters of each pixel. Shape: [ number of pixels ].
+    """
+    used = clusters[:, :, 0] != 0
+    return where(
+        used.any(axis=1), clusters.shape[1] - argmax(used[:, ::-1], axis=1), 0
+    ).astype(intp)
+
+
+class ClusterResult:
+    """Clusters of every pixel in one contiguous float32 tensor, with the number of clusters of each pixel.
+
+    Pixels with fewer clusters than the widest pixel are zero padded, so the tensor composes as is. It behaves like
+    the tensor for indexing and `numpy.asarray`, and saves to (and memory maps from) a directory of `.npy` files
+    without any conversion.
+    """
+
+    def __init__(self, clusters: ndarray, counts: ndarray | None = None):
+        """Wrap a cluster tensor.
+
+        Args:
+            clusters: Clusters for all pixels. Shape: [ H x W x [ K max x [ A, R, G, B ] ] ].
+            counts: Number of clusters of each pixel, counted from the tensor by default (see `count_clusters`).
+        """
+        self.clusters = clusters
+        self.counts = count_clusters(clusters) if counts is None else counts
+
+    @classmethod
+    def from_pixel_clusters(cls, pixel_clusters: list) -> ClusterResult:
+        """Stack per-pixel cluster arrays, which may have different lengths, into a result.
+
+        Args:
+            pixel_clusters: Clusters of each pixel. Shape: [ H x W x [ K x [ A, R, G, B ] ] ], K may vary per pixel.
+
+        Returns:
+            The result, with each pixel's count set to its number of clusters.
+        """
+        counts = asarray([len(clusters) for clusters in pixel_clusters], dtype=intp)
+        stacked = zeros(
+            (len(pixel_clusters), int(counts.max(initial=0)), 4), dtype=float32
+        )
+        for pixel_index, clusters in enumerate(pixel_clusters):
+            stacked[pixel_index, : len(clusters)] = clusters
+        return cls(stacked, counts)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str | None = "r") -> ClusterResult:
+        """Load a result written by `save`.
+
+        Args:
+            directory: Directory holding `clusters.npy` and `counts.npy`.
+            mmap_mode: Memory map the tensor with this mode (see `numpy.load`), or None to read it into memory.
+
+        Returns:
+            The result.
+        """
+        return cls(
+            load(join(directory, "clusters.npy"), mmap_mode=mmap_mode),
+            load(join(directory, "counts.npy")),
+        )
+
+    def save(self, directory: str) -> None:
+        """Save the tensor and counts as `clusters.npy` and `counts.npy` in a directory.
+
+        Args:
+            directory: Directory to write to.
+        """
+        makedirs(directory, exist_ok=True)
+        save(join(directory, "clusters.npy"), self.clusters)
+        save(join(directory, "counts.npy"), self.counts)
+
+    def trimmed(self) -> ndarray:
+        """Get the tensor without cluster slots that no pixel uses."""
+        return self.clusters[:, : int(self.counts.max(initial=0))]
+
+    @property
+    def shape(self) -> tuple:
+        return self.clusters.shape
+
+    @property
+    def dtype(self):
+        return self.clusters.dtype
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def __getitem__(self, index) -> ndarray:
+        return self.clusters[index]
+
+    def __array__(self, dtype=None, copy=None) -> ndarray:
+        return asarray(self.clusters, dtype=dtype)
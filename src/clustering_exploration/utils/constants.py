@@ -10,3 +10,40 @@ IMAGE_HEIGHT = 832
 # Magic numbers.
 NUMBER_OF_SPLATS_PER_PIXEL = 500
 MINIMUM_TRANSMITTANCE = 0.001
+
+# Number of pixels clustered at once by the vectorized engines.
+PIXEL_TILE_SIZE = 4096
+
+# Seeded random initialization: pixels per random stream, fixed so results don't depend on the block size.
+RANDOM_TILE_SIZE = 1024
+
+# Tiled execution: default working memory in bytes, and working memory per pixel as a multiple of its splat data.
+DEFAULT_MEMORY_BUDGET = 2 * 1024**3
+TILE_MEMORY_FACTOR = 8
+
+# Minimum number of seconds between progress bar refreshes.
+PROGRESS_INTERVAL = 0.5
+
+# CSV conversion: rows parsed per batch.
+CSV_BATCH_SIZE = 1024
+
+# Column stores: pixels per chunk, and zlib compression level.
+COLUMN_CHUNK_SIZE = 4096
+COLUMN_COMPRESSION_LEVEL = 1
+
+# Result cache: maximum size in bytes, and bytes of splats hashed at once to fingerprint them.
+RESULT_CACHE_SIZE = 20 * 1024**3
+FINGERPRINT_BLOCK_SIZE = 64 * 1024**2
+
+# Image quality metrics: images evaluated per vectorized step, SSIM window side, and error map tile side in pixels.
+METRIC_BATCH_SIZE = 8
+SSIM_WINDOW_SIZE = 7
+ERROR_TILE_SIZE = 16
+
+# Multi-view evaluation: views clustered at once, and views waiting between two pipeline stages.
+EVALUATION_CONCURRENT_VIEWS = 2
+EVALUATION_QUEUE_SIZE = 2
+
+# Image output: images waiting for the background writer, and PNG compression level (0 to 9, Pillow defaults to 6).
+IMAGE_WRITER_QUEUE_SIZE = 4
+PNG_COMPRESS_LEVEL = 1
@@ -1,10 +1,71 @@
-from os import makedirs
-from os.path import dirname, exists, join
+from __future__ import annotations
 
-from numpy import load, ndarray, save, float32
-from polars import Float32, Schema, UInt8, UInt32, all, scan_csv
+from io import BytesIO
+from itertools import islice
+from json import dump
+from json import load as load_json
+from os import makedirs, remove, replace, stat, walk
+from os.path import dirname, exists, getsize, join
+from shutil import rmtree
+from time import perf_counter
+from typing import TYPE_CHECKING
+from zlib import compress, decompress
 
-from clustering_exploration.utils.constants import CACHE_DIR, DATA_DIR, IMAGE_HEIGHT, IMAGE_WIDTH
+from numpy import (
+    array,
+    dtype,
+    empty,
+    float32,
+    frombuffer,
+    fromfile,
+    load,
+    memmap,
+    ndarray,
+    save,
+    uint8,
+)
+from numpy.lib.format import open_memmap
+
+from clustering_exploration.utils.constants import (
+    CACHE_DIR,
+    COLUMN_CHUNK_SIZE,
+    COLUMN_COMPRESSION_LEVEL,
+    CSV_BATCH_SIZE,
+    DATA_DIR,
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    PROGRESS_INTERVAL,
+)
+from clustering_exploration.utils.profiling import span
+from clustering_exploration.utils.ragged_splats import RaggedSplats
+from clustering_exploration.utils.splat_cutoff import (
+    TruncatedSplats,
+    effective_splat_counts,
+)
+
+# Polars is slow to import and only needed to parse CSVs, so it is imported where it is used.
+if TYPE_CHECKING:
+    from polars import Schema
+
+# Per-pixel columns that come before the splats in the CSV.
+METADATA_COLUMNS = [
+    "sample_index",
+    "out_color_r",
+    "out_color_g",
+    "out_color_b",
+    "background_r",
+    "background_g",
+    "background_b",
+]
+
+# Colors the rasterizer composed for each pixel (the reference image), in cache order.
+OUT_COLOR_COLUMNS = ["out_color_r", "out_color_g", "out_color_b"]
+
+# Per-splat channels, in cache order.
+SPLAT_CHANNELS = ["alpha", "depth", "color_r", "color_g", "color_b"]
+
+# Layout of the CSV the splats were collected from, recorded in column stores.
+SCHEMA_VARIANT = "collected_splats_v1"
 
 
 def define_schema() -> Schema:
@@ -13,21 +74,13 @@ def define_schema() -> Schema:
     Returns:
         Polars schema for clustering data pulled from 3DGS.
     """
+    from polars import Float32, Schema, UInt8, UInt32
 
     # Define the column names.
     column_names = [
-        f"gaussian_{i}_{part}" for i in range(500) for part in ["alpha", "depth", "color_r", "color_g", "color_b"]
-    ]
-    column_names = [
-        "sample_index",
-        "out_color_r",
-        "out_color_g",
-        "out_color_b",
-        "background_r",
-        "background_g",
-        "background_b",
-        *column_names,
+        f"gaussian_{i}_{part}" for i in range(500) for part in SPLAT_CHANNELS
     ]
+    column_names = [*METADATA_COLUMNS, *column_names]
 
     # Define schema.
     schema_dict = {name: Float32 for name in column_names}
@@ -38,49 +91,596 @@ def define_schema() -> Schema:
     return Schema(schema_dict)
 
 
-def load_splats(data_name: str) -> ndarray:
+def cache_path_for(data_name: str) -> str:
+    """Get the path of the splat cache for a dataset.
+
+    Args:
+        data_name: Name of the dataset.
+    Returns:
+        Path of the `.npy` splat cache.
+    """
+    return join(CACHE_DIR, f"{data_name}.npy")
+
+
+def ragged_cache_path_for(data_name: str) -> str:
+    """Get the path of the ragged splat cache for a dataset.
+
+    Args:
+        data_name: Name of the dataset.
+    Returns:
+        Path of the directory holding the CSR arrays.
+    """
+    return join(CACHE_DIR, f"{data_name}.ragged")
+
+
+def limits_path_for(data_name: str, ragged: bool = False) -> str:
+    """Get the path of the effective splat counts for a dataset.
+
+    Args:
+        data_name: Name of the dataset.
+        ragged: Whether the counts are for the ragged splats (their slots differ from the padded cache).
+    Returns:
+        Path of the `.npy` effective splat counts.
+    """
+    return join(CACHE_DIR, f"{data_name}{'.ragged' if ragged else ''}.limits.npy")
+
+
+def colors_path_for(data_name: str) -> str:
+    """Get the path of the reference colors for a dataset.
+
+    Args:
+        data_name: Name of the dataset.
+    Returns:
+        Path of the `.npy` rasterizer output colors.
+    """
+    return join(CACHE_DIR, f"{data_name}.out_color.npy")
+
+
+def column_store_path_for(data_name: str) -> str:
+    """Get the path of the column store for a dataset.
+
+    Args:
+        data_name: Name of the dataset.
+    Returns:
+        Path of the column store directory.
+    """
+    return join(CACHE_DIR, f"{data_name}.columns")
+
+
+def _csv_fingerprint(csv_path: str) -> list:
+    """Identify a version of a CSV file by its size and modification time.
+
+    Args:
+        csv_path: Path to the CSV file.
+    Returns:
+        [size in bytes, modification time in nanoseconds].
+    """
+    csv_stat = stat(csv_path)
+    return [csv_stat.st_size, csv_stat.st_mtime_ns]
+
+
+def _count_rows(csv_path: str) -> int:
+    """Count the data rows of a CSV file without parsing it.
+
+    Args:
+        csv_path: Path to the CSV file.
+    Returns:
+        Number of non-blank lines after the header.
+    """
+    with open(csv_path, "rb") as file:
+        file.readline()
+        return sum(1 for line in file if line.strip())
+
+
+def convert_csv_to_cache(
+    csv_path: str,
+    cache_path: str,
+    batch_size: int = CSV_BATCH_SIZE,
+    progress: bool = True,
+    colors_path: str | None = None,
+) -> None:
+    """Stream a splat CSV into a `.npy` splat cache, one batch of rows at a time.
+
+    The cache is preallocated on disk and each parsed batch is written straight into it, so memory use is bounded by
+    the batch size. Conversion goes to `<cache_path>.partial`, with the number of rows written and the matching CSV
+    byte offset recorded in `<cache_path>.progress` after every batch. An interrupted conversion picks up where it
+    stopped (as long as the CSV is unchanged), and the cache only appears under `cache_path` once it is complete.
+
+    Args:
+        csv_path: Path of the CSV written by the rasterizer.
+        cache_path: Path of the `.npy` cache to create.
+        batch_size: Number of CSV rows to parse at once.
+        progress: Whether to show progress and throughput.
+        colors_path: Optional path of a `.npy` file to also write the rasterizer output colors to, the reference
+            image of the splats. Shape: [ H x W x [ R, G, B ] ].
+    """
+    # Nothing to do if the cache is complete.
+    if exists(cache_path):
+        return
+    from polars import read_csv
+    from tqdm.auto import tqdm
+
+    partial_path = f"{cache_path}.partial"
+    progress_path = f"{cache_path}.progress"
+    colors_partial_path = f"{colors_path}.partial" if colors_path else None
+    schema = define_schema()
+    splat_columns = [name for name in schema.names() if name not in METADATA_COLUMNS]
+    csv_fingerprint = _csv_fingerprint(csv_path)
+
+    # Resume an interrupted conversion of the same CSV.
+    state = None
+    if exists(partial_path) and exists(progress_path):
+        with open(progress_path) as file:
+            state = load_json(file)
+        if state["csv_fingerprint"] != csv_fingerprint or (colors_partial_path and not exists(colors_partial_path)):
+            state = None
+
+    # Otherwise start over with a preallocated cache.
+    if state is None:
+        with open(csv_path, "rb") as file:
+            header_size = len(file.readline())
+        state = {
+            "csv_fingerprint": csv_fingerprint,
+            "rows": 0,
+            "offset": header_size,
+            "total_rows": _count_rows(csv_path),
+        }
+        makedirs(dirname(cache_path) or ".", exist_ok=True)
+        open_memmap(partial_path, mode="w+", dtype=float32, shape=(state["total_rows"], len(splat_columns) // 5, 5))
+        if colors_partial_path:
+            open_memmap(colors_partial_path, mode="w+", dtype=float32, shape=(state["total_rows"], 3))
+
+    splats = open_memmap(partial_path, mode="r+")
+    colors = open_memmap(colors_partial_path, mode="r+") if colors_partial_path else None
+    progress_bar = tqdm(
+        total=state["total_rows"],
+        initial=state["rows"],
+        unit="row",
+        mininterval=PROGRESS_INTERVAL,
+        disable=not progress,
+    )
+    with open(csv_path, "rb") as file, progress_bar:
+        file.seek(state["offset"])
+        start_time = perf_counter()
+        bytes_read = 0
+        while state["rows"] < state["total_rows"]:
+            # Read and parse the next batch of rows.
+            with span("read_csv_batch") as batch_span:
+                lines = list(islice(file, batch_size))
+                batch_bytes = sum(len(line) for line in lines)
+                batch_span.add(bytes_read=batch_bytes)
+            if not lines:
+                break
+
+            # Drop blank lines, which Polars would parse as rows of nulls.
+            with span("parse_csv_batch") as parse_span:
+                chunk = b"".join(line for line in lines if line.strip())
+                frame = read_csv(BytesIO(chunk), has_header=False, schema=schema)
+                batch = frame.select(splat_columns).to_numpy()
+                parse_span.add(rows=len(batch))
+
+            # Write the batch into the cache and record the progress.
+            splats[state["rows"] : state["rows"] + len(batch)] = batch.reshape((len(batch), splats.shape[1], 5))
+            splats.flush()
+            if colors is not None:
+                colors[state["rows"] : state["rows"] + len(batch)] = frame.select(OUT_COLOR_COLUMNS).to_numpy()
+                colors.flush()
+            state["rows"] += len(batch)
+            state["offset"] += batch_bytes
+            with open(f"{progress_path}.tmp", "w") as progress_file:
+                dump(state, progress_file)
+            replace(f"{progress_path}.tmp", progress_path)
+
+            # Report throughput.
+            bytes_read += batch_bytes
+            progress_bar.update(len(batch))
+            progress_bar.set_postfix_str(f"{bytes_read / (perf_counter() - start_time) / 1e6:.1f} MB/s", refresh=False)
+
+    # Keep an incomplete conversion out of the cache.
+    del splats, colors
+    if state["rows"] != state["total_rows"]:
+        raise ValueError(
+            f"Converted {state['rows']} of {state['total_rows']} rows of {csv_path}, keeping {partial_path} and "
+            f"{progress_path}"
+        )
+
+    # Publish the complete cache (the colors first, so a complete cache always has them).
+    if colors_partial_path:
+        replace(colors_partial_path, colors_path)
+    replace(partial_path, cache_path)
+    remove(progress_path)
+
+
+def load_splats(
+    data_name: str,
+    mmap_mode: str | None = "r",
+    pixel_range: tuple | None = None,
+    ragged: bool = False,
+    cutoff: bool = False,
+) -> ndarray | RaggedSplats | TruncatedSplats:
     """Loads splats given a dataset name.
 
     Will try to load from cache if possible, otherwise will look for the CSV in the `data` directory and create a cache after.
 
+    The cache is memory mapped by default: loading takes no time, slicing rows or tiles is zero-copy, and pages are
+    only read from disk once touched. Use a copy (or `mmap_mode="c"`) to modify the splats in place.
+
     Args:
         data_name: Name of the dataset to load.
+        mmap_mode: Memory map the cache with this mode (see `numpy.load`), or None to read it into memory.
+        pixel_range: Optional (start, stop) range of pixels to load. Only these pixels' bytes are read.
+        ragged: Load the splats without zero padding (see `RaggedSplats`), creating the ragged cache if needed.
+        cutoff: Cut each pixel's splats off once they can no longer affect its color (see `TruncatedSplats`), using
+            effective splat counts that are computed once and cached next to the splats. Turn off for fidelity studies.
     Returns:
-        3D Numpy array of splats in (h x w) x number of splats x (alpha, depth, R, G, B).
+        3D Numpy array of splats in (h x w) x number of splats x (alpha, depth, R, G, B), or the equivalent ragged
+        or truncated splats.
     """
+    if cutoff:
+        # Compute the effective splat counts of the whole image once.
+        limits_path = limits_path_for(data_name, ragged)
+        if not exists(limits_path):
+            limits = effective_splat_counts(load_splats(data_name, ragged=ragged))
+            save(f"{limits_path}.partial.npy", limits)
+            replace(f"{limits_path}.partial.npy", limits_path)
+        limits = load(limits_path)
+
+        # Truncate the requested pixels.
+        start, stop = pixel_range or (0, len(limits))
+        return TruncatedSplats(load_splats(data_name, mmap_mode, (start, stop), ragged), limits[start:stop])
+
     # Define the cache file path.
-    cache_path = join(CACHE_DIR, f"{data_name}.npy")
+    cache_path = cache_path_for(data_name)
 
-    # Check if the cache exists.
-    if exists(cache_path):
-        return load(cache_path)
-
-    # Load the data from CSV.
-    data_path = join(DATA_DIR, f"{data_name}.csv")
-    raw_data = scan_csv(data_path, schema=define_schema())
-
-    # Extract the splats.
-    raw_splats = (
-        raw_data.select(
-            all().exclude(
-                "sample_index",
-                "out_color_r",
-                "out_color_g",
-                "out_color_b",
-                "background_r",
-                "background_g",
-                "background_b",
-            )
+    # Create the cache if it doesn't exist yet.
+    if not exists(cache_path):
+        convert_csv_to_cache(join(DATA_DIR, f"{data_name}.csv"), cache_path, colors_path=colors_path_for(data_name))
+
+    # Load the ragged cache, dropping the padding of the cache first if needed.
+    if ragged:
+        ragged_path = ragged_cache_path_for(data_name)
+        if not exists(ragged_path):
+            RaggedSplats.from_padded(load(cache_path, mmap_mode="r"), ragged_path)
+        splats = RaggedSplats.load(ragged_path, mmap_mode)
+        if pixel_range is not None:
+            splats = splats.pixel_range(*pixel_range)
+        return splats
+
+    # Load the whole cache (memory mapped caches are only read once touched).
+    if pixel_range is None:
+        with span("load_splats") as load_span:
+            splats = load(cache_path, mmap_mode=mmap_mode)
+            load_span.add(pixels=len(splats), bytes_read=0 if mmap_mode else splats.nbytes)
+        return splats
+
+    # Map the cache and slice out the requested pixels, copying them into memory if not memory mapping.
+    start, stop = pixel_range
+    with span("load_splats") as load_span:
+        splats = load(cache_path, mmap_mode=mmap_mode or "r")[start:stop]
+        splats = splats if mmap_mode else array(splats)
+        load_span.add(pixels=len(splats), bytes_read=0 if mmap_mode else splats.nbytes)
+    return splats
+
+
+def load_splat_tile(data_name: str, tile_index: int, tile_size: int, mmap_mode: str | None = "r") -> ndarray:
+    """Loads one tile of pixels' splats given a dataset name.
+
+    Args:
+        data_name: Name of the dataset to load.
+        tile_index: Index of the tile.
+        tile_size: Number of pixels per tile.
+        mmap_mode: Memory map the cache with this mode (see `numpy.load`), or None to read the tile into memory.
+    Returns:
+        3D Numpy array of the tile's splats in pixels x number of splats x (alpha, depth, R, G, B).
+    """
+    return load_splats(data_name, mmap_mode, (tile_index * tile_size, (tile_index + 1) * tile_size))
+
+
+def load_reference_colors(data_name: str, mmap_mode: str | None = "r") -> ndarray:
+    """Loads the colors the rasterizer composed for each pixel given a dataset name.
+
+    These are the `out_color_*` columns of the CSV, the reference the clustered image is compared against. They are
+    written next to the splat cache when the CSV is converted, or read from the CSV once for older caches. They include
+    the rasterizer's background, which `alpha_compose_clusters` leaves black.
+
+    Args:
+        data_name: Name of the dataset to load.
+        mmap_mode: Memory map the colors with this mode (see `numpy.load`), or None to read them into memory.
+    Returns:
+        2D Numpy array of colors in (h x w) x (R, G, B).
+    """
+    colors_path = colors_path_for(data_name)
+
+    # Read the color columns alone from the CSV if the cache was converted without them.
+    if not exists(colors_path):
+        write_reference_colors(join(DATA_DIR, f"{data_name}.csv"), colors_path)
+
+    return load(colors_path, mmap_mode=mmap_mode)
+
+
+def write_reference_colors(csv_path: str, colors_path: str) -> None:
+    """Write the rasterizer output colors of a splat CSV to a `.npy` file, parsing only their columns.
+
+    Args:
+        csv_path: Path of the CSV written by the rasterizer.
+        colors_path: Path of the `.npy` colors to create.
+    """
+    from polars import scan_csv
+
+    colors = scan_csv(csv_path, schema=define_schema()).select(OUT_COLOR_COLUMNS)
+    makedirs(dirname(colors_path) or ".", exist_ok=True)
+    save(f"{colors_path}.partial.npy", colors.collect().to_numpy().astype(float32))
+    replace(f"{colors_path}.partial.npy", colors_path)
+
+
+def _encode_chunk(values: ndarray, compression: str | None) -> bytes:
+    """Encode one chunk of a column.
+
+    Args:
+        values: Values of the chunk.
+        compression: None to store raw bytes, or "zlib".
+    Returns:
+        Encoded bytes.
+    """
+    if compression is None:
+        return values.tobytes()
+
+    # Group the n-th bytes of all values together first (byte shuffle), which compresses floats much better.
+    return compress(values.view(uint8).reshape((-1, values.itemsize)).T.tobytes(), COLUMN_COMPRESSION_LEVEL)
+
+
+def _decode_chunk(data: bytes, compression: str | None, value_type: dtype) -> ndarray:
+    """Decode one chunk of a column.
+
+    Args:
+        data: Encoded bytes.
+        compression: Compression the chunk was encoded with.
+        value_type: Type of the values.
+    Returns:
+        Flat array of the chunk's values.
+    """
+    if compression is None:
+        return frombuffer(data, value_type)
+    return frombuffer(decompress(data), uint8).reshape((value_type.itemsize, -1)).T.copy().view(value_type).ravel()
+
+
+def _chunk_path(store_path: str, channel: str, chunk_index: int) -> str:
+    return join(store_path, channel, f"{chunk_index:06d}.bin")
+
+
+def write_column_store(
+    splats: ndarray,
+    store_path: str,
+    resolution: tuple = (IMAGE_HEIGHT, IMAGE_WIDTH),
+    chunk_size: int = COLUMN_CHUNK_SIZE,
+    compression: str | None = "zlib",
+    csv_fingerprint: list | None = None,
+    progress: bool = True,
+) -> None:
+    """Write splats as a column store: one directory per channel, split into chunks of pixels.
+
+    A pass that only needs some channels (for example depth and alpha) then only reads those columns, and zero padding
+    compresses to almost nothing. The splats are read one chunk at a time, so a memory mapped cache is converted with
+    bounded memory. The store is written to `<store_path>.partial` and only moved into place once complete.
+
+    `metadata.json` records the resolution, number of pixels, splats per pixel, channels, value type, chunking,
+    compression, schema variant, and the fingerprint of the source CSV.
+
+    Args:
+        splats: Splats for all pixels. Shape: [ number of pixels x number of splats x [ A, D, R, G, B ] ].
+        store_path: Path of the column store directory to create.
+        resolution: (height, width) of the image the splats were rasterized for, which must hold every pixel.
+        chunk_size: Number of pixels per chunk.
+        compression: None to store raw columns (which can be read partially), or "zlib".
+        csv_fingerprint: Fingerprint of the CSV the splats were converted from, if known.
+        progress: Whether to show progress.
+    """
+    if compression not in (None, "zlib"):
+        raise ValueError(f"Unknown compression: {compression}")
+    number_of_pixels, number_of_splats = splats.shape[:2]
+    height, width = resolution
+    if height * width != number_of_pixels:
+        raise ValueError(f"Resolution {height}x{width} does not match the {number_of_pixels} pixels of the splats")
+
+    partial_path = f"{store_path}.partial"
+    if exists(partial_path):
+        rmtree(partial_path)
+    for channel in SPLAT_CHANNELS:
+        makedirs(join(partial_path, channel))
+
+    from tqdm.auto import tqdm
+
+    number_of_chunks = -(-number_of_pixels // chunk_size)
+    for chunk_index in tqdm(range(number_of_chunks), unit="chunk", mininterval=PROGRESS_INTERVAL, disable=not progress):
+        chunk = array(splats[chunk_index * chunk_size : (chunk_index + 1) * chunk_size])
+        for channel_index, channel in enumerate(SPLAT_CHANNELS):
+            with open(_chunk_path(partial_path, channel, chunk_index), "wb") as file:
+                file.write(_encode_chunk(chunk[:, :, channel_index].copy(), compression))
+
+    metadata = {
+        "resolution": [height, width],
+        "number_of_pixels": number_of_pixels,
+        "number_of_splats": number_of_splats,
+        "channels": SPLAT_CHANNELS,
+        "dtype": splats.dtype.str,
+        "chunk_size": chunk_size,
+        "compression": compression,
+        "schema": SCHEMA_VARIANT,
+        "csv_fingerprint": csv_fingerprint,
+    }
+    with open(join(partial_path, "metadata.json"), "w") as file:
+        dump(metadata, file, indent=4)
+
+    # Publish the complete store.
+    if exists(store_path):
+        rmtree(store_path)
+    replace(partial_path, store_path)
+
+
+def read_column_store_metadata(store_path: str) -> dict:
+    """Read the metadata of a column store.
+
+    Args:
+        store_path: Path of the column store directory.
+    Returns:
+        Metadata written by `write_column_store`.
+    """
+    with open(join(store_path, "metadata.json")) as file:
+        return load_json(file)
+
+
+def read_column_store(store_path: str, channels: list | None = None, pixel_range: tuple | None = None) -> ndarray:
+    """Read some channels of a range of pixels from a column store.
+
+    Only the chunks overlapping the pixel range of the requested channels are read. Raw chunks are read partially,
+    compressed chunks are decompressed whole.
+
+    Args:
+        store_path: Path of the column store directory.
+        channels: Channels to read (see `SPLAT_CHANNELS`), in the order they should come out. All by default.
+        pixel_range: Optional (start, stop) range of pixels to read. All pixels by default.
+    Returns:
+        3D Numpy array of splats in pixels x number of splats x channels.
+    """
+    metadata = read_column_store_metadata(store_path)
+    channels = metadata["channels"] if channels is None else channels
+    unknown_channels = set(channels) - set(metadata["channels"])
+    if unknown_channels:
+        raise ValueError(f"Unknown channels: {sorted(unknown_channels)}")
+
+    number_of_pixels, number_of_splats = metadata["number_of_pixels"], metadata["number_of_splats"]
+    start, stop, _ = slice(*(pixel_range or (None, None))).indices(number_of_pixels)
+    stop = max(start, stop)
+    value_type, chunk_size, compression = dtype(metadata["dtype"]), metadata["chunk_size"], metadata["compression"]
+
+    splats = empty((stop - start, number_of_splats, len(channels)), dtype=value_type)
+    with span("read_column_store", pixels=stop - start, channels=len(channels)) as read_span:
+        for chunk_index in range(start // chunk_size, -(-stop // chunk_size)):
+            # Pixels of the chunk that fall in the range, relative to the chunk.
+            chunk_start = chunk_index * chunk_size
+            low, high = max(start, chunk_start) - chunk_start, min(stop, chunk_start + chunk_size) - chunk_start
+            output = splats[chunk_start + low - start : chunk_start + high - start]
+            offset, count = low * number_of_splats, (high - low) * number_of_splats
+            for channel_index, channel in enumerate(channels):
+                path = _chunk_path(store_path, channel, chunk_index)
+                if compression is None:
+                    values = fromfile(path, value_type, count, offset=offset * value_type.itemsize)
+                    read_span.add(bytes_read=values.nbytes)
+                else:
+                    with open(path, "rb") as file:
+                        data = file.read()
+                    values = _decode_chunk(data, compression, value_type)[offset : offset + count]
+                    read_span.add(bytes_read=len(data))
+                output[:, :, channel_index] = values.reshape((high - low, number_of_splats))
+    return splats
+
+
+def column_store_size(store_path: str) -> int:
+    """Get the size of a column store on disk.
+
+    Args:
+        store_path: Path of the column store directory.
+    Returns:
+        Size in bytes.
+    """
+    return sum(getsize(join(root, name)) for root, _, names in walk(store_path) for name in names)
+
+
+def load_splat_columns(
+    data_name: str,
+    channels: list | None = None,
+    pixel_range: tuple | None = None,
+    compression: str | None = "zlib",
+    resolution: tuple = (IMAGE_HEIGHT, IMAGE_WIDTH),
+) -> ndarray:
+    """Loads some channels of the splats given a dataset name, from its column store.
+
+    The column store is created from the `.npy` cache (see `load_splats`) if it doesn't exist yet. Passes that only
+    need depth and alpha read two of the five columns, compressed.
+
+    Args:
+        data_name: Name of the dataset to load.
+        channels: Channels to load (see `SPLAT_CHANNELS`), in the order they should come out. All by default.
+        pixel_range: Optional (start, stop) range of pixels to load.
+        compression: Compression to create the column store with, if it doesn't exist yet.
+        resolution: (height, width) of the image, recorded in the column store if it doesn't exist yet.
+    Returns:
+        3D Numpy array of splats in pixels x number of splats x channels.
+    """
+    store_path = column_store_path_for(data_name)
+
+    # Create the column store if it doesn't exist yet.
+    if not exists(store_path):
+        csv_path = join(DATA_DIR, f"{data_name}.csv")
+        csv_fingerprint = _csv_fingerprint(csv_path) if exists(csv_path) else None
+        write_column_store(
+            load_splats(data_name), store_path, resolution, compression=compression, csv_fingerprint=csv_fingerprint
         )
-        .collect()
-        .to_numpy()
-        .astype(float32, copy=False)
+
+    return read_column_store(store_path, channels, pixel_range)
+
+
+def memory_map(splats: ndarray | RaggedSplats, directory: str) -> ndarray | RaggedSplats:
+    """Get a memory mapped version of splats that can be shared with worker processes without copying.
+
+    Args:
+        splats: Splats to share.
+        directory: Directory to write the splats to if they are not memory mapped already.
+    Returns:
+        The splats if they are already memory mapped, otherwise a read only memory map of a copy in `directory`.
+    """
+    # Already backed by a file.
+    if isinstance(splats, memmap):
+        return splats
+    if isinstance(splats, RaggedSplats):
+        return splats.memory_map(directory)
+    if isinstance(splats, TruncatedSplats):
+        return TruncatedSplats(memory_map(splats.splats, directory), splats.limits)
+
+    # Write a copy once and map it.
+    shared_path = join(directory, "splats.npy")
+    shared_splats = open_memmap(shared_path, mode="w+", dtype=splats.dtype, shape=splats.shape)
+    shared_splats[:] = splats
+    shared_splats.flush()
+    del shared_splats
+    return load(shared_path, mmap_mode="r")
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Convert a collected splats CSV into a .npy splat cache.")
+    parser.add_argument("csv_path", type=str, help="Path to the CSV written by the rasterizer.")
+    parser.add_argument("cache_path", type=str, help="Path of the .npy cache to create.")
+    parser.add_argument("--batch-size", type=int, default=CSV_BATCH_SIZE, help="Number of CSV rows to parse at once.")
+    parser.add_argument("--colors", type=str, help="Also write the rasterizer output colors to this .npy path.")
+    parser.add_argument("--columns", type=str, help="Also write a column store to this path.")
+    parser.add_argument("--no-compression", action="store_true", help="Store the columns uncompressed.")
+    parser.add_argument(
+        "--resolution",
+        type=int,
+        nargs=2,
+        default=[IMAGE_HEIGHT, IMAGE_WIDTH],
+        metavar=("HEIGHT", "WIDTH"),
+        help="Resolution of the image, recorded in the column store.",
     )
-    splats = raw_splats.reshape((IMAGE_HEIGHT * IMAGE_WIDTH, raw_splats.shape[1] // 5, 5))
+    parser.add_argument("--ragged", type=str, help="Also write the splats without zero padding to this directory.")
+    parser.add_argument("--trace", type=str, help="Profile the conversion, writing a Chrome trace to this path.")
+    args = parser.parse_args()
 
-    # Save the cache.
-    makedirs(dirname(cache_path), exist_ok=True)
-    save(cache_path, splats)
+    from clustering_exploration.utils.profiling import profile
 
-    # Return the splats.
-    return splats
+    with profile(args.trace, enable_profiling=args.trace is not None):
+        convert_csv_to_cache(args.csv_path, args.cache_path, args.batch_size, colors_path=args.colors)
+    if args.columns:
+        write_column_store(
+            load(args.cache_path, mmap_mode="r"),
+            args.columns,
+            args.resolution,
+            compression=None if args.no_compression else "zlib",
+            csv_fingerprint=_csv_fingerprint(args.csv_path),
+        )
+        print(f"{getsize(args.cache_path) / 1e6:.1f} MB cache, {column_store_size(args.columns) / 1e6:.1f} MB columns")
+    if args.ragged:
+        ragged_splats = RaggedSplats.from_padded(load(args.cache_path, mmap_mode="r"), args.ragged)
+        print(f"{len(ragged_splats.values)} real splats, {ragged_splats.counts.mean():.1f} per pixel")
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+from logging import getLogger
+from os.path import basename, exists, join
+from queue import Queue
+from threading import Thread
+from time import perf_counter
+
+from numpy import load, save
+from polars import DataFrame
+
+from clustering_exploration.utils.constants import (
+    EVALUATION_CONCURRENT_VIEWS,
+    EVALUATION_QUEUE_SIZE,
+)
+from clustering_exploration.utils.data_handler import (
+    convert_csv_to_cache,
+    write_reference_colors,
+)
+from clustering_exploration.utils.image_handler import stack_pixel_clusters
+from clustering_exploration.utils.image_writer import ImageWriter
+from clustering_exploration.utils.metrics import as_image, evaluate, load_image
+
+# Failures are logged with their traceback, as the results table only keeps the error message.
+logger = getLogger(__name__)
+
+# Files of a view directory (see `tests/dataset_init.py`).
+VIEW_CSV = "collected_splats.csv"
+VIEW_CACHE = "collected_splats.npy"
+VIEW_COLORS = "out_color.npy"
+VIEW_GROUND_TRUTH = "gt.png"
+VIEW_IMAGE = "computed_image"  # .png, and .npy for raw images.
+
+# Pipeline stages, in order.
+STAGES = ["load", "cluster", "composite", "metrics"]
+
+# Metrics of each view in the results table.
+METRIC_COLUMNS = [
+    "psnr",
+    "ssim",
+    "ssim_r",
+    "ssim_g",
+    "ssim_b",
+    "psnr_out_color",
+    "ssim_out_color",
+]
+
+
+def load_view(view_path: str) -> dict:
+    """Load a view from its binary caches, converting its CSV once if they don't exist yet.
+
+    Args:
+        view_path: Path of the view directory.
+
+    Returns:
+        The memory mapped splats, the ground truth image, and the rasterizer output colors as an image.
+    """
+    csv_path = join(view_path, VIEW_CSV)
+    cache_path = join(view_path, VIEW_CACHE)
+    colors_path = join(view_path, VIEW_COLORS)
+
+    # Convert the CSV once, keeping the reference colors too.
+    if not exists(cache_path):
+        convert_csv_to_cache(
+            csv_path, cache_path, progress=False, colors_path=colors_path
+        )
+    if not exists(colors_path):
+        write_reference_colors(csv_path, colors_path)
+
+    ground_truth = load_image(join(view_path, VIEW_GROUND_TRUTH))
+    height, width = ground_truth.shape[:2]
+    return {
+        "splats": load(cache_path, mmap_mode="r"),
+        "ground_truth": ground_truth,
+        "out_color": as_image(load(colors_path), height, width),
+    }
+
+
+def _run_stage(stage: str, function, inputs: Queue, outputs: Queue) -> None:
+    """Apply a stage to views from one queue and pass them on to the next, until a None arrives.
+
+    Views that failed in an earlier stage are passed on untouched. A failure is logged and recorded on the view instead
+    of stopping the pipeline.
+
+    Args:
+        stage: Name of the stage.
+        function: Updates a view in place.
+        inputs: Queue to take views from.
+        outputs: Queue to put views in.
+    """
+    while (view := inputs.get()) is not None:
+        if "error" not in view:
+            start_time = perf_counter()
+            try:
+                function(view)
+            except Exception as error:
+                logger.exception("View %s failed in the %s stage", view["path"], stage)
+                view["error"] = f"{stage}: {error!r}"
+            view[f"{stage}_seconds"] = perf_counter() - start_time
+        outputs.put(view)
+
+
+def evaluate_views(
+    view_paths: list,
+    cluster,
+    concurrent_views: int = EVALUATION_CONCURRENT_VIEWS,
+    queue_size: int = EVALUATION_QUEUE_SIZE,
+    results_path: str | None = None,
+    save_images: bool = True,
+    raw_images: bool = False,
+) -> list:
+    """Cluster and evaluate many views in a pipeline.
+
+    Views flow through four stages connected by bounded queues: loading the binary caches, clustering, compositing,
+    and computing metrics against the ground truth and the rasterizer output colors. Stages run at the same time on
+    different views, and `concurrent_views` views are clustered at once, so loading and evaluating one view overlaps
+    clustering the next. The queues bound how many views are in memory.
+
+    Args:
+        view_paths: Paths of the view directories.
+        cluster: Clusters a view's splats, returning a `ClusterResult` or [ H x W x [ K x [ A, R, G, B ] ] ].
+        concurrent_views: Number of views clustered at once.
+        queue_size: Number of views that can wait between two stages.
+        results_path: Optional path of a CSV to write the results table to.
+        save_images: Whether to save each composed image to its view directory, in the background.
+        raw_images: Whether to also save each composed image as a float32 `.npy`.
+
+    Returns:
+        A row per view, in the order of `view_paths`: its name, PSNR and SSIM against both references, seconds per
+        stage, and the error if any stage failed.
+    """
+
+    def cluster_view(view: dict) -> None:
+        view["clusters"] = cluster(view.pop("splats"))
+
+    writer = ImageWriter(raw=raw_images)
+
+    def composite_view(view: dict) -> None:
+        height, width = view["ground_truth"].shape[:2]
+        view["image"] = as_image(
+            stack_pixel_clusters(view.pop("clusters")), height, width
+        )
+        if save_images:
+            writer.save(view["image"], VIEW_IMAGE, view["path"])
+
+    def measure_view(view: dict) -> None:
+        image = view.pop("image")
+        results = evaluate(
+            {"view": [image, image]}, [view.pop("ground_truth"), view.pop("out_color")]
+        )["view"]
+        view["metrics"] = results
+        save(join(view["path"], "error_map.npy"), results["error_map"][0])
+
+    try:
+        # Connect the stages with bounded queues, the last one collecting the finished views.
+        functions = [
+            lambda view: view.update(load_view(view["path"])),
+            cluster_view,
+            composite_view,
+            measure_view,
+        ]
+        workers = [1, concurrent_views, 1, 1]
+        queues = [Queue(queue_size) for _ in STAGES] + [Queue()]
+        threads = []
+        for index, (stage, function, count) in enumerate(
+            zip(STAGES, functions, workers)
+        ):
+            arguments = (stage, function, queues[index], queues[index + 1])
+            threads.append(
+                [
+                    Thread(target=_run_stage, args=arguments, daemon=True)
+                    for _ in range(count)
+                ]
+            )
+            for thread in threads[-1]:
+                thread.start()
+
+        # Feed the views, then shut the stages down in order once each has drained.
+        start_time = perf_counter()
+        for index, view_path in enumerate(view_paths):
+            queues[0].put({"index": index, "path": view_path})
+        for index, stage_threads in enumerate(threads):
+            for _ in stage_threads:
+                queues[index].put(None)
+            for thread in stage_threads:
+                thread.join()
+        wall_seconds = perf_counter() - start_time
+
+        # Gather the finished views into one table.
+        views = sorted(
+            (queues[-1].get() for _ in view_paths), key=lambda view: view["index"]
+        )
+        rows = [_result_row(view) for view in views]
+        if results_path:
+            DataFrame(rows, infer_schema_length=None).write_csv(results_path)
+
+        busy_seconds = sum(
+            row[f"{stage}_seconds"] or 0 for row in rows for stage in STAGES
+        )
+        print(
+            f"Evaluated {len(rows)} views in {wall_seconds:.1f}s ({busy_seconds:.1f}s of stage time)"
+        )
+        return rows
+    finally:
+        # Finish the image writes only now, so a failed write never costs the results: it is only logged.
+        try:
+            writer.close()
+        except Exception:
+            logger.exception("Saving view images failed, later images were skipped")
+
+
+def _result_row(view: dict) -> dict:
+    """Flatten a finished view into a row of the results table."""
+    values = {}
+    if "metrics" in view:
+        psnr, ssim = view["metrics"]["psnr"], view["metrics"]["ssim"]
+        values = {
+            "psnr": psnr[0],
+            "ssim": ssim[0].mean(),
+            **{
+                f"ssim_{channel}": ssim[0][index] for index, channel in enumerate("rgb")
+            },
+            "psnr_out_color": psnr[1],
+            "ssim_out_color": ssim[1].mean(),
+        }
+
+    row = {"view": basename(view["path"].rstrip("/\\"))}
+    row.update(
+        {
+            column: float(values[column]) if column in values else None
+            for column in METRIC_COLUMNS
+        }
+    )
+    row.update({f"{stage}_seconds": view.get(f"{stage}_seconds") for stage in STAGES})
+    row["error"] = view.get("error")
+    return row
@@ -1,26 +1,50 @@
 from __future__ import annotations
 
 from os import makedirs
-from os.path import dirname, join
+from os.path import dirname, getsize, join
+from typing import TYPE_CHECKING
 
-import numpy as np
-from joblib import Parallel, delayed
-from numpy import array, clip, ndarray, uint8, zeros
-from PIL import Image
-from tqdm.auto import tqdm
+from numpy import arange, array, asarray, clip, minimum, ndarray, ones, uint8, zeros
 
-from clustering_exploration.utils.constants import IMAGE_HEIGHT, IMAGE_WIDTH, MINIMUM_TRANSMITTANCE, OUTPUT_DIR
+from clustering_exploration.utils.cluster_result import ClusterResult
+from clustering_exploration.utils.constants import (
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    MINIMUM_TRANSMITTANCE,
+    OUTPUT_DIR,
+    PNG_COMPRESS_LEVEL,
+)
+from clustering_exploration.utils.profiling import span
 
+# Pillow is only needed to save images, so clustering alone doesn't import it.
+if TYPE_CHECKING:
+    from PIL import Image
 
-def save_array_to_image(pixel_array: ndarray, name: str) -> Image:
+
+def save_array_to_image(pixel_array: ndarray, name: str, compress_level: int = PNG_COMPRESS_LEVEL) -> Image:
     """Save a numpy array to an image in the output directory and display it.
 
     Args:
         pixel_array: The array to save. Expected to be a [ H x [ W x [ R, G, B ] ] ] float array.
         name: The name of the file to save the image to.
+        compress_level: PNG compression level, from 0 (fastest) to 9 (smallest).
+    Returns:
+        The saved image.
+    """
+    return write_png(pixel_array, join(OUTPUT_DIR, f"{name}.png"), compress_level)
+
+
+def write_png(pixel_array: ndarray, output_path: str, compress_level: int = PNG_COMPRESS_LEVEL) -> Image:
+    """Quantize a float image to 8 bits and write it as a PNG.
+
+    Args:
+        pixel_array: The array to save. Expected to be a [ H x [ W x [ R, G, B ] ] ] float array.
+        output_path: Path of the PNG to write.
+        compress_level: PNG compression level, from 0 (fastest) to 9 (smallest).
     Returns:
         The saved image.
     """
+    from PIL import Image
 
     # Clamp the array to [0, 1].
     clamped_array = clip(pixel_array, 0, 1)
@@ -32,9 +56,11 @@ def save_array_to_image(pixel_array: ndarray, name: str) -> Image:
     image = Image.fromarray(array_int)
 
     # Save the image.
-    output_path = join(OUTPUT_DIR, f"{name}.png")
-    makedirs(dirname(output_path), exist_ok=True)
-    image.save(output_path)
+    makedirs(dirname(output_path) or ".", exist_ok=True)
+    with span("encode_png", pixels=array_int.shape[0] * array_int.shape[1]) as encode_span:
+        image.save(output_path, compress_level=compress_level)
+        if encode_span:
+            encode_span.add(bytes_written=getsize(output_path))
 
     # Return the image.
     return image
@@ -75,20 +101,93 @@ def alpha_compose_splats(splats: list[float]) -> ndarray[float]:
     return final_color
 
 
-def compute_image_from_clusters(clustered_splats: list, output_image_name: str) -> Image:
+def alpha_compose_clusters(clusters: ndarray) -> ndarray:
+    """Alpha compose ordered clusters front to back for many pixels at once.
+
+    Follows `alpha_compose_splats`: transparent clusters are skipped, and each pixel stops composing once its
+    transmittance falls to `MINIMUM_TRANSMITTANCE`.
+
+    Args:
+        clusters: Ordered clusters for each pixel. Shape: [ number of pixels x [ K x [ A, R, G, B ] ] ].
+
+    Returns:
+        Final color of each pixel. Shape: [ number of pixels x [ R, G, B ] ].
+    """
+    # Define the transmittance and pixel color.
+    transmittance = ones(clusters.shape[0])
+    final_color = zeros((clusters.shape[0], 3))
+
+    # Pixels that are still composing.
+    active = arange(clusters.shape[0])
+
+    # Loop through each cluster slot.
+    with span("compose", pixels=clusters.shape[0]) as compose_span:
+        for cluster_index in range(clusters.shape[1]):
+            # Drop pixels whose transmittance is basically zero.
+            active = active[transmittance[active] > MINIMUM_TRANSMITTANCE]
+            if not active.size:
+                break
+
+            # Skip transparent clusters.
+            alpha = clusters[active, cluster_index, 0]
+            visible = alpha != 0
+            rows = active[visible]
+            alpha = alpha[visible]
+            compose_span.add(clusters_composed=len(rows))
+
+            # Compute the pixel color.
+            final_color[rows] += alpha[:, None] * clusters[rows, cluster_index, 1:] * transmittance[rows, None]
+
+            # Update the transmittance.
+            transmittance[rows] *= 1 - minimum(1, alpha)
+
+    # Return the computed colors.
+    return final_color
+
+
+def stack_pixel_clusters(clustered_splats: ClusterResult | list | ndarray) -> ndarray:
+    """Stack per-pixel clusters into one array, zero padding pixels with fewer clusters.
+
+    Args:
+        clustered_splats: The clustered splats, a `ClusterResult` or [ H x W x [ K x [ A, R, G, B ] ] ] with K varying
+            per pixel.
+
+    Returns:
+        The stacked clusters. Shape: [ H x W x [ max K x [ A, R, G, B ] ] ].
+    """
+    # Already a tensor.
+    if isinstance(clustered_splats, ndarray):
+        return clustered_splats
+
+    # Pad each pixel to the widest pixel.
+    if not isinstance(clustered_splats, ClusterResult):
+        clustered_splats = ClusterResult.from_pixel_clusters(clustered_splats)
+    return clustered_splats.trimmed()
+
+
+def compose_image(
+    clustered_splats: ClusterResult | list | ndarray, height: int = IMAGE_HEIGHT, width: int = IMAGE_WIDTH
+) -> ndarray:
+    """Alpha compose clustered splats into an image.
+
+    Args:
+        clustered_splats: The clustered splats, a `ClusterResult` or [ H x W x [ K x [ A, R, G, B ] ] ].
+        height: Height of the image.
+        width: Width of the image.
+    Returns:
+        The composed image. Shape: [ H x [ W x [ R, G, B ] ] ].
+    """
+    return alpha_compose_clusters(asarray(stack_pixel_clusters(clustered_splats))).reshape(height, width, 3)
+
+
+def compute_image_from_clusters(clustered_splats: ClusterResult | list | ndarray, output_image_name: str) -> Image:
     """Compute the image from the clustered splats and save the result.
 
     Args:
-        clustered_splats: The clustered splats. Expecting [ H x W x [ K x [ A, R, G, B ] ] ].
+        clustered_splats: The clustered splats, a `ClusterResult` or [ H x W x [ K x [ A, R, G, B ] ] ].
         output_image_name: The name of the output image.
     Returns:
         The computed image.
     """
-    # Alpha compose.
-    composed_image = Parallel(n_jobs=-1)(
-        delayed(alpha_compose_splats)(pixel_clusters) for pixel_clusters in tqdm(clustered_splats)
-    )
-    
-
-    # Save the image.
-    return save_array_to_image(np.array(composed_image).reshape(IMAGE_HEIGHT, IMAGE_WIDTH, 3), output_image_name)
+    # Alpha compose and save the image.
+    return save_array_to_image(compose_image(clustered_splats), output_image_name)
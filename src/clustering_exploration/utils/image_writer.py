@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from logging import getLogger
+from os import makedirs
+from os.path import join
+from queue import Queue
+from threading import Thread
+from typing import TYPE_CHECKING
+
+from numpy import float32, memmap, ndarray, save
+
+from clustering_exploration.utils.constants import (
+    IMAGE_WRITER_QUEUE_SIZE,
+    OUTPUT_DIR,
+    PNG_COMPRESS_LEVEL,
+)
+from clustering_exploration.utils.image_handler import write_png
+from clustering_exploration.utils.profiling import span
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+# Failed writes are logged with their traceback, as they are only raised later by `flush` or `close`.
+logger = getLogger(__name__)
+
+
+class ImageWriter:
+    """Write images on a background thread, so encoding and disk writes overlap the next clustering job.
+
+    Images are written as 8-bit PNGs and/or as raw float32 `.npy` files that keep the full precision. Jobs wait in a
+    bounded queue: once `queue_size` are waiting, handing over another blocks until the writer catches up, which
+    bounds the memory held by pending images. Images handed over must not be modified afterwards. A failed write
+    is raised by the next `flush` or `close`.
+    """
+
+    def __init__(
+        self,
+        png: bool = True,
+        raw: bool = False,
+        compress_level: int = PNG_COMPRESS_LEVEL,
+        queue_size: int = IMAGE_WRITER_QUEUE_SIZE,
+    ):
+        """Start the writer.
+
+        Args:
+            png: Whether to write 8-bit PNGs.
+            raw: Whether to write raw float32 `.npy` images.
+            compress_level: PNG compression level, from 0 (fastest) to 9 (smallest).
+            queue_size: Number of jobs that can wait for the writer.
+        """
+        self.png = png
+        self.raw = raw
+        self.compress_level = compress_level
+        self.error = None
+        self._queue = Queue(queue_size)
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        # Run jobs until a None arrives, keeping the first error.
+        while (job := self._queue.get()) is not None:
+            function, arguments = job
+            try:
+                if self.error is None:
+                    function(*arguments)
+            except Exception as error:
+                logger.exception("Writing an image failed, later images are skipped")
+                self.error = error
+            finally:
+                self._queue.task_done()
+        self._queue.task_done()
+
+    def _submit(self, function, *arguments) -> None:
+        self._queue.put((function, arguments))
+
+    def _write(self, image: ndarray, path: str) -> None:
+        # Write an image in each configured format. Memory mapped images are already on disk, so they are flushed.
+        if isinstance(image, memmap):
+            image.flush()
+        elif self.raw:
+            with span("write_raw", pixels=image.shape[0] * image.shape[1]) as raw_span:
+                save(f"{path}.npy", image.astype(float32, copy=False))
+                raw_span.add(bytes_written=image.shape[0] * image.shape[1] * 3 * 4)
+        if self.png:
+            write_png(image, f"{path}.png", self.compress_level)
+
+    @staticmethod
+    def raw_path(name: str, output_dir: str = OUTPUT_DIR) -> str:
+        """Get the path a raw image is written to, for callers that fill it in place as a memory map.
+
+        Args:
+            name: Name of the files, without extension.
+            output_dir: Directory to write to.
+
+        Returns:
+            Path of the `.npy` file.
+        """
+        return join(output_dir, f"{name}.npy")
+
+    def save(self, image: ndarray, name: str, output_dir: str = OUTPUT_DIR) -> None:
+        """Write a whole image in the background.
+
+        A memory mapped image (like one filled in place at `raw_path`) is flushed rather than copied to a raw `.npy`.
+
+        Args:
+            image: The image. Shape: [ H x [ W x [ R, G, B ] ] ].
+            name: Name of the files, without extension.
+            output_dir: Directory to write to.
+        """
+        makedirs(output_dir, exist_ok=True)
+        self._submit(self._write, image, join(output_dir, name))
+
+    def flush(self) -> None:
+        """Wait for every image handed over so far to be written.
+
+        Raises:
+            The first error the writer hit.
+        """
+        self._queue.join()
+        if self.error is not None:
+            raise self.error
+
+    def close(self) -> None:
+        """Write the remaining images and stop the writer.
+
+        Raises:
+            The first error the writer hit.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+from numpy import (
+    asarray,
+    cumsum,
+    errstate,
+    float32,
+    float64,
+    inf,
+    integer,
+    load,
+    log10,
+    ndarray,
+    ones,
+    pad,
+    stack,
+    where,
+)
+
+from clustering_exploration.utils.cluster_result import ClusterResult
+from clustering_exploration.utils.constants import (
+    ERROR_TILE_SIZE,
+    IMAGE_HEIGHT,
+    IMAGE_WIDTH,
+    METRIC_BATCH_SIZE,
+    SSIM_WINDOW_SIZE,
+)
+from clustering_exploration.utils.image_handler import alpha_compose_clusters
+
+# SSIM stabilizing constants, relative to the data range.
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+
+
+def as_image(pixels, height: int = IMAGE_HEIGHT, width: int = IMAGE_WIDTH) -> ndarray:
+    """Get a float image in [0, 1] from any of the forms images take in this package.
+
+    Args:
+        pixels: A `ClusterResult` or cluster tensor [ H x W x [ K x [ A, R, G, B ] ] ] (composed first), compositor
+            output [ H x W x [ R, G, B ] ], an image [ H x [ W x [ R, G, B ] ] ], or a uint8 image (scaled to [0, 1]).
+        height: Height of the image.
+        width: Width of the image.
+
+    Returns:
+        The image. Shape: [ H x [ W x [ R, G, B ] ] ].
+    """
+    # Compose clusters.
+    if isinstance(pixels, ClusterResult):
+        pixels = pixels.trimmed()
+    pixels = asarray(pixels)
+    if pixels.ndim == 3 and pixels.shape[-1] == 4:
+        pixels = alpha_compose_clusters(pixels)
+
+    # Scale 8-bit images.
+    if issubclass(pixels.dtype.type, integer):
+        return (pixels / 255).astype(float32).reshape((height, width, 3))
+    return pixels.astype(float32, copy=False).reshape((height, width, 3))
+
+
+def load_image(image_path: str) -> ndarray:
+    """Load an image file (for example the ground truth) as a float image in [0, 1].
+
+    Raw float `.npy` images (see `ImageWriter`) are loaded as they are, without 8-bit quantization.
+
+    Args:
+        image_path: Path of the image.
+
+    Returns:
+        The image. Shape: [ H x [ W x [ R, G, B ] ] ].
+    """
+    if image_path.endswith(".npy"):
+        raw_image = load(image_path)
+        return as_image(raw_image, *raw_image.shape[:2])
+
+    # Pillow is only needed to read image files, so computing metrics alone doesn't import it.
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        rgb_image = asarray(image.convert("RGB"))
+    return as_image(rgb_image, *rgb_image.shape[:2])
+
+
+def psnr(images: ndarray, references: ndarray, data_range: float = 1.0) -> ndarray:
+    """Compute the peak signal-to-noise ratio of images against references.
+
+    Args:
+        images: Float images. Shape: [ ... x H x W x [ R, G, B ] ].
+        references: Reference images, broadcast against the images.
+        data_range: Difference between the largest and smallest possible value.
+
+    Returns:
+        PSNR in dB of each image, infinite for identical images. Shape: [ ... ].
+    """
+    mse = ((asarray(images, dtype=float64) - references) ** 2).mean(axis=(-3, -2, -1))
+    with errstate(divide="ignore"):
+        return where(mse > 0, 10 * log10(data_range**2 / mse), inf)
+
+
+def _box_mean(values: ndarray, size: int) -> ndarray:
+    """Average each size x size window of images that fits entirely inside them.
+
+    Args:
+        values: Images. Shape: [ ... x H x W x C ].
+        size: Side of the window.
+
+    Returns:
+        Window means. Shape: [ ... x H - size + 1 x W - size + 1 x C ].
+    """
+    # Summed area table with a leading row and column of zeros.
+    padding = [(0, 0)] * (values.ndim - 3) + [(1, 0), (1, 0), (0, 0)]
+    table = pad(cumsum(cumsum(values, axis=-3), axis=-2), padding)
+    sums = (
+        table[..., size:, size:, :]
+        - table[..., :-size, size:, :]
+        - table[..., size:, :-size, :]
+        + table[..., :-size, :-size, :]
+    )
+    return sums / size**2
+
+
+def ssim(
+    images: ndarray,
+    references: ndarray,
+    data_range: float = 1.0,
+    window_size: int = SSIM_WINDOW_SIZE,
+) -> ndarray:
+    """Compute the structural similarity of each color channel of images against references.
+
+    Follows the default of `skimage.metrics.structural_similarity`: uniform windows, sample covariances, and the mean
+    over the windows that fit entirely inside the image.
+
+    Args:
+        images: Float images. Shape: [ ... x H x W x [ R, G, B ] ].
+        references: Reference images, broadcast against the images.
+        data_range: Difference between the largest and smallest possible value.
+        window_size: Side of the windows.
+
+    Returns:
+        Mean SSIM of each channel of each image. Shape: [ ... x 3 ].
+    """
+    images = asarray(images, dtype=float64)
+    references = asarray(references, dtype=float64)
+    covariance_scale = window_size**2 / (window_size**2 - 1)
+
+    # Window statistics.
+    image_mean = _box_mean(images, window_size)
+    reference_mean = _box_mean(references, window_size)
+    image_variance = covariance_scale * (
+        _box_mean(images * images, window_size) - image_mean**2
+    )
+    reference_variance = covariance_scale * (
+        _box_mean(references * references, window_size) - reference_mean**2
+    )
+    covariance = covariance_scale * (
+        _box_mean(images * references, window_size) - image_mean * reference_mean
+    )
+
+    # Similarity of each window.
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    similarity = ((2 * image_mean * reference_mean + c1) * (2 * covariance + c2)) / (
+        (image_mean**2 + reference_mean**2 + c1)
+        * (image_variance + reference_variance + c2)
+    )
+    return similarity.mean(axis=(-3, -2))
+
+
+def error_map(
+    images: ndarray, references: ndarray, tile_size: int = ERROR_TILE_SIZE
+) -> ndarray:
+    """Compute the mean squared error of each tile of images against references.
+
+    Args:
+        images: Float images. Shape: [ ... x H x W x [ R, G, B ] ].
+        references: Reference images, broadcast against the images.
+        tile_size: Side of the tiles in pixels. Tiles on the right and bottom edges may be smaller.
+
+    Returns:
+        Mean squared error of each tile. Shape: [ ... x ceil(H / tile size) x ceil(W / tile size) ].
+    """
+    squared_error = ((asarray(images, dtype=float64) - references) ** 2).mean(axis=-1)
+    height, width = squared_error.shape[-2:]
+
+    # Pad to whole tiles, counting the pixels of each tile.
+    padding = [(0, 0)] * (squared_error.ndim - 2) + [
+        (0, -height % tile_size),
+        (0, -width % tile_size),
+    ]
+    tiles_shape = (
+        *squared_error.shape[:-2],
+        -(-height // tile_size),
+        tile_size,
+        -(-width // tile_size),
+        tile_size,
+    )
+    sums = pad(squared_error, padding).reshape(tiles_shape).sum(axis=(-3, -1))
+    counts = (
+        pad(ones((height, width)), padding[-2:])
+        .reshape(tiles_shape[-4:])
+        .sum(axis=(-3, -1))
+    )
+    return sums / counts
+
+
+def evaluate(
+    images: dict,
+    references: list,
+    tile_size: int = ERROR_TILE_SIZE,
+    batch_size: int = METRIC_BATCH_SIZE,
+) -> dict:
+    """Evaluate the images of many algorithms on many views against the views' references in one call.
+
+    Images stay in memory: nothing is encoded to or decoded from image files.
+
+    Args:
+        images: For each algorithm name, its image of each view (anything `as_image` accepts, at the size of the
+            view's reference).
+        references: Reference image of each view. Shape: [ V x [ H x [ W x [ R, G, B ] ] ] ].
+        tile_size: Side of the error map tiles in pixels.
+        batch_size: Number of images to evaluate per vectorized step.
+
+    Returns:
+        For each algorithm name, the PSNR [ V ], SSIM of each channel [ V x 3 ] and a list of the error maps
+        [ ceil(H / tile size) x ceil(W / tile size) ] of each view.
+    """
+    references = [asarray(reference, dtype=float32) for reference in references]
+    results = {
+        name: {metric: [None] * len(views) for metric in ("psnr", "ssim", "error_map")}
+        for name, views in images.items()
+    }
+
+    # Pair each image with the index of its view.
+    pairs = [
+        (name, view_index)
+        for name, views in images.items()
+        for view_index in range(len(views))
+    ]
+    for start in range(0, len(pairs), batch_size):
+        batch = pairs[start : start + batch_size]
+
+        # Views may differ in size, so stack images of the same size together.
+        for size in {references[view_index].shape for _, view_index in batch}:
+            members = [
+                (name, view_index)
+                for name, view_index in batch
+                if references[view_index].shape == size
+            ]
+            image_stack = stack(
+                [
+                    as_image(images[name][view_index], *size[:2])
+                    for name, view_index in members
+                ]
+            )
+            reference_stack = stack(
+                [references[view_index] for _, view_index in members]
+            )
+
+            # Compute every metric for the stack at once.
+            metrics = {
+                "psnr": psnr(image_stack, reference_stack),
+                "ssim": ssim(image_stack, reference_stack),
+                "error_map": error_map(image_stack, reference_stack, tile_size),
+            }
+            for member_index, (name, view_index) in enumerate(members):
+                for metric, values in metrics.items():
+                    results[name][metric][view_index] = values[member_index]
+
+    # Views may differ in size, so error maps stay a list.
+    return {
+        name: {
+            "psnr": asarray(result["psnr"]),
+            "ssim": asarray(result["ssim"]),
+            "error_map": result["error_map"],
+        }
+        for name, result in results.items()
+    }
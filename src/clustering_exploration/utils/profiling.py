@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from json import dump
+from os import getpid, makedirs
+from os.path import dirname
+from sys import platform
+from threading import get_ident
+from time import perf_counter_ns, thread_time_ns
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+# Recorded events while profiling is enabled in this process, or None when it is disabled.
+_events: list | None = None
+
+
+def peak_rss() -> int | None:
+    """Get the peak resident set size of this process in bytes, or None on platforms without `resource` (Windows)."""
+    if platform == "win32":
+        return None
+    from resource import RUSAGE_SELF, getrusage
+
+    # macOS reports bytes, other Unixes kilobytes.
+    peak = getrusage(RUSAGE_SELF).ru_maxrss
+    return peak if platform == "darwin" else peak * 1024
+
+
+class _Span:
+    """A timed region of work, recorded as a Chrome trace complete event when it ends."""
+
+    def __init__(self, events: list, name: str, counters: dict):
+        self.events = events
+        self.name = name
+        self.counters = counters
+
+    def add(self, **counters) -> None:
+        """Add to the span's work counters (like pixels, splats visited or bytes read)."""
+        for counter, value in counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __enter__(self) -> Self:
+        self.start_ns = perf_counter_ns()
+        self.cpu_start_ns = thread_time_ns()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        end_ns = perf_counter_ns()
+        self.events.append(
+            {
+                "name": self.name,
+                "ph": "X",
+                "ts": self.start_ns / 1000,
+                "dur": (end_ns - self.start_ns) / 1000,
+                "pid": getpid(),
+                "tid": get_ident(),
+                "args": {
+                    "cpu_us": (thread_time_ns() - self.cpu_start_ns) / 1000,
+                    "peak_rss_bytes": peak_rss(),
+                    **self.counters,
+                },
+            }
+        )
+
+
+class _NoSpan:
+    """Stand-in for `_Span` while profiling is disabled. It is falsy, so callers can skip computing counters."""
+
+    def add(self, **counters) -> None:
+        pass
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exception) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **counters) -> _Span | _NoSpan:
+    """Time a region of work if profiling is enabled.
+
+    Records wall time, CPU time of the thread, the process's peak RSS at the end, and the given work counters. While
+    profiling is disabled this returns a shared no-op span, so instrumented code costs one function call.
+
+    Args:
+        name: Name of the region (like `cluster_block`).
+        **counters: Initial work counters, more can be added with `add`.
+
+    Returns:
+        The span, to use as a context manager.
+    """
+    if _events is None:
+        return _NO_SPAN
+    return _Span(_events, name, dict(counters))
+
+
+def enabled() -> bool:
+    """Check whether profiling is enabled in this process."""
+    return _events is not None
+
+
+def enable() -> None:
+    """Start recording spans in this process, dropping earlier events."""
+    global _events
+    _events = []
+
+
+def disable() -> list:
+    """Stop recording spans.
+
+    Returns:
+        The recorded events.
+    """
+    global _events
+    events, _events = _events or [], None
+    return events
+
+
+def merge(events: list) -> None:
+    """Add events recorded elsewhere (like in a worker process) to this process's recording, if enabled."""
+    if _events is not None:
+        _events.extend(events)
+
+
+def record_call(function, *args, **kwargs) -> tuple:
+    """Call a function in a worker with profiling enabled, to hand its events back to the parent.
+
+    Workers that already record (threads of a profiling process) record into the shared events as usual.
+
+    Args:
+        function: The function to call.
+        *args: Positional arguments.
+        **kwargs: Keyword arguments.
+
+    Returns:
+        The result of the function, and the events it recorded that the parent has not seen.
+    """
+    if _events is not None:
+        return function(*args, **kwargs), []
+
+    enable()
+    try:
+        return function(*args, **kwargs), _events
+    finally:
+        disable()
+
+
+def summarize(events: list) -> dict:
+    """Aggregate events by name.
+
+    Args:
+        events: Recorded events.
+
+    Returns:
+        For each name, the number of calls, total wall and CPU seconds, the largest peak RSS, and the summed counters.
+    """
+    summary = {}
+    for event in events:
+        entry = summary.setdefault(event["name"], {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "counters": {}})
+        entry["calls"] += 1
+        entry["wall_seconds"] += event["dur"] / 1e6
+        for counter, value in event["args"].items():
+            if counter == "cpu_us":
+                entry["cpu_seconds"] += value / 1e6
+            elif counter == "peak_rss_bytes" and value is not None:
+                entry["peak_rss_bytes"] = max(entry.get("peak_rss_bytes", 0), value)
+            elif isinstance(value, (int, float)):
+                entry["counters"][counter] = entry["counters"].get(counter, 0) + value
+    return summary
+
+
+def format_summary(summary: dict) -> str:
+    """Format a summary from `summarize` as a table, slowest regions first.
+
+    Args:
+        summary: The summary.
+
+    Returns:
+        The table.
+    """
+    lines = [f"{'region':<24}{'calls':>8}{'wall (s)':>12}{'cpu (s)':>12}{'peak MB':>10}  counters"]
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]["wall_seconds"]):
+        counters = ", ".join(f"{counter} {value:g}" for counter, value in entry["counters"].items())
+        peak = f"{entry['peak_rss_bytes'] / 1e6:.0f}" if "peak_rss_bytes" in entry else "-"
+        lines.append(
+            f"{name:<24}{entry['calls']:>8}{entry['wall_seconds']:>12.3f}{entry['cpu_seconds']:>12.3f}"
+            f"{peak:>10}  {counters}"
+        )
+    return "\n".join(lines)
+
+
+def write_trace(events: list, trace_path: str) -> None:
+    """Write events as a Chrome trace (open in `chrome://tracing` or Perfetto).
+
+    Args:
+        events: Recorded events.
+        trace_path: Path of the JSON trace to create.
+    """
+    makedirs(dirname(trace_path) or ".", exist_ok=True)
+    with open(trace_path, "w") as file:
+        dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+@contextmanager
+def profile(trace_path: str | None = None, show_summary: bool = True, enable_profiling: bool = True):
+    """Profile a block of code.
+
+    Args:
+        trace_path: Optional path to write the Chrome trace to.
+        show_summary: Whether to print the summary table.
+        enable_profiling: Whether to profile at all, so call sites can keep the block when profiling is off.
+
+    Yields:
+        The list the events are recorded into.
+    """
+    if not enable_profiling:
+        yield []
+        return
+
+    enable()
+    events = _events
+    try:
+        yield events
+    finally:
+        disable()
+        if trace_path is not None:
+            write_trace(events, trace_path)
+        if show_summary:
+            print(format_summary(summarize(events)))
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+from os import makedirs, replace
+from os.path import exists, join
+from shutil import rmtree
+
+from numpy import (
+    arange,
+    asarray,
+    bincount,
+    concatenate,
+    cumsum,
+    diff,
+    full,
+    int64,
+    integer,
+    load,
+    memmap,
+    ndarray,
+    repeat,
+    save,
+    ufunc,
+    zeros,
+)
+from numpy.lib.format import open_memmap
+
+from clustering_exploration.utils.constants import PIXEL_TILE_SIZE
+
+
+class RaggedSplats:
+    """Splats for all pixels without the zero padding, in compressed sparse row (CSR) layout.
+
+    The real (non-zero alpha) splats of every pixel are stored back to back in `values`, in their original order, and
+    pixel `i` owns `values[offsets[i] : offsets[i + 1]]`. Memory therefore scales with the real number of splats
+    instead of `NUMBER_OF_SPLATS_PER_PIXEL` slots per pixel.
+
+    Indexing with pixels (an integer, a slice or an array of indices, optionally followed by splat and channel
+    indices) returns a dense array zero padded only to the widest pixel selected, so algorithms consume it exactly
+    like the padded splats. Every algorithm skips zero alpha splats, and random-init k-means and the batched K-Means
+    engine draw their random values per pixel and per cluster rather than per splat slot, so dropping the padding
+    changes no clusters. (The scikit-learn reference of K-Means is not seeded, so it varies between runs either way.)
+    The segment operations reduce over each pixel's splats without padding at all.
+    """
+
+    def __init__(self, offsets: ndarray, values: ndarray):
+        """Wrap CSR arrays.
+
+        Args:
+            offsets: Start of each pixel's splats in `values`, followed by the total number of splats. Shape:
+                [ number of pixels + 1 ].
+            values: Splats of all pixels back to back. Shape: [ number of splats x [ A, D, R, G, B ] ].
+        """
+        self.offsets = offsets
+        self.values = values
+
+    @classmethod
+    def from_padded(
+        cls,
+        splats: ndarray,
+        directory: str | None = None,
+        tile_size: int = PIXEL_TILE_SIZE,
+    ) -> RaggedSplats:
+        """Drop the zero alpha padding of splats, one tile of pixels at a time.
+
+        Two passes are made over the splats (count, then copy), so a memory mapped cache is converted with bounded
+        memory.
+
+        Args:
+            splats: Splats for all pixels. Shape: [ H x W x [ number of splats x [ A, D, R, G, B ] ] ].
+            directory: Optional directory to write the CSR arrays to (see `save`), memory mapping the result.
+            tile_size: Number of pixels to convert at once.
+
+        Returns:
+            The ragged splats.
+        """
+        number_of_pixels = len(splats)
+
+        # Count the real splats of every pixel.
+        counts = zeros(number_of_pixels, dtype=int64)
+        for start in range(0, number_of_pixels, tile_size):
+            counts[start : start + tile_size] = (
+                asarray(splats[start : start + tile_size, :, 0]) != 0
+            ).sum(axis=1)
+        offsets = concatenate(([0], cumsum(counts)))
+
+        # Allocate the values, on disk if requested.
+        shape = (int(offsets[-1]), splats.shape[2])
+        if directory is None:
+            values = zeros(shape, dtype=splats.dtype)
+        else:
+            partial_directory = f"{directory}.partial"
+            if exists(partial_directory):
+                rmtree(partial_directory)
+            makedirs(partial_directory)
+            save(join(partial_directory, "offsets.npy"), offsets)
+            values = open_memmap(
+                join(partial_directory, "values.npy"),
+                mode="w+",
+                dtype=splats.dtype,
+                shape=shape,
+            )
+
+        # Copy the real splats of each tile, which keeps their order.
+        for start in range(0, number_of_pixels, tile_size):
+            tile = asarray(splats[start : start + tile_size])
+            values[offsets[start] : offsets[start + len(tile)]] = tile[
+                tile[:, :, 0] != 0
+            ]
+
+        if directory is None:
+            return cls(offsets, values)
+
+        # Publish the complete arrays and map them.
+        values.flush()
+        del values
+        if exists(directory):
+            rmtree(directory)
+        replace(partial_directory, directory)
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: str | None = "r") -> RaggedSplats:
+        """Load ragged splats written by `save`.
+
+        Args:
+            directory: Directory holding `offsets.npy` and `values.npy`.
+            mmap_mode: Memory map the arrays with this mode (see `numpy.load`), or None to read them into memory.
+
+        Returns:
+            The ragged splats.
+        """
+        return cls(
+            load(join(directory, "offsets.npy")),
+            load(join(directory, "values.npy"), mmap_mode=mmap_mode),
+        )
+
+    def save(self, directory: str) -> None:
+        """Save the CSR arrays as `offsets.npy` and `values.npy` in a directory.
+
+        Args:
+            directory: Directory to write to.
+        """
+        makedirs(directory, exist_ok=True)
+        save(join(directory, "offsets.npy"), self.offsets)
+        save(join(directory, "values.npy"), self.values)
+
+    def memory_map(self, directory: str) -> RaggedSplats:
+        """Get a memory mapped version that can be shared with worker processes without copying.
+
+        Args:
+            directory: Directory to write the arrays to if they are not memory mapped already.
+
+        Returns:
+            These ragged splats if their values are already memory mapped, otherwise a memory mapped copy.
+        """
+        if isinstance(self.values, memmap):
+            return self
+        self.save(join(directory, "ragged_splats"))
+        return self.load(join(directory, "ragged_splats"))
+
+    @property
+    def counts(self) -> ndarray:
+        """Number of real splats of each pixel."""
+        return diff(self.offsets)
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the equivalent dense splats, padded to the widest pixel."""
+        return len(self), max(1, int(self.counts.max(initial=0))), self.values.shape[1]
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def pixel_range(self, start: int, stop: int) -> RaggedSplats:
+        """Get a range of pixels as ragged splats, without copying.
+
+        Args:
+            start: First pixel.
+            stop: Pixel after the last.
+
+        Returns:
+            The ragged splats of the pixels.
+        """
+        offsets = self.offsets[start : stop + 1]
+        return RaggedSplats(offsets - offsets[0], self.values[offsets[0] : offsets[-1]])
+
+    def pad(self, pixel_indices: ndarray) -> ndarray:
+        """Gather pixels into dense splats, zero padded to the widest of them.
+
+        Args:
+            pixel_indices: Indices of the pixels.
+
+        Returns:
+            Dense splats. Shape: [ number of pixels x [ widest pixel x [ A, D, R, G, B ] ] ].
+        """
+        starts = self.offsets[pixel_indices]
+        counts = self.offsets[pixel_indices + 1] - starts
+        padded = zeros(
+            (
+                len(pixel_indices),
+                max(1, int(counts.max(initial=0))),
+                self.values.shape[1],
+            ),
+            self.dtype,
+        )
+
+        # Slot of every gathered splat within its pixel.
+        segment_starts = cumsum(counts) - counts
+        rows = repeat(arange(len(pixel_indices)), counts)
+        slots = arange(len(rows)) - repeat(segment_starts, counts)
+
+        # Read a contiguous run of pixels in one go, anything else splat by splat.
+        contiguous = len(pixel_indices) and (diff(pixel_indices) == 1).all()
+        if contiguous:
+            padded[rows, slots] = self.values[starts[0] : starts[0] + len(rows)]
+        else:
+            padded[rows, slots] = self.values[
+                repeat(starts - segment_starts, counts) + arange(len(rows))
+            ]
+        return padded
+
+    def __getitem__(self, index) -> ndarray:
+        # Split off the splat and channel indices.
+        rest = ()
+        if isinstance(index, tuple):
+            index, rest = index[0], index[1:]
+
+        # A single pixel comes out without the pixel axis.
+        if isinstance(index, (int, integer)):
+            padded = self.pad(arange(len(self))[[index]])[0]
+        else:
+            padded = self.pad(arange(len(self))[index])
+            rest = (slice(None), *rest)
+        return padded[rest] if rest else padded
+
+    def pixel_indices(self) -> ndarray:
+        """Get the pixel index of every splat in `values`."""
+        return repeat(arange(len(self)), self.counts)
+
+    def segment_sum(self, weights: ndarray) -> ndarray:
+        """Sum per-splat values over each pixel.
+
+        Args:
+            weights: One value per splat in `values`.
+
+        Returns:
+            Sum for each pixel (0 for pixels without splats).
+        """
+        return bincount(self.pixel_indices(), weights, len(self))
+
+    def segment_reduce(self, operation: ufunc, channel: int, initial: float) -> ndarray:
+        """Reduce one channel over each pixel's splats with a ufunc (like `numpy.minimum` or `numpy.maximum`).
+
+        Args:
+            operation: Binary ufunc to reduce with.
+            channel: Channel to reduce.
+            initial: Result for pixels without splats.
+
+        Returns:
+            Reduction for each pixel.
+        """
+        result = full(len(self), initial, dtype=self.dtype)
+        nonempty = self.counts > 0
+
+        # Empty segments have no length, so each non-empty segment runs up to the next non-empty start.
+        if nonempty.any():
+            result[nonempty] = operation.reduceat(
+                asarray(self.values[:, channel]), self.offsets[:-1][nonempty]
+            )
+        return result
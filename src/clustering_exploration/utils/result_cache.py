@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+from hashlib import sha256
+from json import dump, dumps, load
+from os import makedirs, replace, stat, walk
+from os.path import abspath, dirname, exists, getsize, join, relpath
+from shutil import rmtree
+from time import time
+
+from numpy import ascontiguousarray, bool_, floating, integer, ndarray, prod
+
+from clustering_exploration.__about__ import __version__
+from clustering_exploration.utils.cluster_result import ClusterResult
+from clustering_exploration.utils.constants import (
+    CACHE_DIR,
+    FINGERPRINT_BLOCK_SIZE,
+    RESULT_CACHE_SIZE,
+)
+from clustering_exploration.utils.ragged_splats import RaggedSplats
+from clustering_exploration.utils.splat_cutoff import TruncatedSplats
+
+# Root of the package source, hashed into the code version.
+PACKAGE_DIR = dirname(dirname(abspath(__file__)))
+
+# Attributes that change how an algorithm runs but not its result (the kernels match the NumPy paths).
+EXECUTION_ATTRIBUTES = {"use_kernels"}
+
+
+def _array_digest(array: ndarray, digest_directory: str | None = None) -> str:
+    """Hash every byte of an array, `FINGERPRINT_BLOCK_SIZE` bytes at a time.
+
+    The digest of a memory mapped array that spans its whole file can be stored in `digests.json` of a directory (like
+    the result cache's), keyed by the file's path, size and modification time, so an unchanged file is only hashed
+    once. Nothing is written next to the file itself.
+
+    Args:
+        array: The array.
+        digest_directory: Optional directory to store the digests of memory mapped files in.
+
+    Returns:
+        Hex digest of the array.
+    """
+    # Reuse the stored digest of an unchanged file.
+    filename = getattr(array, "filename", None)
+    whole_file = (
+        filename is not None
+        and array.flags.c_contiguous
+        and array.offset + array.nbytes == getsize(filename)
+    )
+    if whole_file and digest_directory is not None:
+        file_stat = stat(filename)
+        file_key = [file_stat.st_size, file_stat.st_mtime_ns]
+        digests_path = join(digest_directory, "digests.json")
+        digests = {}
+        if exists(digests_path):
+            with open(digests_path) as file:
+                digests = load(file)
+        stored = digests.get(abspath(filename))
+        if stored is not None and stored["file"] == file_key:
+            return stored["digest"]
+
+    digest = sha256(dumps([list(array.shape), array.dtype.str]).encode())
+    rows = max(
+        1, FINGERPRINT_BLOCK_SIZE // max(1, int(prod(array.shape[1:])) * array.itemsize)
+    )
+    for start in range(0, len(array), rows):
+        digest.update(ascontiguousarray(array[start : start + rows]))
+
+    if whole_file and digest_directory is not None:
+        digests[abspath(filename)] = {"file": file_key, "digest": digest.hexdigest()}
+        with open(f"{digests_path}.tmp", "w") as file:
+            dump(digests, file, indent=4)
+        replace(f"{digests_path}.tmp", digests_path)
+    return digest.hexdigest()
+
+
+def fingerprint_splats(
+    splats: ndarray | RaggedSplats | TruncatedSplats,
+    digest_directory: str | None = None,
+) -> str:
+    """Fingerprint every byte of splats.
+
+    Dense splats are hashed whole, ragged splats by their offsets and values, and truncated splats by their splats and
+    cutoff limits. Memory mapped caches are only hashed the first time when given a digest directory (see
+    `_array_digest`).
+
+    Args:
+        splats: Splats for all pixels, dense, ragged or truncated.
+        digest_directory: Optional directory to store the digests of memory mapped files in.
+
+    Returns:
+        Hex digest of the fingerprint.
+    """
+    # Memory mapped and in-memory copies of the same splats share a fingerprint.
+    kind = (
+        type(splats).__name__
+        if isinstance(splats, (RaggedSplats, TruncatedSplats))
+        else ndarray.__name__
+    )
+    digest = sha256(dumps([kind, list(splats.shape), str(splats.dtype)]).encode())
+    if isinstance(splats, TruncatedSplats):
+        digest.update(fingerprint_splats(splats.splats, digest_directory).encode())
+        arrays = [splats.limits]
+    elif isinstance(splats, RaggedSplats):
+        arrays = [splats.offsets, splats.values]
+    else:
+        arrays = [splats]
+    for array in arrays:
+        digest.update(_array_digest(array, digest_directory).encode())
+    return digest.hexdigest()
+
+
+def code_version() -> str:
+    """Fingerprint the code algorithms run: the package version and the source of every module of the package.
+
+    Returns:
+        Hex digest of the code version.
+    """
+    digest = sha256(__version__.encode())
+    for directory, _, file_names in sorted(walk(PACKAGE_DIR)):
+        for file_name in sorted(file_names):
+            if file_name.endswith(".py"):
+                path = join(directory, file_name)
+                digest.update(relpath(path, PACKAGE_DIR).encode())
+                with open(path, "rb") as file:
+                    digest.update(file.read())
+    return digest.hexdigest()
+
+
+def algorithm_parameters(algorithm) -> dict:
+    """Get the scalar parameters of an algorithm (everything but the splats, non-scalar state and execution options).
+
+    Args:
+        algorithm: The algorithm.
+
+    Returns:
+        Parameter names and values.
+    """
+    parameters = {}
+    for name, value in sorted(vars(algorithm).items()):
+        if name in EXECUTION_ATTRIBUTES:
+            continue
+        if isinstance(value, (bool, bool_)):
+            parameters[name] = bool(value)
+        elif isinstance(value, (int, integer)):
+            parameters[name] = int(value)
+        elif isinstance(value, (float, floating)):
+            parameters[name] = float(value)
+        elif isinstance(value, str) or value is None:
+            parameters[name] = value
+    return parameters
+
+
+class ResultCache:
+    """On-disk memoization of `AlgorithmBase.compute` results.
+
+    Results are keyed by a fingerprint of the splats (or a given dataset key), the algorithm class, its parameters,
+    the compute options and the code version, so changing any of them computes afresh. Results are stored as
+    `ClusterResult` directories and memory mapped back on a hit. The cache is bounded in bytes and evicts the least
+    recently used results first. Hits, misses and evictions are counted per instance.
+    """
+
+    def __init__(
+        self,
+        directory: str = join(CACHE_DIR, "results"),
+        max_bytes: int = RESULT_CACHE_SIZE,
+    ):
+        """Open a result cache.
+
+        Args:
+            directory: Directory to keep results in.
+            max_bytes: Maximum total size of the cached results, in bytes.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        makedirs(directory, exist_ok=True)
+
+    @property
+    def _index_path(self) -> str:
+        return join(self.directory, "index.json")
+
+    def _read_index(self) -> dict:
+        if not exists(self._index_path):
+            return {}
+        with open(self._index_path) as file:
+            return load(file)
+
+    def _write_index(self, index: dict) -> None:
+        with open(f"{self._index_path}.tmp", "w") as file:
+            dump(index, file, indent=4)
+        replace(f"{self._index_path}.tmp", self._index_path)
+
+    def key(self, algorithm, dataset_key: str | None = None, **compute_options) -> str:
+        """Compute the cache key of an algorithm's result.
+
+        Args:
+            algorithm: The algorithm.
+            dataset_key: Identifies the splats (for example a dataset name and CSV fingerprint). Defaults to a
+                fingerprint of the splats.
+            **compute_options: Options passed to `compute` that change the result.
+
+        Returns:
+            Hex digest of the key.
+        """
+        description = {
+            "dataset": dataset_key
+            or fingerprint_splats(algorithm.splats, self.directory),
+            "algorithm": f"{type(algorithm).__module__}.{type(algorithm).__qualname__}",
+            "parameters": algorithm_parameters(algorithm),
+            "options": compute_options,
+            "code": code_version(),
+        }
+        return sha256(dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key: str) -> ClusterResult | None:
+        """Load a cached result, marking it as recently used.
+
+        Args:
+            key: Cache key.
+
+        Returns:
+            The memory mapped result, or None on a miss.
+        """
+        index = self._read_index()
+        if key not in index or not exists(join(self.directory, key)):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        index[key]["last_used"] = time()
+        self._write_index(index)
+        return ClusterResult.load(join(self.directory, key))
+
+    def put(self, key: str, result: ClusterResult) -> None:
+        """Store a result, evicting the least recently used results to stay within the size bound.
+
+        Args:
+            key: Cache key.
+            result: The result to store.
+        """
+        size = result.clusters.nbytes + result.counts.nbytes
+        if size > self.max_bytes:
+            return
+
+        # Write the result, then publish it.
+        partial_path = join(self.directory, f"{key}.partial")
+        if exists(partial_path):
+            rmtree(partial_path)
+        result.save(partial_path)
+        if exists(join(self.directory, key)):
+            rmtree(join(self.directory, key))
+        replace(partial_path, join(self.directory, key))
+
+        # Evict until everything fits.
+        index = self._read_index()
+        index[key] = {"bytes": size, "last_used": time()}
+        total_bytes = sum(entry["bytes"] for entry in index.values())
+        for old_key in sorted(
+            index, key=lambda entry_key: index[entry_key]["last_used"]
+        ):
+            if total_bytes <= self.max_bytes:
+                break
+            if old_key == key:
+                continue
+            rmtree(join(self.directory, old_key), ignore_errors=True)
+            total_bytes -= index.pop(old_key)["bytes"]
+            self.evictions += 1
+        self._write_index(index)
+
+    def compute(
+        self, algorithm, dataset_key: str | None = None, **compute_options
+    ) -> ClusterResult:
+        """Get an algorithm's result from the cache, or compute and cache it.
+
+        Args:
+            algorithm: The algorithm.
+            dataset_key: Identifies the splats, see `key`.
+            **compute_options: Options passed to `compute`.
+
+        Returns:
+            The result.
+        """
+        # Only the clustering mode changes the result, not how the work is scheduled.
+        key = self.key(
+            algorithm, dataset_key, vectorized=compute_options.get("vectorized", True)
+        )
+        result = self.get(key)
+        if result is None:
+            result = algorithm.compute(**compute_options)
+            self.put(key, result)
+        return result
+
+    def clear(self) -> None:
+        """Remove every cached result."""
+        rmtree(self.directory, ignore_errors=True)
+        makedirs(self.directory, exist_ok=True)
+
+    def stats(self) -> dict:
+        """Get the hit, miss and eviction counts of this instance, and the number and size of cached results."""
+        index = self._read_index()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(index),
+            "bytes": sum(entry["bytes"] for entry in index.values()),
+        }
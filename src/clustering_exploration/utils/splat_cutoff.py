@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from time import perf_counter
+
+from numpy import (
+    abs,
+    arange,
+    argmax,
+    array,
+    asarray,
+    cumprod,
+    diff,
+    float64,
+    intp,
+    minimum,
+    ndarray,
+    where,
+    zeros,
+)
+
+from clustering_exploration.utils.constants import (
+    MINIMUM_TRANSMITTANCE,
+    PIXEL_TILE_SIZE,
+)
+from clustering_exploration.utils.image_handler import alpha_compose_clusters
+
+
+def effective_splat_counts(
+    splats: ndarray, tile_size: int = PIXEL_TILE_SIZE
+) -> ndarray:
+    """Count the leading splats of each pixel that can still affect its color.
+
+    Follows `alpha_compose_splats`: a splat only contributes while the transmittance in front of it is above
+    `MINIMUM_TRANSMITTANCE`, and everything after the last non-zero alpha splat is padding. The transmittance is
+    accumulated in float64 in slot order, like the compositor, so truncating to these counts composes to exactly the
+    same colors.
+
+    Args:
+        splats: Splats for all pixels, dense or ragged. Shape: [ H x W x [ number of splats x [ A, D, R, G, B ] ] ].
+        tile_size: Number of pixels to scan at once.
+
+    Returns:
+        Effective number of splats of each pixel. Shape: [ H x W ].
+    """
+    counts = zeros(len(splats), dtype=intp)
+    for start in range(0, len(splats), tile_size):
+        alpha = asarray(splats[start : start + tile_size, :, 0]).astype(float64)
+
+        # Transmittance in front of each slot (the first slot always sees full transmittance).
+        transmittance = cumprod(1 - minimum(1, alpha), axis=1)
+        visible = 1 + (transmittance[:, :-1] > MINIMUM_TRANSMITTANCE).sum(axis=1)
+
+        # Slot after the last real splat.
+        real = alpha != 0
+        real_end = where(
+            real.any(axis=1), alpha.shape[1] - argmax(real[:, ::-1], axis=1), 0
+        )
+        counts[start : start + len(alpha)] = minimum(visible, real_end)
+    return counts
+
+
+class TruncatedSplats:
+    """Splats cut off after each pixel's effective splat count (see `effective_splat_counts`).
+
+    Indexing with pixels (an integer, a slice or an array of indices, optionally followed by splat and channel
+    indices) returns a dense array in which the splats past each pixel's count are zeroed, trimmed to the largest count
+    selected. Zero alpha splats are skipped by every algorithm, so each algorithm only works on the splats that
+    actually reach the image. Wraps dense or ragged splats alike.
+    """
+
+    def __init__(self, splats: ndarray, limits: ndarray):
+        """Wrap splats.
+
+        Args:
+            splats: Splats for all pixels, dense or ragged. Shape: [ H x W x [ number of splats x [ A, D, R, G, B ] ] ].
+            limits: Number of splats to keep for each pixel. Shape: [ H x W ].
+        """
+        self.splats = splats
+        self.limits = limits
+
+    @property
+    def shape(self) -> tuple:
+        """Shape of the equivalent dense splats, trimmed to the largest count."""
+        return len(self), max(1, int(self.limits.max(initial=0))), self.splats.shape[2]
+
+    @property
+    def dtype(self):
+        return self.splats.dtype
+
+    def __len__(self) -> int:
+        return len(self.limits)
+
+    def __getitem__(self, index) -> ndarray:
+        # Split off the splat and channel indices.
+        rest = ()
+        if isinstance(index, tuple):
+            index, rest = index[0], index[1:]
+
+        # Read the selected pixels (a contiguous run in one go) up to the largest count.
+        pixel_indices = arange(len(self))[index]
+        single = pixel_indices.ndim == 0
+        pixel_indices = pixel_indices.reshape(-1)
+        limits = self.limits[pixel_indices]
+        width = max(1, int(limits.max(initial=0)))
+        if len(pixel_indices) and (diff(pixel_indices) == 1).all():
+            tile = array(self.splats[pixel_indices[0] : pixel_indices[-1] + 1, :width])
+        else:
+            tile = array(self.splats[pixel_indices, :width])
+
+        # Zero the splats past each pixel's count.
+        tile[arange(tile.shape[1]) >= limits[:, None]] = 0
+        tile = tile[0] if single else tile
+        if not rest:
+            return tile
+        return tile[rest] if single else tile[(slice(None), *rest)]
+
+
+def compare_cutoff(algorithm, truncated_algorithm, pixel_indices: ndarray) -> dict:
+    """Measure the speed-up and color change of clustering truncated splats on a set of pixels.
+
+    Args:
+        algorithm: Algorithm on the full splats.
+        truncated_algorithm: The same algorithm on `TruncatedSplats` of the same pixels.
+        pixel_indices: Indices of the pixels to compare.
+
+    Returns:
+        Mean number of real splats per pixel before and after the cutoff, clustering seconds for both, the speed-up,
+        and the maximum and mean absolute difference of the composed colors.
+    """
+    report = {}
+    colors = []
+    for name, clustering in (("full", algorithm), ("truncated", truncated_algorithm)):
+        splats = asarray(clustering.splats[pixel_indices])
+        start_time = perf_counter()
+        clusters = clustering.tile_cluster(splats)
+        report[f"{name}_seconds"] = perf_counter() - start_time
+        report[f"{name}_splats_per_pixel"] = float(
+            (splats[:, :, 0] != 0).sum(axis=1).mean()
+        )
+        colors.append(alpha_compose_clusters(clusters))
+
+    difference = abs(colors[0] - colors[1])
+    report["speed_up"] = report["full_seconds"] / max(
+        report["truncated_seconds"], 1e-12
+    )
+    report["max_color_difference"] = float(difference.max(initial=0))
+    report["mean_color_difference"] = (
+        float(difference.mean()) if difference.size else 0.0
+    )
+    return report
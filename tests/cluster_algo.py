@@ -4,6 +4,12 @@ import numpy as np
 from joblib import Parallel, delayed
 from tqdm import tqdm
 
+from clustering_exploration.utils.cluster_result import ClusterResult
+from clustering_exploration.utils.image_handler import (
+    alpha_compose_clusters,
+    stack_pixel_clusters,
+)
+
 
 def orig_color_accum(depth, alpha, color, final_color, final_alpha):
     final_color = (
@@ -152,45 +158,14 @@ def cluster_splats(splats_to_cluster, epsilon):
         # Return the clustered pixel.
         return pixel_output
 
-    # Parallelize the clustering process.
-    return Parallel(n_jobs=-1)(
-        delayed(cluster_pixel)(pixel_splats) for pixel_splats in tqdm(splats_to_cluster)
+    # Parallelize the clustering process, stacking the pixels into one result.
+    return ClusterResult.from_pixel_clusters(
+        Parallel(n_jobs=-1)(
+            delayed(cluster_pixel)(pixel_splats) for pixel_splats in tqdm(splats_to_cluster)
+        )
     )
 
 
 def compute_image_from_clusters(clustered_pixels):
     """Compute the final pixel color by alpha compositing the clusters."""
-
-    def alpha_compose_pixel(pixel_clusters):
-        # Define the transmittance and pixel color for the first cluster.
-        transmittance = 1.0
-        pixel_color = (
-            np.zeros(3)
-            if not pixel_clusters[0, 0]
-            else pixel_clusters[0, 1:] * pixel_clusters[0, 0]
-        )
-
-        # Loop through remaining clusters.
-        for k in range(1, len(pixel_clusters)):
-            # Skip transparent cluster.
-            if not pixel_clusters[k, 0]:
-                continue
-
-            # Exit once the transmittance is basically zero.
-            if transmittance <= 0.001:
-                break
-
-            # Compute the transmittance.
-            transmittance *= 1 - min(1, pixel_clusters[k - 1, 0])
-
-            # Compute the pixel color.
-            pixel_color += pixel_clusters[k, 0] * pixel_clusters[k, 1:] * transmittance
-
-        # Return the computed pixel color.
-        return pixel_color
-
-    # Compute the color of each pixel.
-    return Parallel(n_jobs=-1)(
-        delayed(alpha_compose_pixel)(pixel_clusters)
-        for pixel_clusters in tqdm(clustered_pixels)
-    )
+    return alpha_compose_clusters(stack_pixel_clusters(clustered_pixels))
@@ -4,6 +4,8 @@ import os
 import shutil
 import subprocess
 
+from clustering_exploration.utils.data_handler import convert_csv_to_cache
+
 
 def load_config(config_path):
     """
@@ -20,6 +22,21 @@ def load_config(config_path):
     return config
 
 
+def cache_dataset(target_dataset_path):
+    """
+    Convert a view's CSV into a .npy splat cache and its reference colors next to it (resumes an interrupted
+    conversion).
+
+    Parameters:
+        target_dataset_path (str): Path to the view's dataset directory.
+    """
+    convert_csv_to_cache(
+        os.path.join(target_dataset_path, "collected_splats.csv"),
+        os.path.join(target_dataset_path, "collected_splats.npy"),
+        colors_path=os.path.join(target_dataset_path, "out_color.npy"),
+    )
+
+
 def generate_dataset(config):
     """
     Generate a dataset for 3DGS.
@@ -52,6 +69,7 @@ def generate_dataset(config):
                 os.path.join(target_dataset_path, "collected_splats.csv")
             ):
                 print(f"view:{view} Dataset already exists, skipping...")
+                cache_dataset(target_dataset_path)
                 continue
             render_file_path = os.path.join(gs_path, "render_single_view.py")
             render_view_cmd = [
@@ -99,6 +117,9 @@ def generate_dataset(config):
             shutil.copy(gt_img, os.path.join(target_dataset_path, "gt.png"))
             shutil.copy(render_img, os.path.join(target_dataset_path, "render.png"))
 
+            # Convert the csv into a binary splat cache
+            cache_dataset(target_dataset_path)
+
     # Add dataset generation logic here
 
     print("Dataset generated successfully.")
@@ -1,14 +1,14 @@
 import argparse
 
-import cv2
-import numpy as np
-from skimage.metrics import structural_similarity as ssim
+from clustering_exploration.utils import metrics
 
 
 def compare_images(image1_path, image2_path):
     """
     Compare two images using SSIM and PSNR metrics.
 
+    Images are compared as float images in [0, 1]. SSIM is the mean over the color channels.
+
     Parameters:
         image1_path (str): Path to the first image.
         image2_path (str): Path to the second image.
@@ -16,25 +16,16 @@ def compare_images(image1_path, image2_path):
     Returns:
         dict: A dictionary containing SSIM and PSNR values.
     """
-    img1 = cv2.imread(image1_path)
-    img2 = cv2.imread(image2_path)
+    img1 = metrics.load_image(image1_path)
+    img2 = metrics.load_image(image2_path)
     if img1.shape != img2.shape:
         raise ValueError("The two images must have the same dimensions for comparison.")
 
-    # Convert images to grayscale for SSIM calculation
-    gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-    gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-
-    # Compute SSIM
-    ssim_value = ssim(gray1, gray2)
+    # Compute SSIM per channel
+    ssim_value = float(metrics.ssim(img1, img2).mean())
 
     # Compute PSNR
-    mse = np.mean((img1 - img2) ** 2)
-    if mse == 0:
-        psnr_value = float("inf")  # Perfect match
-    else:
-        max_pixel = 255.0
-        psnr_value = 20 * np.log10(max_pixel / np.sqrt(mse))
+    psnr_value = float(metrics.psnr(img1, img2))
 
     return {"SSIM": ssim_value, "PSNR": psnr_value}
 
@@ -3,10 +3,9 @@ import json
 import os
 
 import cluster_algo as ca
-import metric_utils as mu
-import numpy as np
-import polars as pl
-from PIL import Image
+
+from clustering_exploration.utils.constants import EVALUATION_CONCURRENT_VIEWS
+from clustering_exploration.utils.evaluation import evaluate_views
 
 
 def load_config(config_path):
@@ -36,58 +35,22 @@ def evaluate_algo(config):
     cluster_func = getattr(ca, algo_name)
     parameters = config["parameters"]
 
-    # iterate directories in dataset_path
-    for item in os.listdir(dataset_path):
-        item_path = os.path.join(dataset_path, item)
-        if os.path.isdir(item_path):
-            print(f"processing {item_path}")
-            process_dataset(item_path, cluster_func, parameters)
-            print(f"finish processing {item_path}")
-
-
-def read_csv(dataset_path):
-    df_temp = pl.read_csv(dataset_path, n_rows=1)
-    column_names = df_temp.columns
-
-    schema_overrides = {name: pl.Float32 for name in column_names if name != "pixelNum"}
-    schema_overrides["sample_index"] = pl.Int64  # Set 'pixelNum' as Int64
-
-    # Load the CSV with the specified schema overrides
-    df = pl.read_csv(dataset_path, schema_overrides=schema_overrides)
-    return df
-
-
-def process_dataset(item_path, cluster_func, parameters):
-    gt_img = os.path.join(item_path, "gt.png")
-    dataset = os.path.join(item_path, "collected_splats.csv")
-    df = read_csv(dataset)
-
-    image = Image.open(gt_img)
-    width, height = image.size
-
-    # Get the CSV data from Polars DataFrame
-    splats = df.to_numpy().astype(np.float32)
-
-    # Extract splat data (all Gaussian data)
-    splat_data = splats[:, 7:].reshape((width * height, (splats.shape[1] - 7) // 5, 5))
-    parameters["splats_to_cluster"] = splat_data
-
-    clustered_rgb = cluster_func(**parameters)
-    computed_image = ca.compute_image_from_clusters(clustered_rgb)
-
-    output_image = (
-        np.array(computed_image).reshape((height, width, 3)).astype(np.uint8)
-    )  # Ensure uint8 format
-    output_image_path = os.path.join(item_path, "computed_image.png")
-    Image.fromarray(output_image).save(output_image_path)
-
-    # Create Json file save psnr and ssim with gt
-    psnr_ssim_res = mu.compare_images(
-        gt_img, os.path.join(item_path, "computed_image.png")
+    # Collect the view directories in dataset_path
+    view_paths = [
+        os.path.join(dataset_path, item)
+        for item in sorted(os.listdir(dataset_path))
+        if os.path.isdir(os.path.join(dataset_path, item))
+    ]
+
+    # Load, cluster, composite and evaluate the views in a pipeline, into one results table
+    rows = evaluate_views(
+        view_paths,
+        lambda splats: cluster_func(splats_to_cluster=splats, **parameters),
+        concurrent_views=config.get("concurrent_views", EVALUATION_CONCURRENT_VIEWS),
+        results_path=os.path.join(dataset_path, "results.csv"),
     )
-
-    with open(os.path.join(item_path, "results.json"), "w") as f:
-        json.dump(psnr_ssim_res, f)
+    for row in rows:
+        print(row)
 
 
 if __name__ == "__main__":